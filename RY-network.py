@@ -1,8 +1,8 @@
 from __future__ import print_function
-from ortools.linear_solver import pywraplp
+from backend import createSolver
 
-def RYNetwork(v1, v2):
-    solver = pywraplp.Solver('RY-Network', pywraplp.Solver.GLOP_LINEAR_PROGRAMMING)
+def RYNetwork(v1, v2, backend='glop'):
+    solver = createSolver('RY-Network', backend)
 
     V = ['k1', 'k2', 'k3', 'e', 'R1', 'R2']
     v = [None] * 6
@@ -1,10 +1,9 @@
 from __future__ import print_function
-from ortools.linear_solver import pywraplp
+from backend import createSolver
 
-def XNetwork():
+def XNetwork(v1=1, v2=1, backend='glop'):
   # Instantiate a Glop solver, naming it Y-Netowrk.
-  solver = pywraplp.Solver('X-Network',
-                           pywraplp.Solver.GLOP_LINEAR_PROGRAMMING)
+  solver = createSolver('X-Network', backend)
 
 # Create the two variables and let them take on any value.
   R = [None] * 2
@@ -66,8 +65,8 @@ def XNetwork():
       c8[i-3].SetCoefficient(K[2], -(1-d[i])*r[i]/(r[2]*(1-d[i]*r[i])) )
 
   objective = solver.Objective()
-  objective.SetCoefficient(R[0], 1)
-  objective.SetCoefficient(R[1], 1)
+  objective.SetCoefficient(R[0], v1)
+  objective.SetCoefficient(R[1], v2)
   objective.SetMaximization()
 
   # Solve the system.
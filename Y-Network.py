@@ -1,10 +1,9 @@
 from __future__ import print_function
-from ortools.linear_solver import pywraplp
+from backend import createSolver
 
-def YNetwork(v1, v2):
+def YNetwork(v1, v2, backend='glop'):
   # Instantiate a Glop solver, naming it Y-Netowrk.
-  solver = pywraplp.Solver('Y-Network',
-                           pywraplp.Solver.GLOP_LINEAR_PROGRAMMING)
+  solver = createSolver('Y-Network', backend)
 
 # Create the two variables and let them take on any value.
   R1 = solver.NumVar(0, solver.infinity(), 'R1')
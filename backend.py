@@ -0,0 +1,547 @@
+from __future__ import print_function
+from time import time
+import numpy as np
+
+# Every backend speaks the subset of the pywraplp.Solver API that the
+# models use (NumVar, Constraint, Objective, Solve, solution_value, ...),
+# so SolverLP and the hand-coded networks build against any of them.
+# loadModel() and solutionValues() move a whole model in and out as arrays,
+# saveModel() and restoreModel() a built one through a file.
+# OR-tools is only imported when its first solver is created: importing it
+# costs more than parsing or checking a topology.
+
+# pywraplp.Solver result status
+OPTIMAL = 0
+FEASIBLE = 1
+INFEASIBLE = 2
+UNBOUNDED = 3
+ABNORMAL = 4
+NOT_SOLVED = 6
+# Basis status of a column or row
+BASIC = 4
+
+def ortools():
+    from ortools.linear_solver import pywraplp, linear_solver_pb2
+    return pywraplp, linear_solver_pb2
+
+BACKENDS = ['glop', 'clp', 'highs', 'highs-ds', 'highs-ipm']
+
+def createSolver(name, backend='glop'):
+    if backend in OrtoolsBackend.solver_type:
+        return OrtoolsBackend(name, backend)
+    if backend in HighsBackend.methods:
+        return HighsBackend(name, backend)
+    raise ValueError('unknown backend %r, expected one of %s' % (backend, ', '.join(BACKENDS)))
+
+class OrtoolsBackend:
+
+    solver_type = {
+        'glop': 'GLOP_LINEAR_PROGRAMMING',
+        'clp': 'CLP_LINEAR_PROGRAMMING',
+    }
+
+    def __init__(self, name, backend='glop'):
+        pywraplp, linear_solver_pb2 = ortools()
+        self.backend = backend
+        self.solver = pywraplp.Solver(name, getattr(pywraplp.Solver, self.solver_type[backend]))
+        self.stats = {'backend': backend, 'solve_time': 0.0, 'iterations': 0, 'status': NOT_SOLVED, 'solves': 0}
+
+    def __getattr__(self, attr):
+        # Everything else is the plain pywraplp.Solver
+        return getattr(self.solver, attr)
+
+    def loadModel(self, c, lb, ub, A, row_lo, row_hi, maximize=True):
+        inf = self.solver.infinity()
+        lb = np.where(np.isinf(lb), -inf, lb).tolist()
+        ub = np.where(np.isinf(ub), inf, ub).tolist()
+        x = [self.solver.NumVar(a, b, '') for a, b in zip(lb, ub)]
+        lo = np.where(np.isinf(row_lo), -inf, row_lo).tolist()
+        hi = np.where(np.isinf(row_hi), inf, row_hi).tolist()
+        A = A.tocsr()
+        indptr, cols, vals = A.indptr.tolist(), A.indices.tolist(), A.data.tolist()
+        for i in range(len(lo)):
+            ct = self.solver.Constraint(lo[i], hi[i])
+            for j in range(indptr[i], indptr[i+1]):
+                ct.SetCoefficient(x[cols[j]], vals[j])
+        objective = self.solver.Objective()
+        for j in np.flatnonzero(c).tolist():
+            objective.SetCoefficient(x[j], c[j])
+        if maximize:
+            objective.SetMaximization()
+        else:
+            objective.SetMinimization()
+        return x
+
+    def Solve(self):
+        start = time()
+        status = self.solver.Solve()
+        self.stats['solve_time'] = time() - start
+        self.stats['iterations'] = self.solver.iterations()
+        self.stats['status'] = status
+        self.stats['solves'] += 1
+        # NaN without a solution, the same on every backend
+        self.stats['objective'] = self.solver.Objective().Value() if status in (OPTIMAL, FEASIBLE) else np.nan
+        return status
+
+    def solutionValues(self):
+        return self.solutionArrays()[0]
+
+    def solutionArrays(self):
+        # Primal values, row duals and reduced costs by index, one copy out
+        # of the solution proto instead of a call per variable or row
+        response = ortools()[1].MPSolutionResponse()
+        self.solver.FillSolutionResponseProto(response)
+        return (np.array(response.variable_value), np.array(response.dual_value),
+                np.array(response.reduced_cost))
+
+    def matrix(self):
+        # (A, row lower, row upper) of the model as built, from its proto
+        from scipy import sparse
+        model = ortools()[1].MPModelProto()
+        self.solver.ExportModelToProto(model)
+        rows, cols, vals = [], [], []
+        for i, ct in enumerate(model.constraint):
+            rows.extend([i] * len(ct.var_index))
+            cols.extend(ct.var_index)
+            vals.extend(ct.coefficient)
+        A = sparse.csr_matrix((vals, (rows, cols)), shape=(len(model.constraint), len(model.variable)))
+        lo = np.array([ct.lower_bound for ct in model.constraint], dtype=np.float64)
+        hi = np.array([ct.upper_bound for ct in model.constraint], dtype=np.float64)
+        return A, lo, hi
+
+    def bounds(self):
+        # Column bounds as arrays, +-inf for none
+        lb = np.array([v.lb() for v in self.solver.variables()], dtype=np.float64)
+        ub = np.array([v.ub() for v in self.solver.variables()], dtype=np.float64)
+        inf = self.solver.infinity()
+        return np.where(lb <= -inf, -np.inf, lb), np.where(ub >= inf, np.inf, ub)
+
+    def basis(self):
+        # Basis status (BASIC, AT_LOWER_BOUND, ...) of every column and row
+        return (np.array([v.basis_status() for v in self.solver.variables()], dtype=np.int8),
+                np.array([c.basis_status() for c in self.solver.constraints()], dtype=np.int8))
+
+    def incremental(self, on=True, dual=True):
+        # GLOP's presolve throws the last basis away, without it a re-solve
+        # starts from that basis: dual simplex after a few bound changes,
+        # primal simplex (dual=False) when only the objective changed
+        if self.backend == 'glop':
+            self.solver.SetSolverSpecificParametersAsString(
+                'use_preprocessing: false use_dual_simplex: %s' % ('true' if dual else 'false') if on else '')
+
+    def saveModel(self):
+        # The built model as arrays for np.savez, here its serialized proto
+        model = ortools()[1].MPModelProto()
+        self.solver.ExportModelToProto(model)
+        return {'proto': np.frombuffer(model.SerializeToString(), dtype=np.uint8)}
+
+    def restoreModel(self, arrays):
+        # Into an empty solver, columns and rows keep their indices
+        model = ortools()[1].MPModelProto()
+        model.ParseFromString(arrays['proto'].tobytes())
+        error = self.solver.LoadModelFromProto(model)
+        if error:
+            raise ValueError('cannot load the saved model: %s' % error)
+
+class HighsVariable:
+
+    __slots__ = ('model', 'i', 'nm')
+
+    def __init__(self, model, i, nm):
+        self.model = model
+        self.i = i
+        self.nm = nm
+
+    def name(self):
+        return self.nm or 'x%d' % self.i
+
+    def index(self):
+        return self.i
+
+    def lb(self):
+        return self.model.col_lb[self.i]
+
+    def ub(self):
+        return self.model.col_ub[self.i]
+
+    def SetBounds(self, lb, ub):
+        self.model.col_lb[self.i] = lb
+        self.model.col_ub[self.i] = ub
+
+    def SetLb(self, lb):
+        self.model.col_lb[self.i] = lb
+
+    def SetUb(self, ub):
+        self.model.col_ub[self.i] = ub
+
+    def solution_value(self):
+        return float(self.model.x[self.i])
+
+    def reduced_cost(self):
+        return float(self.model.reduced[self.i])
+
+class HighsConstraint:
+
+    __slots__ = ('model', 'i', 'nm', 'lo', 'hi', 'coef')
+
+    def __init__(self, model, i, lo, hi, nm):
+        self.model = model
+        self.i = i
+        self.lo = lo
+        self.hi = hi
+        self.nm = nm
+        self.coef = dict()
+
+    def name(self):
+        return self.nm or 'c%d' % self.i
+
+    def index(self):
+        return self.i
+
+    def lb(self):
+        return self.lo
+
+    def ub(self):
+        return self.hi
+
+    def SetBounds(self, lb, ub):
+        self.lo = lb
+        self.hi = ub
+
+    def SetLb(self, lb):
+        self.lo = lb
+
+    def SetUb(self, ub):
+        self.hi = ub
+
+    def SetCoefficient(self, var, coef):
+        self.coef[var.i] = coef
+
+    def GetCoefficient(self, var):
+        return self.coef.get(var.i, 0.0)
+
+    def dual_value(self):
+        return float(self.model.dual[self.i])
+
+class HighsObjective:
+
+    def __init__(self, model):
+        self.model = model
+        self.coef = dict()
+        self.maximize = False
+        self.offset = 0.0
+
+    def SetCoefficient(self, var, coef):
+        self.coef[var.i] = coef
+
+    def GetCoefficient(self, var):
+        return self.coef.get(var.i, 0.0)
+
+    def SetMaximization(self):
+        self.maximize = True
+
+    def SetMinimization(self):
+        self.maximize = False
+
+    def SetOffset(self, offset):
+        self.offset = offset
+
+    def Clear(self):
+        self.coef.clear()
+        self.offset = 0.0
+
+    def maximization(self):
+        return self.maximize
+
+    def Value(self):
+        return self.model.objective_value
+
+# Model kept in Python and solved by scipy.optimize.linprog (HiGHS)
+class HighsBackend:
+
+    methods = {'highs': 'highs', 'highs-ds': 'highs-ds', 'highs-ipm': 'highs-ipm'}
+
+    def __init__(self, name, backend='highs'):
+        self.name = name
+        self.backend = backend
+        self.method = self.methods[backend]
+        self.stats = {'backend': backend, 'solve_time': 0.0, 'iterations': 0, 'status': NOT_SOLVED, 'solves': 0}
+        self.Clear()
+
+    def Clear(self):
+        self.col_lb = []
+        self.col_ub = []
+        self.vars = []
+        self.rows = []
+        self.objective = HighsObjective(self)
+        # Matrix loaded in bulk by loadModel(), it comes before self.rows
+        self.block = None
+        self.x = None
+        self.dual = None
+        self.reduced = None
+        self.objective_value = 0.0
+
+    def infinity(self):
+        return np.inf
+
+    def NumVar(self, lb, ub, name=''):
+        var = HighsVariable(self, len(self.col_lb), name)
+        self.col_lb.append(lb)
+        self.col_ub.append(ub)
+        self.vars.append(var)
+        return var
+
+    def Constraint(self, lb=-np.inf, ub=np.inf, name=''):
+        offset = 0 if self.block is None else self.block[0].shape[0]
+        ct = HighsConstraint(self, offset + len(self.rows), lb, ub, name)
+        self.rows.append(ct)
+        return ct
+
+    def Objective(self):
+        return self.objective
+
+    def NumVariables(self):
+        return len(self.col_lb)
+
+    def NumConstraints(self):
+        return len(self.rows) + (0 if self.block is None else self.block[0].shape[0])
+
+    def variables(self):
+        return self.vars
+
+    def variable(self, i):
+        return self.vars[i]
+
+    def constraints(self):
+        return self.rows
+
+    def iterations(self):
+        return self.stats['iterations']
+
+    def wall_time(self):
+        return int(self.stats['solve_time'] * 1000)
+
+    def loadModel(self, c, lb, ub, A, row_lo, row_hi, maximize=True):
+        from scipy import sparse
+        if self.rows or self.block is not None:
+            raise ValueError('loadModel() must be called once, before any Constraint()')
+        first = len(self.col_lb)
+        n = len(lb)
+        self.col_lb.extend(np.asarray(lb, dtype=np.float64).tolist())
+        self.col_ub.extend(np.asarray(ub, dtype=np.float64).tolist())
+        self.vars.extend(HighsVariable(self, first + j, '') for j in range(n))
+        A = sparse.csr_matrix(A)
+        if first:
+            A = sparse.hstack([sparse.csr_matrix((A.shape[0], first)), A]).tocsr()
+        self.block = (A, np.asarray(row_lo, dtype=np.float64), np.asarray(row_hi, dtype=np.float64))
+        for j in np.flatnonzero(c).tolist():
+            self.objective.coef[first + j] = c[j]
+        self.objective.maximize = maximize
+        return self.vars[first:]
+
+    def matrix(self):
+        from scipy import sparse
+        n = len(self.col_lb)
+        rows, cols, vals = [], [], []
+        for i, ct in enumerate(self.rows):
+            rows.extend([i] * len(ct.coef))
+            cols.extend(ct.coef.keys())
+            vals.extend(ct.coef.values())
+        A = sparse.csr_matrix((vals, (rows, cols)), shape=(len(self.rows), n))
+        lo = np.array([ct.lo for ct in self.rows], dtype=np.float64)
+        hi = np.array([ct.hi for ct in self.rows], dtype=np.float64)
+        if self.block is not None:
+            B, blo, bhi = self.block
+            if B.shape[1] < n:
+                B = sparse.hstack([B, sparse.csr_matrix((B.shape[0], n - B.shape[1]))]).tocsr()
+            A = sparse.vstack([B, A]).tocsr()
+            lo = np.concatenate([blo, lo])
+            hi = np.concatenate([bhi, hi])
+        return A, lo, hi
+
+    def Solve(self):
+        from scipy import sparse
+        from scipy.optimize import linprog
+        start = time()
+        A, lo, hi = self.matrix()
+        n = len(self.col_lb)
+        c = np.zeros(n)
+        for j, x in self.objective.coef.items():
+            c[j] = x
+        sign = -1.0 if self.objective.maximize else 1.0
+        eq = lo == hi
+        up = ~eq & np.isfinite(hi)
+        down = ~eq & np.isfinite(lo)
+        A_ub = sparse.vstack([A[up], -A[down]]).tocsr()
+        b_ub = np.concatenate([hi[up], -lo[down]])
+        res = linprog(sign * c, A_ub=A_ub if A_ub.shape[0] else None, b_ub=b_ub if A_ub.shape[0] else None,
+                      A_eq=A[eq] if eq.any() else None, b_eq=lo[eq] if eq.any() else None,
+                      bounds=np.column_stack([self.col_lb, self.col_ub]), method=self.method)
+        status = {0: OPTIMAL, 2: INFEASIBLE, 3: UNBOUNDED}.get(res.status, ABNORMAL)
+        self.stats['solve_time'] = time() - start
+        self.stats['iterations'] = int(res.nit)
+        self.stats['status'] = status
+        self.stats['solves'] += 1
+        if res.x is None:
+            self.x = np.zeros(n)
+            self.dual = np.zeros(A.shape[0])
+            self.reduced = np.zeros(n)
+            self.objective_value = 0.0
+            self.stats['objective'] = np.nan
+            return status
+        self.x = res.x
+        self.objective_value = float(c.dot(res.x)) + self.objective.offset
+        self.stats['objective'] = self.objective_value
+        # Duals as d(objective)/d(rhs) of the model as stated, like GLOP
+        self.dual = np.zeros(A.shape[0])
+        if eq.any():
+            self.dual[eq] = sign * res.eqlin.marginals
+        if A_ub.shape[0]:
+            m = sign * res.ineqlin.marginals
+            k = int(up.sum())
+            self.dual[up] += m[:k]
+            self.dual[down] -= m[k:]
+        self.reduced = sign * (res.lower.marginals + res.upper.marginals)
+        return status
+
+    def solutionValues(self):
+        return np.asarray(self.x)
+
+    def solutionArrays(self):
+        return np.asarray(self.x), np.asarray(self.dual), np.asarray(self.reduced)
+
+    def bounds(self):
+        return np.array(self.col_lb, dtype=np.float64), np.array(self.col_ub, dtype=np.float64)
+
+    def incremental(self, on=True, dual=True):
+        # linprog always starts from scratch
+        pass
+
+    def saveModel(self):
+        A, lo, hi = self.matrix()
+        lb, ub = self.bounds()
+        c = np.zeros(len(lb))
+        for j, x in self.objective.coef.items():
+            c[j] = x
+        return {'indptr': A.indptr, 'indices': A.indices, 'data': A.data, 'row_lo': lo, 'row_hi': hi,
+                'col_lb': lb, 'col_ub': ub, 'c': c, 'sense': np.array([self.objective.maximize, self.objective.offset])}
+
+    def restoreModel(self, arrays):
+        # Rows come back one by one, not as a loadModel() block, so that
+        # their coefficients can be changed again
+        self.Clear()
+        for lb, ub in zip(arrays['col_lb'].tolist(), arrays['col_ub'].tolist()):
+            self.NumVar(lb, ub)
+        indptr, cols, vals = arrays['indptr'].tolist(), arrays['indices'].tolist(), arrays['data'].tolist()
+        for i, (lo, hi) in enumerate(zip(arrays['row_lo'].tolist(), arrays['row_hi'].tolist())):
+            ct = self.Constraint(lo, hi)
+            ct.coef = dict(zip(cols[indptr[i]:indptr[i+1]], vals[indptr[i]:indptr[i+1]]))
+        c = arrays['c']
+        for j in np.flatnonzero(c).tolist():
+            self.objective.coef[j] = float(c[j])
+        self.objective.maximize = bool(arrays['sense'][0])
+        self.objective.offset = float(arrays['sense'][1])
+
+    def ExportModelAsLpFormat(self, obfuscated=False):
+        A, lo, hi = self.matrix()
+        names = [v.name() for v in self.vars]
+        def expr(cols, vals):
+            return ' '.join('%+.12g %s' % (x, names[j]) for j, x in zip(cols, vals))
+        out = ['\\ Generated by backend.HighsBackend', 'Maximize' if self.objective.maximize else 'Minimize']
+        obj = sorted(self.objective.coef.items())
+        out.append(' Obj: ' + expr([j for j, x in obj], [x for j, x in obj]))
+        out.append('Subject to')
+        nb = A.shape[0] - len(self.rows)
+        for i in range(A.shape[0]):
+            row = A.getrow(i)
+            nm = 'c%d' % i if i < nb else self.rows[i - nb].name()
+            e = expr(row.indices, row.data)
+            if lo[i] == hi[i]:
+                out.append(' %s: %s = %.12g' % (nm, e, hi[i]))
+            else:
+                if np.isfinite(lo[i]):
+                    out.append(' %s_lo: %s >= %.12g' % (nm, e, lo[i]))
+                if np.isfinite(hi[i]):
+                    out.append(' %s: %s <= %.12g' % (nm, e, hi[i]))
+        out.append('Bounds')
+        for j in range(len(names)):
+            lb = self.col_lb[j]
+            ub = self.col_ub[j]
+            if lb == ub:
+                out.append(' %s = %.12g' % (names[j], lb))
+            else:
+                out.append(' %s <= %s <= %s' % ('-inf' if np.isinf(lb) else '%.12g' % lb, names[j],
+                                                 'inf' if np.isinf(ub) else '%.12g' % ub))
+        out.append('End')
+        return '\n'.join(out) + '\n'
+
+    def ExportModelAsMpsFormat(self, fixed_format=False, obfuscated=False):
+        # Free MPS, a range on every row bounded on both sides
+        A, lo, hi = self.matrix()
+        A = A.tocsc()
+        nb = A.shape[0] - len(self.rows)
+        cols = [v.name() or 'x%d' % j for j, v in enumerate(self.vars)]
+        rows = ['c%d' % i if i < nb or not self.rows[i - nb].name() else self.rows[i - nb].name()
+                for i in range(A.shape[0])]
+        out = ['NAME %s' % (self.name or 'Network'), 'OBJSENSE', '    MAX' if self.objective.maximize else '    MIN',
+               'ROWS', ' N  Obj']
+        rhs, ranges = [], []
+        for i in range(A.shape[0]):
+            if lo[i] == hi[i]:
+                out.append(' E  %s' % rows[i])
+                rhs.append((rows[i], hi[i]))
+            elif np.isfinite(hi[i]):
+                out.append(' L  %s' % rows[i])
+                rhs.append((rows[i], hi[i]))
+                if np.isfinite(lo[i]):
+                    ranges.append((rows[i], hi[i] - lo[i]))
+            elif np.isfinite(lo[i]):
+                out.append(' G  %s' % rows[i])
+                rhs.append((rows[i], lo[i]))
+            else:
+                out.append(' N  %s' % rows[i])
+        out.append('COLUMNS')
+        for j in range(len(cols)):
+            entries = [('Obj', self.objective.coef[j])] if self.objective.coef.get(j) else []
+            entries += [(rows[i], x) for i, x in zip(A.indices[A.indptr[j]:A.indptr[j+1]], A.data[A.indptr[j]:A.indptr[j+1]])]
+            for nm, x in entries or [('Obj', 0.0)]:
+                out.append('    %s %s %.17g' % (cols[j], nm, x))
+        out.append('RHS')
+        out += ['    RHS %s %.17g' % (nm, x) for nm, x in rhs if x != 0]
+        if ranges:
+            out.append('RANGES')
+            out += ['    RNG %s %.17g' % (nm, x) for nm, x in ranges]
+        out.append('BOUNDS')
+        for j, nm in enumerate(cols):
+            lb, ub = self.col_lb[j], self.col_ub[j]
+            if lb == ub:
+                out.append(' FX BND %s %.17g' % (nm, lb))
+                continue
+            if np.isinf(lb):
+                out.append(' %s BND %s' % ('MI' if np.isfinite(ub) else 'FR', nm))
+            elif lb != 0 or ub < 0:
+                out.append(' LO BND %s %.17g' % (nm, lb))
+            if np.isfinite(ub):
+                out.append(' UP BND %s %.17g' % (nm, ub))
+        out.append('ENDATA')
+        return '\n'.join(out) + '\n'
+
+def main():
+    # python backend.py input/*.in: build and solve SolverLP with every backend
+    import io, contextlib
+    from sys import argv
+    from project import SolverLP
+    print('%-24s %-10s %10s %10s %8s %16s' % ('file', 'backend', 'build (s)', 'solve (s)', 'iters', 'objective'))
+    for filename in argv[1:]:
+        for backend in BACKENDS:
+            with contextlib.redirect_stdout(io.StringIO()):
+                solv = SolverLP.fromFile(filename, backend=backend)
+                start = time()
+                solv.Solve()
+                total = time() - start
+            st = solv.solver.stats
+            print('%-24s %-10s %10.4f %10.4f %8d %16.12f' % (filename, backend, total - st['solve_time'],
+                                                          st['solve_time'], st['iterations'], st['objective']))
+
+if __name__ == '__main__':
+    main()
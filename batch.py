@@ -0,0 +1,121 @@
+from __future__ import print_function
+import argparse
+import csv
+import json
+import os
+import sys
+from glob import glob
+from multiprocessing import Pool
+from time import time
+from project import SolverLP
+from backend import OPTIMAL
+
+FIELDS = ['file', 'status', 'objective', 'rates', 'edges_weight', 'build_time', 'solve_time', 'cached', 'error']
+
+# One open ResultCache per worker process
+caches = dict()
+
+def openCache(path):
+    if path not in caches:
+        from cache import ResultCache
+        caches[path] = ResultCache(path)
+    return caches[path]
+
+def solveInstance(args):
+    # Runs inside a pool worker, so OR-tools is imported once per process.
+    # Every row has every field, None where there is no value: a solve
+    # that is not optimal has its status and an error but no results
+    filename, backend, cache = args
+    ret = dict.fromkeys(FIELDS)
+    ret['file'] = filename
+    try:
+        if cache:
+            ret.update(openCache(cache).solveFile(filename, backend))
+        else:
+            start = time()
+            solv = SolverLP.fromFile(filename, backend=backend)
+            solv.build()
+            ret['build_time'] = time() - start
+            start = time()
+            ret['status'] = solv.solver.Solve()
+            ret['solve_time'] = time() - start
+            ret['cached'] = False
+            if ret['status'] == OPTIMAL:
+                ret['objective'] = solv.solver.Objective().Value()
+                ret['rates'] = solv.rates()
+                ret['edges_weight'] = solv.edgesWeight()
+            solv.Clear()
+        if ret['status'] != OPTIMAL:
+            ret['error'] = 'status %d' % ret['status']
+    except Exception as e:
+        ret['error'] = '%s: %s' % (type(e).__name__, e)
+    return ret
+
+def expandInputs(patterns):
+    files = []
+    for p in patterns:
+        if os.path.isdir(p):
+            files.extend(sorted(glob(os.path.join(p, '*.in'))))
+        else:
+            files.extend(sorted(glob(p)))
+    return files
+
+class Writer:
+
+    def __init__(self, f, fmt):
+        self.f = f
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(f, FIELDS)
+            self.csv.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            row = dict(row)
+            for key in ['rates', 'edges_weight']:
+                if row.get(key) is not None:
+                    row[key] = ' '.join(repr(x) for x in row[key])
+            self.csv.writerow(row)
+        else:
+            self.f.write(json.dumps(row) + '\n')
+        # Results are streamed as instances finish
+        self.f.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve many topology files on a process pool.')
+    parser.add_argument('inputs', nargs='+', help='.in files, globs (quote them) or directories')
+    parser.add_argument('-o', '--output', help='output file (default stdout)')
+    parser.add_argument('-f', '--format', choices=['jsonl', 'csv'], help='default from the output extension, else jsonl')
+    parser.add_argument('-j', '--processes', type=int, default=os.cpu_count(), help='pool size')
+    parser.add_argument('-b', '--backend', default='glop')
+    parser.add_argument('--chunksize', type=int, default=4, help='instances handed to a worker at a time')
+    parser.add_argument('--ordered', action='store_true', help='write results in input order')
+    parser.add_argument('--cache', help='SQLite result cache, identical instances are solved once')
+    args = parser.parse_args()
+
+    files = expandInputs(args.inputs)
+    if not files:
+        parser.error('no input files found')
+    fmt = args.format or ('csv' if args.output and args.output.endswith('.csv') else 'jsonl')
+    out = open(args.output, 'w', newline='' if fmt == 'csv' else None) if args.output else sys.stdout
+    writer = Writer(out, fmt)
+    failed = 0
+    tasks = [(f, args.backend, args.cache) for f in files]
+    pool = Pool(args.processes)
+    try:
+        imap = pool.imap if args.ordered else pool.imap_unordered
+        results = imap(solveInstance, tasks, args.chunksize)
+        for row in results:
+            failed += 'error' in row
+            writer.write(row)
+    finally:
+        pool.close()
+        pool.join()
+        if out is not sys.stdout:
+            out.close()
+    if failed:
+        print('%d of %d instances failed' % (failed, len(files)), file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
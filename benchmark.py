@@ -0,0 +1,182 @@
+from __future__ import print_function
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+from glob import glob
+from multiprocessing import get_context
+from time import time, strftime
+
+PHASES = ['parse', 'createVariables', 'createSecurityConstraint', 'createFlowConstraint',
+          'createObjective', 'Solve', 'edgesWeight']
+
+# Generated instances of growing size: (family, size, generator kwargs)
+FAMILIES = {
+    'line': [('line', n, {}) for n in [10, 20, 40, 80]],
+    'butterfly': [('butterfly', k, {}) for k in [1, 2, 3]],
+    'layered': [('layered', l, {'width': 4, 'p': 0.5}) for l in [5, 10, 20]],
+    'grid': [('grid', n, {}) for n in [3, 4, 6, 8]],
+}
+
+def peakRss():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024.0 ** (2 if sys.platform == 'darwin' else 1)
+
+def runInstance(task):
+    # Runs in a fresh worker process so the peak RSS belongs to this instance
+    name, source, backend = task
+    from project import SolverLP
+    from loader import loadTopology
+    from generator import generate
+    ret = {'instance': name, 'backend': backend}
+    times = dict()
+    rss_start = peakRss()
+    start = time()
+    # Generated instances count their generation as parsing
+    if isinstance(source, str):
+        topo = loadTopology(source)
+    else:
+        family, size, kwargs = source
+        topo = generate(family, size, 0, **kwargs)[0]
+    args = topo.args()
+    times['parse'] = time() - start
+    solv = SolverLP(*args, backend=backend, debug=False)
+    for phase in ['createVariables', 'createSecurityConstraint', 'createFlowConstraint', 'createObjective']:
+        start = time()
+        getattr(solv, phase)()
+        times[phase] = time() - start
+    solv.built = True
+    start = time()
+    solv.solver.Solve()
+    rates = solv.rates()
+    times['Solve'] = time() - start
+    start = time()
+    solv.edgesWeight()
+    times['edgesWeight'] = time() - start
+    ret.update({
+        'nodes': topo.nodes,
+        'edges': topo.numEdges(),
+        'pairs': len(topo.s_to_d),
+        'variables': solv.solver.NumVariables(),
+        'constraints': solv.solver.NumConstraints(),
+        'objective': solv.solver.Objective().Value(),
+        'rates_sum': sum(rates),
+        'phases': times,
+        'total': sum(times.values()),
+        'peak_rss_mb': peakRss(),
+        'rss_growth_mb': peakRss() - rss_start,
+    })
+    return ret
+
+def metadata(backend):
+    meta = {'time': strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'backend': backend}
+    try:
+        meta['commit'] = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                                 stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        meta['commit'] = None
+    try:
+        import ortools
+        meta['ortools'] = ortools.__version__
+    except Exception:
+        pass
+    return meta
+
+def best(runs):
+    # Fastest time per phase over the repeats, everything else from the first run
+    ret = dict(runs[0])
+    ret['phases'] = dict((p, min(r['phases'][p] for r in runs)) for p in PHASES)
+    ret['total'] = sum(ret['phases'].values())
+    ret['peak_rss_mb'] = max(r['peak_rss_mb'] for r in runs)
+    return ret
+
+def run(args):
+    tasks = []
+    for pattern in args.inputs:
+        for filename in sorted(glob(pattern)):
+            tasks.append((os.path.splitext(os.path.basename(filename))[0], filename, args.backend))
+    for family in args.families:
+        for fam, size, kwargs in FAMILIES[family]:
+            tasks.append(('%s%d' % (fam, size), (fam, size, kwargs), args.backend))
+    results = []
+    print('%-16s %6s %6s %8s %8s ' % ('instance', 'nodes', 'edges', 'vars', 'rows') +
+          ' '.join('%9s' % p[:9] for p in PHASES) + ' %8s' % 'rss MB', file=sys.stderr)
+    ctx = get_context('fork' if sys.platform != 'win32' else 'spawn')
+    for task in tasks:
+        runs = []
+        for i in range(args.repeat):
+            pool = ctx.Pool(1, maxtasksperchild=1)
+            try:
+                runs.append(pool.apply(runInstance, (task,)))
+            finally:
+                pool.close()
+                pool.join()
+        r = best(runs)
+        results.append(r)
+        print('%-16s %6d %6d %8d %8d ' % (r['instance'], r['nodes'], r['edges'], r['variables'], r['constraints']) +
+              ' '.join('%9.4f' % r['phases'][p] for p in PHASES) + ' %8.1f' % r['peak_rss_mb'], file=sys.stderr)
+    out = {'meta': metadata(args.backend), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(out, f, indent=1)
+    print('wrote ' + args.output, file=sys.stderr)
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print('old %s (%s), new %s (%s), new/old time ratio' % (old['meta'].get('commit'), old['meta']['time'],
+                                                            new['meta'].get('commit'), new['meta']['time']))
+    base = dict((r['instance'], r) for r in old['results'])
+    print('%-16s ' % 'instance' + ' '.join('%9s' % p[:9] for p in PHASES + ['total']) + ' %8s' % 'rss')
+    regressions = 0
+    for r in new['results']:
+        o = base.get(r['instance'])
+        if o is None:
+            continue
+        cells = []
+        for p in PHASES + ['total']:
+            a = o['phases'][p] if p != 'total' else o['total']
+            b = r['phases'][p] if p != 'total' else r['total']
+            # Ignore noise on phases that take almost no time
+            ratio = b / a if a > 1e-4 else 1.0
+            mark = '*' if ratio > args.threshold and b - a > 5e-3 else ' '
+            regressions += mark == '*'
+            cells.append('%8.2f%s' % (ratio, mark))
+        if abs(r['objective'] - o['objective']) > 1e-9 * max(1, abs(o['objective'])):
+            cells.append(' objective %.12g -> %.12g' % (o['objective'], r['objective']))
+            regressions += 1
+        print('%-16s ' % r['instance'] + ' '.join(cells) + ' %8.2f' % (r['peak_rss_mb'] / o['peak_rss_mb']))
+    if regressions:
+        print('%d regressions (* slower than %.2fx)' % (regressions, args.threshold))
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-phase benchmark of SolverLP.')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('run', help='time every phase and write a JSON result file')
+    p.add_argument('inputs', nargs='*', default=['input/*.in'], help='topology globs (default input/*.in)')
+    p.add_argument('-F', '--families', nargs='*', default=sorted(FAMILIES), choices=sorted(FAMILIES),
+                   help='generated families to include (default all)')
+    p.add_argument('-o', '--output', default='benchmark.json')
+    p.add_argument('-b', '--backend', default='glop')
+    p.add_argument('-n', '--repeat', type=int, default=1, help='runs per instance, fastest kept')
+    p = sub.add_parser('compare', help='compare two result files')
+    p.add_argument('old')
+    p.add_argument('new')
+    p.add_argument('-t', '--threshold', type=float, default=1.2, help='ratio reported as a regression')
+    args = parser.parse_args()
+    if args.command == 'compare':
+        compare(args)
+    elif args.command == 'run':
+        run(args)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
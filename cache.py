@@ -0,0 +1,184 @@
+from __future__ import print_function
+import argparse
+import hashlib
+import json
+import sqlite3
+from time import time
+from loader import loadTopology
+from backend import OPTIMAL
+
+# Content-addressed store of solved instances. The key hashes the
+# canonical form of a model: nodes, edges sorted with their d/r, sorted
+# sources, destinations, distinct pairs and limits, the backend, the
+# solver version and MODEL_VERSION. Rates and edge weights are stored in
+# canonical order and put back in the caller's order on a hit, so the
+# same topology written in another order hits too.
+# Only optimal solves are stored, any other status is returned without
+# values and solved again next time.
+# Bump MODEL_VERSION whenever a change to SolverLP changes its results.
+MODEL_VERSION = 4
+
+def solverVersion(backend):
+    if backend in ('glop', 'clp'):
+        import ortools
+        return 'ortools ' + ortools.__version__
+    import scipy
+    return 'scipy ' + scipy.__version__
+
+def canonical(nodes, edges, source, destination, s_to_d, lim_s, lim_R, backend='glop', **options):
+    # Returns (key, edge order, pair list): edge order[j] is the caller's
+    # index of canonical edge j, pair list the canonical pairs
+    edges = [(int(u), int(v), float(d), float(r)) for u, v, d, r in edges]
+    order = sorted(range(len(edges)), key=lambda i: edges[i])
+    pairs = sorted(set((int(s), int(d)) for s, d in s_to_d))
+    doc = {
+        'nodes': int(nodes),
+        'edges': [[u, v, repr(d), repr(r)] for u, v, d, r in (edges[i] for i in order)],
+        'source': sorted(set(int(x) for x in source)),
+        'destination': sorted(set(int(x) for x in destination)),
+        'pairs': pairs,
+        'lim_s': sorted((int(n), repr(float(x))) for n, x in lim_s.items()),
+        'lim_R': sorted((int(n), repr(float(x))) for n, x in lim_R.items()),
+        'backend': backend,
+        'solver': solverVersion(backend),
+        'model': MODEL_VERSION,
+        'options': sorted(options.items()),
+    }
+    key = hashlib.sha256(json.dumps(doc, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+    return key, order, pairs
+
+class ResultCache:
+
+    def __init__(self, path='nc_cache.sqlite', max_bytes=64 << 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        # Counters of this process, stats() also has the totals on disk
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, size INTEGER, used REAL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)')
+        # A smaller bound than the store was filled with applies at once
+        self.evict()
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def count(self, name):
+        self.db.execute('INSERT OR IGNORE INTO counters VALUES (?, 0)', (name,))
+        self.db.execute('UPDATE counters SET value = value + 1 WHERE name = ?', (name,))
+
+    def get(self, key):
+        row = self.db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            self.count('misses')
+        else:
+            self.hits += 1
+            self.count('hits')
+            self.db.execute('UPDATE results SET used = ? WHERE key = ?', (time(), key))
+        self.db.commit()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key, value):
+        text = json.dumps(value)
+        self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (key, text, len(text), time()))
+        self.evict()
+        self.db.commit()
+
+    def evict(self):
+        # Least recently used first until the store fits in max_bytes
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute('SELECT key, size FROM results ORDER BY used').fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute('DELETE FROM results WHERE key = ?', (key,))
+            total -= size
+            self.count('evictions')
+
+    def clear(self):
+        self.db.execute('DELETE FROM results')
+        self.db.execute('DELETE FROM counters')
+        self.db.commit()
+
+    def stats(self):
+        ret = dict(self.db.execute('SELECT name, value FROM counters').fetchall())
+        entries, size = self.db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        ret.update({'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes})
+        return ret
+
+    def solve(self, args, backend='glop', **kwargs):
+        # args are the SolverLP positional arguments (Topology.args()).
+        # Returns {'status', 'objective', 'rates', 'edges_weight',
+        # 'build_time', 'solve_time', 'cached'}, the times are 0 on a hit
+        # and the values None if the solve is not optimal.
+        from project import SolverLP
+        nodes, edges, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R = args
+        options = dict((k, v) for k, v in kwargs.items() if k == 'keyflow')
+        key, order, pairs = canonical(nodes, edges, source, destination, s_to_d, lim_s, lim_R, backend, **options)
+        value = self.get(key)
+        build_time = solve_time = 0.0
+        if value is None:
+            with SolverLP(*args, backend=backend, debug=False, **kwargs) as solv:
+                start = time()
+                solv.build()
+                build_time = time() - start
+                start = time()
+                status = solv.solver.Solve()
+                solve_time = time() - start
+                if status != OPTIMAL:
+                    return {'status': status, 'objective': None, 'rates': None, 'edges_weight': None,
+                            'build_time': build_time, 'solve_time': solve_time, 'cached': False}
+                rate = dict(zip([tuple(p) for p in s_to_d], solv.rates()))
+                weight = solv.edgesWeight()
+                value = {'objective': solv.solver.Objective().Value(),
+                         'rates': [rate[p] for p in pairs],
+                         'edges_weight': [weight[i] for i in order]}
+            self.put(key, value)
+            cached = False
+        else:
+            cached = True
+        # Back to the caller's pair and edge order
+        rate = dict(zip(pairs, value['rates']))
+        weight = [0.0] * len(order)
+        for j, i in enumerate(order):
+            weight[i] = value['edges_weight'][j]
+        return {'status': OPTIMAL, 'objective': value['objective'],
+                'rates': [rate[(int(s), int(d))] for s, d in s_to_d], 'edges_weight': weight,
+                'build_time': build_time, 'solve_time': solve_time, 'cached': cached}
+
+    def solveFile(self, filename, backend='glop', **kwargs):
+        return self.solve(loadTopology(filename).args(), backend, **kwargs)
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve through, inspect or empty the result cache.')
+    parser.add_argument('command', choices=['solve', 'stats', 'clear'])
+    parser.add_argument('inputs', nargs='*', help='topology files for solve')
+    parser.add_argument('-c', '--cache', default='nc_cache.sqlite', help='SQLite file')
+    parser.add_argument('-b', '--backend', default='glop')
+    parser.add_argument('--max-mb', type=float, default=64, help='size bound for LRU eviction')
+    args = parser.parse_args()
+    with ResultCache(args.cache, int(args.max_mb * (1 << 20))) as cache:
+        if args.command == 'clear':
+            cache.clear()
+        for filename in args.inputs if args.command == 'solve' else []:
+            start = time()
+            ret = cache.solveFile(filename, args.backend)
+            if ret['status'] != OPTIMAL:
+                print('%-24s status %d' % (filename, ret['status']))
+                continue
+            print('%-24s %16.12f %8.4fs %s' % (filename, ret['objective'], time() - start,
+                                              'hit' if ret['cached'] else 'miss'))
+        print(json.dumps(cache.stats()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,513 @@
+from __future__ import print_function
+import argparse
+import io, contextlib
+import os
+from time import time
+import numpy as np
+from scipy import stats
+from project import SolverLP
+from simulate import edgePlan
+
+# Secure network coding over GF(2^8) for a solved SolverLP, block by block
+# (T time units each, the plan's rates times T packets):
+#   source    a pair's G message packets are coded with a G x G Cauchy
+#             matrix; every coded packet carries its coefficients in a
+#             header and takes one path of the pair's f_R flow
+#   edge      the tail sends fresh random packets (k, no resending) and
+#             random packets resent until the head has them (e). Both ends
+#             XOR the ones the head got into K key packets along the rows
+#             of a public random 0/1 matrix A, and every message packet
+#             crossing the edge goes out as X + H key for a Cauchy H. The
+#             key stays secret while A has full rank over the random
+#             packets the eavesdropper missed, and H is MDS: one who
+#             catches at most K of the sent packets learns nothing of the
+#             messages
+#   node      the head removes H key and passes the packets on
+#   sink      the destination solves the headers against the payloads by
+#             Gaussian elimination
+# The plan's rates only hold on average, so K is sized with a margin below
+# the random packets the eavesdropper misses, and the paths carry fewer
+# message packets until an edge's are seen more than K times only with
+# probability `eps` per block (margins()). Multiplication is a lookup in a
+# 256 x 256 table, applied to whole NumPy byte arrays at once, or for large
+# blocks XORs of a packet's multiples by the powers of 2; XORs of whole
+# packets run on Python ints or four Russians tables.
+# Messages are read through memoryview slices of the caller's buffers and
+# decoded into preallocated bytearrays, not copied.
+
+def makeTables(poly=0x11d):
+    # exp/log over the generator 2 of x^8 + x^4 + x^3 + x^2 + 1
+    exp = np.zeros(510, dtype=np.uint8)
+    log = np.zeros(256, dtype=np.int64)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= poly
+    exp[255:] = exp[:255]
+    mul = np.zeros((256, 256), dtype=np.uint8)
+    mul[1:, 1:] = exp[log[1:, None] + log[None, 1:]]
+    inv = np.zeros(256, dtype=np.uint8)
+    inv[1:] = exp[255 - log[1:]]
+    return mul, inv
+
+MUL, INV = makeTables()
+
+FLAT = MUL.ravel()
+
+# Multiples of x by 1, 2, 4, ..., 128, any c x is an XOR of some of them
+POW = MUL[[1 << b for b in range(8)]]
+
+def gfDot(C, X):
+    # C (m x n) times X (n x L) over GF(2^8). A few rows look up every
+    # product of the block in one take of the flat table. Many rows XOR
+    # the 256 multiples of each row of X once from its 8 power multiples,
+    # 8 bytes at a time, and copy out one per coefficient; the rows in
+    # between go column by column through the rows of their coefficients
+    C = np.asarray(C, dtype=np.uint8)
+    m, n = C.shape
+    if m < 4:
+        return np.bitwise_xor.reduce(FLAT.take((C.T[:, :, None].astype(np.uint16) << 8) | X[:, None, :]), axis=0)
+    if m > 64:
+        L = X.shape[1]
+        W = -(-L // 8)
+        P = np.zeros((8, n, 8 * W), dtype=np.uint8)
+        P[:, :, :L] = POW[:, X]
+        P = P.view(np.uint64)
+        table = np.zeros((256, W), dtype=np.uint64)
+        ret = np.zeros((m, W), dtype=np.uint64)
+        for i in range(n):
+            for b in range(8):
+                np.bitwise_xor(table[:1 << b], P[b, i], out=table[1 << b:2 << b])
+            ret ^= table[C[:, i]]
+        return ret.view(np.uint8)[:, :L]
+    ret = np.zeros((m, X.shape[1]), dtype=np.uint8)
+    for i in range(n):
+        ret ^= np.take(MUL[C[:, i]], X[i], axis=1)
+    return ret
+
+def xorRows(A, R):
+    # A (m x n, 0/1) times R (n x L): the sums of R's rows are XORs. Many
+    # rows table the 256 XORs of every 8 rows of R once (four Russians)
+    # and pick one per byte of A, a few XOR whole packets as Python ints
+    m, n = A.shape
+    L = R.shape[1]
+    if m > 32:
+        W = -(-L // 8)
+        P = np.zeros((n + -n % 8, 8 * W), dtype=np.uint8)
+        P[:n, :L] = R
+        P = P.view(np.uint64)
+        B = np.packbits(A, axis=1, bitorder='little')
+        table = np.zeros((256, W), dtype=np.uint64)
+        out = np.zeros((m, W), dtype=np.uint64)
+        for g in range(B.shape[1]):
+            for b in range(8):
+                np.bitwise_xor(table[:1 << b], P[8 * g + b], out=table[1 << b:2 << b])
+            out ^= table[B[:, g]]
+        return out.view(np.uint8)[:, :L]
+    rows = [int.from_bytes(x.tobytes(), 'little') for x in R]
+    out = bytearray(m * L)
+    for j, a in enumerate(A):
+        acc = 0
+        for i in np.flatnonzero(a).tolist():
+            acc ^= rows[i]
+        out[j * L:(j + 1) * L] = acc.to_bytes(L, 'little')
+    return np.frombuffer(out, dtype=np.uint8).reshape(m, L)
+
+def gfInverse(A):
+    # Gauss-Jordan elimination on [A | I]
+    A = np.array(A, dtype=np.uint8)
+    n = len(A)
+    B = np.eye(n, dtype=np.uint8)
+    for c in range(n):
+        rows = c + np.flatnonzero(A[c:, c])
+        if not len(rows):
+            raise ValueError('singular system, rank %d of %d' % (c, n))
+        p = rows[0]
+        if p != c:
+            A[[c, p]] = A[[p, c]]
+            B[[c, p]] = B[[p, c]]
+        f = MUL[INV[A[c, c]]]
+        A[c] = f[A[c]]
+        B[c] = f[B[c]]
+        rows = np.flatnonzero(A[:, c])
+        rows = rows[rows != c]
+        if len(rows):
+            T = MUL[A[rows, c]]
+            A[rows] ^= np.take(T, A[c], axis=1)
+            B[rows] ^= np.take(T, B[c], axis=1)
+    return B
+
+def gfRank(A):
+    # Row echelon form by the same elimination
+    A = np.array(A, dtype=np.uint8)
+    rank = 0
+    for c in range(A.shape[1]):
+        if rank == len(A):
+            break
+        rows = rank + np.flatnonzero(A[rank:, c])
+        if not len(rows):
+            continue
+        p = rows[0]
+        if p != rank:
+            A[[rank, p]] = A[[p, rank]]
+        A[rank] = MUL[INV[A[rank, c]]][A[rank]]
+        rows = rank + 1 + np.flatnonzero(A[rank + 1:, c])
+        if len(rows):
+            A[rows] ^= np.take(MUL[A[rows, c]], A[rank], axis=1)
+        rank += 1
+    return rank
+
+def gfSolve(A, B, cache=None):
+    # X with A X = B for a square A. Eliminating on the small A and then
+    # multiplying is faster than row operations on the wide B, and the
+    # inverse of headers that come again is kept in `cache`
+    if cache is None:
+        return gfDot(gfInverse(A), B)
+    key = A.tobytes()
+    if key not in cache:
+        cache[key] = gfInverse(A)
+    return gfDot(cache[key], B)
+
+def cauchy(rows, cols):
+    # 1 / (x_i + y_j) with x = 0..rows-1, y = rows..rows+cols-1: every
+    # square submatrix is invertible
+    if rows + cols > 256:
+        raise ValueError('a %d x %d Cauchy matrix needs more than 256 field elements' % (rows, cols))
+    x = np.arange(rows)
+    y = rows + np.arange(cols)
+    return INV[x[:, None] ^ y[None, :]]
+
+def blocks(data, size):
+    # Zero-copy views of `size` bytes of a bytes-like object, only the
+    # last, short one is copied to pad it with zeros
+    mv = memoryview(data).cast('B')
+    for start in range(0, len(mv), size):
+        part = np.frombuffer(mv[start:start + size], dtype=np.uint8)
+        if len(part) < size:
+            part = np.concatenate([part, np.zeros(size - len(part), dtype=np.uint8)])
+        yield part
+
+class Engine:
+
+    def __init__(self, solv, packet=1024, block=None, seed=None, eps=1e-6):
+        self.plan = edgePlan(solv)
+        self.edges = list(solv.edges)
+        self.pairs = list(solv.pair_id)
+        self.packet = packet
+        self.eps = eps
+        self.rng = np.random.default_rng(seed)
+        # Key material comes from os.urandom unless a seed asks for a
+        # repeatable run
+        self.seeded = seed is not None
+        self.order = self.edgeOrder()
+        self.T = block or self.blockSize()
+        self.layout(self.T)
+
+    def edgeOrder(self):
+        # Edges with a head-first topological order of their tails
+        indeg = dict()
+        out = dict()
+        for i, (u, v, d, r) in enumerate(self.edges):
+            indeg[v] = indeg.get(v, 0) + 1
+            out.setdefault(u, []).append(i)
+        nodes = set(u for u, v, d, r in self.edges) | set(indeg)
+        ready = sorted(n for n in nodes if not indeg.get(n))
+        order = []
+        while ready:
+            n = ready.pop()
+            for i in out.get(n, []):
+                order.append(i)
+                v = self.edges[i][1]
+                indeg[v] -= 1
+                if indeg[v] == 0:
+                    ready.append(v)
+        if len(order) != len(self.edges):
+            raise ValueError('the topology has a cycle, coding needs a DAG')
+        return order
+
+    def counts(self, T):
+        # Per block: packets of every path, message / key / fresh random /
+        # resent random packets of every edge, as the plan's rates give them
+        plan = self.plan
+        d, r = plan['d'], plan['r']
+        y = np.where(d * r < 1, (1 - d) * r / np.where(d * r < 1, 1 - d * r, 1), 0)
+        path = [[int(np.floor(f * T + 1e-9)) for edges, f in paths] for paths in plan['paths']]
+        msg = np.zeros(len(self.edges), dtype=np.int64)
+        for paths, n in zip(plan['paths'], path):
+            for (edges, f), c in zip(paths, n):
+                msg[edges] += c
+        key = np.floor(T * (plan['k'] + y * plan['e']) + 1e-9).astype(np.int64)
+        fresh = np.floor(T * np.where((d < 1) & (r > 0), plan['k'] / np.where((d < 1) & (r > 0), (1 - d) * r, 1), 0)
+                         + 1e-9).astype(np.int64)
+        resent = np.floor(T * plan['e'] + 1e-9).astype(np.int64)
+        return path, msg, key, fresh, resent
+
+    def margins(self, fresh, resent):
+        # Key packets and most message packets of every edge that leak
+        # with probability at most eps. With S the random packets the head
+        # gets and the eavesdropper misses (a fresh one with probability
+        # (1 - d) r, a resent one with y), K is the largest with
+        # P(S < K + m) <= eps / 4, and the m spare ones leave the K x S
+        # random 0/1 matrix short of full rank with probability at most
+        # 2^-m <= eps / 4. Then at most K of the message packets may be
+        # seen, each with probability 1 - y, but for a chance eps / 2
+        d, r = self.plan['d'], self.plan['r']
+        y = np.where(d * r < 1, (1 - d) * r / np.where(d * r < 1, 1 - d * r, 1), 0)
+        spare = int(np.ceil(np.log2(4 / self.eps)))
+        key = np.zeros(len(self.edges), dtype=np.int64)
+        cap = np.zeros(len(self.edges), dtype=np.int64)
+        for i in range(len(self.edges)):
+            # Both counts within their 1e-12 tails
+            parts = []
+            for n, p in [(fresh[i], (1 - d[i]) * r[i]), (resent[i], y[i])]:
+                lo, hi = stats.binom.ppf([1e-12, 1 - 1e-12], n, p).astype(np.int64) if n else (0, 0)
+                parts.append((lo, stats.binom.pmf(np.arange(lo, hi + 1), n, p)))
+            cdf = np.cumsum(np.convolve(parts[0][1], parts[1][1]))
+            K = parts[0][0] + parts[1][0] + np.searchsorted(cdf, self.eps / 4, side='right') - spare
+            # H needs K + the message packets distinct field elements
+            key[i] = min(max(0, K), 128)
+            n = np.arange(key[i], 257 - key[i])
+            cap[i] = n[stats.binom.sf(key[i], n, 1 - y[i]) <= self.eps / 2].max()
+        return key, cap
+
+    def fit(self, T):
+        # counts() after the margins: the longest path across an edge over
+        # its cap gives up a packet until no edge is
+        path, msg, key, fresh, resent = self.counts(T)
+        key, cap = self.margins(fresh, resent)
+        through = [[] for i in self.edges]
+        for p, paths in enumerate(self.plan['paths']):
+            for q, (edges, f) in enumerate(paths):
+                for i in edges:
+                    through[i].append((p, q))
+        for i in range(len(self.edges)):
+            while msg[i] > cap[i]:
+                n, p, q = max((path[p][q], p, q) for p, q in through[i])
+                path[p][q] -= 1
+                msg[self.plan['paths'][p][q][0]] -= 1
+        return path, msg, key, fresh, resent
+
+    def blockSize(self, limit=1 << 15, random=1 << 14):
+        # The T of a geometric grid that keeps the largest share of the
+        # plan after the margins, which shrink relative to the key as the
+        # blocks grow. Pairs can code at most 128 packets in the field, and
+        # edges send at most `random` random packets
+        best, share = None, 0
+        for T in sorted(set(int(round(1.1 ** k)) for k in range(int(np.log(limit) / np.log(1.1)) + 1))):
+            fresh, resent = self.counts(T)[3:]
+            if (fresh + resent > random).any():
+                break
+            G = [sum(n) for n in self.fit(T)[0]]
+            if max(G) > 128:
+                break
+            if sum(G) > share * T:
+                best, share = T, float(sum(G)) / T
+        if best is None:
+            raise ValueError('no block size carries a whole message packet')
+        return best
+
+    def layout(self, T):
+        self.path_count, self.msg, self.key, self.fresh, self.resent = self.fit(T)
+        self.G = [sum(n) for n in self.path_count]
+        if not max(self.G):
+            raise ValueError('the key margins leave no message packet in a block of %d time units' % T)
+        self.header = max(self.G)
+        self.width = self.header + self.packet
+        # (pair, path) crossing every edge
+        self.crossing = [[] for i in self.edges]
+        for p, paths in enumerate(self.plan['paths']):
+            for q, (edges, f) in enumerate(paths):
+                if self.path_count[p][q]:
+                    for i in edges:
+                        self.crossing[i].append((p, q))
+        self.code = [cauchy(G, G) for G in self.G]
+
+    def random(self, n):
+        if self.seeded:
+            # The generator's raw 64-bit words, as bytes
+            return self.rng.bit_generator.random_raw(-(-n * self.width // 8)).view(np.uint8)[:n * self.width].reshape(
+                n, self.width)
+        return np.frombuffer(os.urandom(n * self.width), dtype=np.uint8).reshape(n, self.width)
+
+    def transmit(self, n, d, r, resend):
+        # Which of n packets the head gets and which the eavesdropper
+        # catches at least once. Resent packets always arrive, after a
+        # geometric number of tries
+        if resend:
+            tries = self.rng.geometric(1 - d, n) if d > 0 else np.ones(n, dtype=np.int64)
+            return np.ones(n, dtype=bool), self.rng.random(n) >= r ** tries
+        return self.rng.random(n) >= d, self.rng.random(n) >= r
+
+    def edge(self, i, X):
+        # Sends the block's message packets X over edge i, returns what
+        # the head decodes and (key packets, random packets caught,
+        # message packets caught, leaked packets)
+        u, v, d, r = self.edges[i]
+        got, caught = self.transmit(self.fresh[i], d, r, False)
+        got_e, caught_e = self.transmit(self.resent[i], d, r, True)
+        got = np.concatenate([got, got_e])
+        caught = np.concatenate([caught, caught_e])[got]
+        # Only the random packets the head gets are drawn, the lost ones
+        # take no part in the key
+        R = self.random(int(got.sum()))
+        # More key packets than message packets would not hide anything
+        # more, and a shorter key is secret against more caught packets
+        K = min(self.key[i], len(R), len(X))
+        # Both ends derive the same key from the packets the head has
+        A = self.rng.integers(0, 2, (K, len(R)), dtype=np.uint8)
+        key = xorRows(A, R)
+        seen = self.transmit(len(X), d, r, True)[1]
+        if K == len(X):
+            # A square H would only remix a key that is secret already
+            pad, P = key, A[seen]
+        else:
+            H = cauchy(len(X), K)
+            pad, P = gfDot(H, key), gfDot(H[seen], A)
+        sent = X ^ pad
+        # The eavesdropper learns what the pads of the packets it saw lose
+        # in rank over the random packets it missed
+        leaked = int(seen.sum()) - gfRank(P[:, ~caught])
+        return sent ^ pad, (K, int(caught.sum()), int(seen.sum()), leaked)
+
+    def send(self, streams):
+        # streams holds one bytes-like object per pair (self.pairs order).
+        # Returns one bytearray per pair and per-edge totals of edge()
+        size = [G * self.packet for G in self.G]
+        total = [len(memoryview(s).cast('B')) for s in streams]
+        out = [bytearray(n) for n in total]
+        views = [np.frombuffer(b, dtype=np.uint8) for b in out]
+        readers = [blocks(s, n) if n else iter(()) for s, n in zip(streams, size)]
+        nblocks = max([-(-n // s) for n, s in zip(total, size) if s] or [0])
+        self.edge_stats = np.zeros((len(self.edges), 4), dtype=np.int64)
+        self.inverses = dict()
+        for b in range(nblocks):
+            where = dict()
+            for p, G in enumerate(self.G):
+                msg = next(readers[p], None)
+                if msg is None:
+                    continue
+                coded = np.zeros((G, self.width), dtype=np.uint8)
+                coded[:, :G] = self.code[p]
+                coded[:, self.header:] = gfDot(self.code[p], msg.reshape(G, self.packet))
+                start = 0
+                for q, c in enumerate(self.path_count[p]):
+                    where[(p, q)] = coded[start:start + c]
+                    start += c
+            for i in self.order:
+                cross = [x for x in self.crossing[i] if x in where]
+                if not cross:
+                    continue
+                X = np.concatenate([where[x] for x in cross])
+                Y, stats = self.edge(i, X)
+                self.edge_stats[i] += stats
+                start = 0
+                for x in cross:
+                    c = len(where[x])
+                    where[x] = Y[start:start + c]
+                    start += c
+            for p, G in enumerate(self.G):
+                parts = [where[(p, q)] for q in range(len(self.path_count[p])) if (p, q) in where]
+                if not parts:
+                    continue
+                Y = np.concatenate(parts)
+                msg = gfSolve(Y[:, :G], Y[:, self.header:], self.inverses).ravel()
+                start = b * size[p]
+                n = min(size[p], total[p] - start)
+                views[p][start:start + n] = msg[:n]
+        return out
+
+def bench(G=32, N=256, packet=1400, mb=32, seed=0):
+    # MB/s of message bytes through each step on one core
+    rng = np.random.default_rng(seed)
+    size = G * packet
+    data = bytearray(rng.integers(0, 256, max(size, int(mb * (1 << 20)) // size * size), dtype=np.uint8).tobytes())
+    out = bytearray(len(data))
+    view = np.frombuffer(out, dtype=np.uint8)
+    C = cauchy(G, G)
+    A = rng.integers(0, 2, (G, N), dtype=np.uint8)
+    R = rng.integers(0, 256, (N, packet), dtype=np.uint8)
+    times = dict((name, 0.0) for name in ['encode', 'key', 'seal', 'decode'])
+    cache = dict()
+    for b, msg in enumerate(blocks(data, size)):
+        start = time()
+        coded = gfDot(C, msg.reshape(G, packet))
+        times['encode'] += time() - start
+        start = time()
+        key = xorRows(A, R)
+        times['key'] += time() - start
+        start = time()
+        coded ^= key
+        coded ^= key
+        times['seal'] += time() - start
+        start = time()
+        view[b * size:(b + 1) * size] = gfSolve(C, coded, cache).ravel()
+        times['decode'] += time() - start
+    if out != data:
+        raise AssertionError('decoded bytes differ')
+    return len(data), times
+
+def run(filename, mb=1.0, packet=1024, block=None, seed=None, backend='glop', eps=1e-6):
+    # Returns the number of pairs decoded wrong plus the edges that leaked
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv = SolverLP.fromFile(filename, backend=backend, debug=False)
+        solv.Solve()
+    engine = Engine(solv, packet, block, seed, eps)
+    print('Objective = %.12f, block of %d time units' % (solv.solver.Objective().Value(), engine.T))
+    rng = np.random.default_rng(seed)
+    streams = [rng.integers(0, 256, int(mb * (1 << 20)) if G else 0, dtype=np.uint8).tobytes() for G in engine.G]
+    start = time()
+    out = engine.send(streams)
+    took = time() - start
+    total = sum(len(s) for s in streams)
+    bad = sum(bytes(o) != s for o, s in zip(out, streams))
+    print('%6s %6s %10s %12s %8s' % ('s', 'd', 'G', 'bytes', 'decoded'))
+    for (s, d), G, stream, o in zip(engine.pairs, engine.G, streams, out):
+        print('%6d %6d %10d %12d %8s' % (s, d, G, len(stream), 'ok' if bytes(o) == stream else 'WRONG'))
+    print('%5s %10s %6s %6s %8s %8s %8s %8s' % ('edge', 'u -> v', 'msg', 'key', 'rand', 'caught', 'read', 'leaked'))
+    for i, (u, v, d, r) in enumerate(engine.edges):
+        K, caught, read, leaked = engine.edge_stats[i]
+        if engine.msg[i] or K:
+            print('%5d %10s %6d %6d %8d %8d %8d %8d' % (i, '%d -> %d' % (u, v), engine.msg[i], engine.key[i],
+                                                       engine.fresh[i] + engine.resent[i], caught, read, leaked))
+    print('%d bytes in %.3fs, %.1f MB/s' % (total, took, total / max(took, 1e-9) / 1e6))
+    leaky = int((engine.edge_stats[:, 3] > 0).sum())
+    if leaky:
+        print('LEAKED %d packets on %d edges' % (engine.edge_stats[:, 3].sum(), leaky))
+    solv.Clear()
+    return bad + leaky
+
+def main():
+    parser = argparse.ArgumentParser(description='Secure network coding over GF(2^8) for a solved topology.')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('run', help='send random streams through a solved topology and decode them')
+    p.add_argument('input', help='.in or .npz topology file')
+    p.add_argument('-m', '--mb', type=float, default=1.0, help='MB per pair')
+    p.add_argument('-l', '--packet', type=int, default=1024, help='payload bytes per packet')
+    p.add_argument('-T', '--block', type=int, help='time units per block (default the largest that fits)')
+    p.add_argument('-s', '--seed', type=int, help='repeatable keys and channel')
+    p.add_argument('-b', '--backend', default='glop')
+    p.add_argument('-e', '--eps', type=float, default=1e-6, help='chance that an edge leaks in a block')
+    p = sub.add_parser('bench', help='encoder / decoder throughput')
+    p.add_argument('-g', '--generation', type=int, default=32, help='message packets per generation')
+    p.add_argument('-n', '--random', type=int, default=256, help='random packets the keys of a generation come from')
+    p.add_argument('-l', '--packet', type=int, default=1400, help='payload bytes per packet')
+    p.add_argument('-m', '--mb', type=float, default=32)
+    args = parser.parse_args()
+    if args.command == 'run':
+        if run(args.input, args.mb, args.packet, args.block, args.seed, args.backend, args.eps):
+            raise SystemExit(1)
+    elif args.command == 'bench':
+        total, times = bench(args.generation, args.random, args.packet, args.mb)
+        print('%d bytes, generation %d x %d, keys from %d random packets' % (total, args.generation, args.packet,
+                                                                            args.random))
+        for name in ['encode', 'key', 'seal', 'decode']:
+            print('%-8s %8.1f MB/s' % (name, total / max(times[name], 1e-9) / 1e6))
+        print('%-8s %8.1f MB/s' % ('total', total / max(sum(times.values()), 1e-9) / 1e6))
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
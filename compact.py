@@ -0,0 +1,309 @@
+from __future__ import print_function
+import argparse
+import importlib
+import io, contextlib
+from itertools import combinations
+from time import time
+import numpy as np
+from sparselp import SparseLP, INF
+from project import SolverLP
+
+# Closed-form model of a small topology, the kind RY-network.py,
+# X-Network.py and Y-Network.py write by hand, derived from the topology
+# and built in bulk like SparseLP:
+#   - every s -> d pair gets one rate variable per simple path instead of
+#     a flow per edge, R_edge is the sum of the paths through the edge
+#   - the key bits E_s[u] that source s can deliver to u are bounded by
+#     every minimal s -> u cut (max-flow min-cut) instead of a key flow
+#   - per-source shares of k and e only exist on edges that more than
+#     one source reaches
+# It has the optimum of SolverLP, which counts in R_node[u] every message
+# that reaches destination u. Path and cut counts grow exponentially, so
+# topologies over max_paths / max_cut_nodes raise ValueError.
+class CompactLP(SparseLP):
+
+    def __init__(self, *args, **kwargs):
+        self.max_paths = kwargs.pop('max_paths', 10000)
+        self.max_cut_nodes = kwargs.pop('max_cut_nodes', 16)
+        SparseLP.__init__(self, *args, **kwargs)
+
+    def createPaths(self):
+        # Simple s -> d paths of every pair as lists of edge indices
+        out = [[] for n in range(self.nodes)]
+        for i, (a, b) in enumerate(zip(self.u.tolist(), self.v.tolist())):
+            out[a].append((b, i))
+        self.path_pair = []
+        self.path_edges = []
+        for p, (s, d) in enumerate(zip(self.pair_s.tolist(), self.pair_d.tolist())):
+            stack = [(s, [], 1 << s)]
+            while stack:
+                n, path, seen = stack.pop()
+                if n == d:
+                    self.path_pair.append(p)
+                    self.path_edges.append(path)
+                    if len(self.path_pair) > self.max_paths:
+                        raise ValueError('more than %d paths, use SolverLP' % self.max_paths)
+                    continue
+                for b, i in out[n]:
+                    if not (seen >> b) & 1 and self.reach[b, d]:
+                        stack.append((b, path + [i], seen | (1 << b)))
+
+    def minimalCuts(self, s, t):
+        # Edge sets of the minimal s -> t cuts in the subgraph of s -> t paths
+        between = [n for n in range(self.nodes) if self.reach[s, n] and self.reach[n, t] and n not in (s, t)]
+        if len(between) > self.max_cut_nodes:
+            raise ValueError('%d nodes between %d and %d, use SolverLP' % (len(between), s, t))
+        sub = [i for i in range(len(self.u)) if self.reach[s, self.u[i]] and self.reach[self.v[i], t]]
+        cuts = set()
+        for size in range(len(between) + 1):
+            for side in combinations(between, size):
+                side = set(side) | {s}
+                cuts.add(frozenset(i for i in sub if self.u[i] in side and self.v[i] not in side))
+        ret = []
+        for cut in sorted(cuts, key=len):
+            if not any(c <= cut for c in ret):
+                ret.append(cut)
+        return ret
+
+    def createVariables(self):
+        V, M = self.nodes, len(self.edges)
+        self.ncols = 0
+        self.col_start = dict()
+        self.col_lb = []
+        self.col_ub = []
+        for u in self.objective_nodes.tolist():
+            if self.src_id[u] >= 0 and u not in self.lim_R:
+                raise ValueError('destination %d is also a source, its rate is unbounded' % u)
+        self.createPaths()
+        self.R_path = self.addColumns('R_path', len(self.path_pair))
+        self.k = self.addColumns('k', M)
+        self.e = self.addColumns('e', M)
+        # Sources that reach the tail of every edge, shares where several do
+        self.edge_src = [[s for s in self.src.tolist() if self.reach[s, a]] for a in self.u.tolist()]
+        self.share = dict()
+        for i, srcs in enumerate(self.edge_src):
+            if len(srcs) > 1:
+                for s in srcs:
+                    self.share[(s, i)] = None
+        cols = self.addColumns('k_s', len(self.share))
+        cols_e = self.addColumns('e_s', len(self.share))
+        for j, key in enumerate(self.share):
+            self.share[key] = (cols[j], cols_e[j])
+        # E_s[u] of non-source u that sends (LM rows) or has a fixed lim_s
+        out_deg = np.bincount(self.u, minlength=V)
+        self.E_su = dict()
+        for u in self.nonsrc.tolist():
+            if out_deg[u] or u in self.lim_s:
+                for s in self.src.tolist():
+                    if self.reach[s, u]:
+                        self.E_su[(s, u)] = None
+        keys = list(self.E_su)
+        ub = [self.lim_s.get(s, INF) for s, u in keys]
+        for key, col in zip(keys, self.addColumns('E_s', len(keys), 0, ub)):
+            self.E_su[key] = col
+
+    def capacity(self, s, i):
+        # Key bits edge i can carry for source s: k/r + e of s's share
+        cols = self.share.get((s, i), (self.k[i], self.e[i]))
+        return [cols[0], cols[1]], [1 / self.r[i], 1.0]
+
+    def createConstraints(self):
+        self.nrows = 0
+        self.row_start = dict()
+        self.row_count = dict()
+        self.row_lb = []
+        self.row_ub = []
+        self.coo_rows = []
+        self.coo_cols = []
+        self.coo_vals = []
+        M = len(self.edges)
+        d, r = self.d, self.r
+        ar = np.arange(M)
+        # Paths through every edge
+        pe_path = np.array([j for j, path in enumerate(self.path_edges) for i in path], dtype=np.int64)
+        pe_edge = np.array([i for path in self.path_edges for i in path], dtype=np.int64)
+        self.pe_path, self.pe_edge = pe_path, pe_edge
+        self.addRows('Key', M, 0, INF, [ar, ar, pe_edge], [self.k, self.e, self.R_path[pe_path]],
+                     [1 - d * r, (1 - d) * r, -(1 - r[pe_edge])])
+        self.addRows('Cap', M, -INF, 1 - d, [pe_edge, ar, ar], [self.R_path[pe_path], self.k, self.e],
+                     [1, 1 / r, 1])
+        # LM: a source's E is its lim_s (no row without one), a non-source
+        # sums E_s[u] over the sources unless lim_s fixes it
+        rows, cols, vals, hi = [], [], [], []
+        for i in range(M):
+            u = int(self.u[i])
+            if self.src_id[u] >= 0 and u not in self.lim_s:
+                continue
+            j = len(hi)
+            rows += [j, j]
+            cols += [self.k[i], self.e[i]]
+            vals += [1 - d[i] * r[i], (1 - d[i]) * r[i]]
+            if u in self.lim_s:
+                hi.append((1 - d[i]) * r[i] * self.lim_s[u])
+                continue
+            hi.append(0.0)
+            for s in self.src.tolist():
+                if (s, u) in self.E_su:
+                    rows.append(j)
+                    cols.append(self.E_su[(s, u)])
+                    vals.append(-(1 - d[i]) * r[i])
+        self.addRows('LM', len(hi), -INF, hi, [rows], [cols], [vals])
+        # k = sum of shares, e = sum of shares
+        rows, cols, vals = [], [], []
+        shared = sorted(set(i for s, i in self.share))
+        for j, i in enumerate(shared):
+            rows += [2 * j, 2 * j + 1]
+            cols += [self.k[i], self.e[i]]
+            vals += [1, 1]
+            for s in self.edge_src[i]:
+                ks, es = self.share[(s, i)]
+                rows += [2 * j, 2 * j + 1]
+                cols += [ks, es]
+                vals += [-1, -1]
+        self.addRows('Sum_share', 2 * len(shared), 0, 0, [rows], [cols], [vals])
+        # E_s[u] <= capacity of every minimal s -> u cut
+        rows, cols, vals = [], [], []
+        n = 0
+        for (s, u), col in self.E_su.items():
+            for cut in self.minimalCuts(s, u):
+                rows.append(n)
+                cols.append(col)
+                vals.append(1.0)
+                for i in cut:
+                    c, v = self.capacity(s, i)
+                    rows += [n, n]
+                    cols += c
+                    vals += [-x for x in v]
+                n += 1
+        self.addRows('Cut', n, -INF, 0, [rows], [cols], [vals])
+        # Fixed lim_s of a non-source node
+        rows, cols, vals, fixed = [], [], [], []
+        for u in self.nonsrc.tolist():
+            if u in self.lim_s:
+                for s in self.src.tolist():
+                    if (s, u) in self.E_su:
+                        rows.append(len(fixed))
+                        cols.append(self.E_su[(s, u)])
+                        vals.append(1.0)
+                fixed.append(self.lim_s[u])
+        self.addRows('E_fixed', len(fixed), fixed, fixed, [rows], [cols], [vals])
+        # lim_R caps what a source sends and is a floor on what a non-source
+        # destination receives
+        visits = self.pathVisits()
+        rows, cols, vals, lo, hi = [], [], [], [], []
+        for n, x in sorted(self.lim_R.items()):
+            if self.src_id[n] >= 0:
+                paths = [j for j, p in enumerate(self.path_pair) if self.pair_s[p] == n]
+                lo.append(-INF)
+                hi.append(x)
+            elif n in self.dest:
+                paths = visits.get(n, [])
+                lo.append(x)
+                hi.append(INF)
+            else:
+                continue
+            rows += [len(lo) - 1] * len(paths)
+            cols += self.R_path[paths].tolist()
+            vals += [1.0] * len(paths)
+        self.addRows('LM_R', len(lo), lo, hi, [rows], [cols], [vals])
+
+    def pathVisits(self):
+        # Paths entering each node
+        visits = dict()
+        for j, path in enumerate(self.path_edges):
+            for i in path:
+                visits.setdefault(int(self.v[i]), []).append(j)
+        return visits
+
+    def createObjective(self):
+        # Every path entering a destination counts, or its fixed lim_R
+        self.c = np.zeros(self.ncols)
+        self.offset = 0.0
+        visits = self.pathVisits()
+        for u in self.objective_nodes.tolist():
+            if u in self.lim_R:
+                self.offset += self.lim_R[u]
+            else:
+                for j in visits.get(u, []):
+                    self.c[self.R_path[j]] += 1
+
+    def Solve(self, backend='glop'):
+        SparseLP.Solve(self, backend)
+        self.objective += self.offset
+        return self.rates()
+
+    def rates(self):
+        path_pair = np.array(self.path_pair, dtype=np.int64)
+        rate = np.bincount(path_pair, weights=self.x[self.R_path], minlength=len(self.pair_s))
+        return rate[self.pair_of].tolist()
+
+    def edgesWeight(self):
+        count = np.bincount(self.pair_of, minlength=len(self.pair_s))
+        path_pair = np.array(self.path_pair, dtype=np.int64)
+        w = self.x[self.R_path[self.pe_path]] * count[path_pair[self.pe_path]]
+        return np.bincount(self.pe_edge, weights=w, minlength=len(self.edges)).tolist()
+
+# RY-network.py, X-Network.py and Y-Network.py are hand-written models of
+# input/RY-Network.in, X-Network.in and Y-Network.in, kept as the reference
+# CompactLP and SolverLP are checked against. Each maximizes v1 R1 + v2 R2
+# where R1 and R2 are the rates of the pairs listed here, which are not the
+# s_to_d order of the file
+SCRIPTS = {'input/RY-Network.in': ('RY-network', 'RYNetwork', [(0, 3), (0, 2)]),
+           'input/X-Network.in': ('X-Network', 'XNetwork', [(0, 4), (2, 5)]),
+           'input/Y-Network.in': ('Y-Network', 'YNetwork', [(0, 3), (2, 3)])}
+
+def scriptObjective(filename, v1=1, v2=1, backend='glop'):
+    # Optimum of the hand-written model of filename, None without one
+    key = filename.replace('\\', '/')
+    key = key[key.index('input/'):] if 'input/' in key else key
+    if key not in SCRIPTS:
+        return None
+    module, fn, pairs = SCRIPTS[key]
+    with contextlib.redirect_stdout(io.StringIO()):
+        R1, R2 = getattr(importlib.import_module(module), fn)(v1, v2, backend=backend)
+    return v1 * R1 + v2 * R2
+
+def check(filenames, backend='glop'):
+    # CompactLP against SolverLP on every file, and against the script
+    # where the file has one
+    bad = 0
+    print('%-24s %9s %9s %16s %16s %16s %9s %9s' % ('file', 'compact', 'SolverLP', 'compact', 'SolverLP', 'script',
+                                                   'compact', 'SolverLP'))
+    print('%-24s %9s %9s %16s %16s %16s %9s %9s' % ('', 'rows', 'rows', '', '', '', '(s)', '(s)'))
+    for filename in filenames:
+        start = time()
+        lp = CompactLP.fromFile(filename)
+        lp.Solve(backend)
+        t_compact = time() - start
+        start = time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            with SolverLP.fromFile(filename, backend=backend, debug=False) as solv:
+                solv.Solve()
+                ref = solv.solver.Objective().Value()
+                rows = solv.solver.NumConstraints()
+        t_solver = time() - start
+        objs = [lp.objective]
+        script = ''
+        value = scriptObjective(filename, backend=backend)
+        if value is not None:
+            objs.append(value)
+            script = '%16.12f' % value
+        ok = all(abs(x - ref) <= 1e-9 * max(1, abs(ref)) for x in objs)
+        bad += not ok
+        print('%-24s %9d %9d %16.12f %16.12f %16s %9.4f %9.4f %s' % (filename, lp.nrows, rows, lp.objective, ref,
+                                                                   script, t_compact, t_solver,
+                                                                   'ok' if ok else 'MISMATCH'))
+    return bad
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve topologies with the path/cut model and check it against SolverLP '
+                                                 'and the hand-written RY-, X- and Y-Network models.')
+    parser.add_argument('inputs', nargs='*', help='topology files (default input/*.in)')
+    parser.add_argument('-b', '--backend', default='glop')
+    args = parser.parse_args()
+    from glob import glob
+    if check(args.inputs or sorted(glob('input/*.in')), args.backend):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+from __future__ import print_function
+import argparse
+import os
+import sys
+from multiprocessing import Pipe, Process
+from time import time
+import numpy as np
+from scipy import sparse
+from sparselp import SparseLP
+from backend import createSolver, OPTIMAL
+
+# Dantzig-Wolfe decomposition of SparseLP by source.
+# The per-edge and per-node totals (k, e, R_e, E_u, R_u of non-source u)
+# are replaced by the sums of their per-source parts, after which every
+# row except Key, Cap, LM and fixed totals (lim_s / lim_R of non-source
+# nodes) belongs to exactly one source. Each source is a block solved in
+# a worker process, priced by the duals of the coupling rows in a master
+# LP over convex combinations of block solutions. The master objective is
+# a lower bound and the Lagrangian value of the duals an upper bound on
+# the monolithic optimum; the loop stops once they are within `gap`.
+
+class Block:
+
+    def __init__(self, lb, ub, A, lo, hi, backend='glop'):
+        self.solver = createSolver('Block', backend)
+        self.x = self.solver.loadModel(np.zeros(len(lb)), lb, ub, A, lo, hi)
+        self.coef = np.zeros(len(lb))
+
+    def price(self, coef):
+        # Only the objective changes, so GLOP restarts from the last basis
+        objective = self.solver.Objective()
+        for j in np.flatnonzero(coef != self.coef).tolist():
+            objective.SetCoefficient(self.x[j], float(coef[j]))
+        self.coef = coef
+        status = self.solver.Solve()
+        if status != OPTIMAL:
+            raise RuntimeError('block subproblem ended with status %d' % status)
+        x = self.solver.solutionValues()
+        return coef.dot(x), x
+
+def blockWorker(conn, blocks, backend):
+    models = dict((s, Block(*data, backend=backend)) for s, data in blocks)
+    for msg in iter(conn.recv, None):
+        try:
+            conn.send([(s,) + models[s].price(coef) for s, coef in msg])
+        except Exception as e:
+            conn.send(e)
+    conn.close()
+
+class Decomposition:
+
+    def __init__(self, lp, backend='glop', processes=None, gap=1e-6, max_iter=500, verbose=False):
+        self.lp = lp
+        self.backend = backend
+        self.processes = processes
+        self.gap = gap
+        self.max_iter = max_iter
+        self.verbose = verbose
+        self.workers = []
+
+    @classmethod
+    def fromFile(cls, filename, **kwargs):
+        prune = kwargs.pop('prune', True)
+        return cls(SparseLP.fromFile(filename, prune=prune), **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def split(self):
+        lp = self.lp
+        lp.build()
+        S = len(lp.src)
+        n = lp.ncols
+        totals = [(lp.e, lp.e_s), (lp.k, lp.k_s), (lp.R_edge, lp.R_s_edge),
+                  (lp.E_node[lp.nonsrc], lp.E_s), (lp.R_node[lp.nonsrc], lp.R_s)]
+        is_total = np.zeros(n, dtype=bool)
+        for total, part in totals:
+            is_total[total] = True
+        owner = np.full(n, -1, dtype=np.int64)
+        for total, part in totals:
+            owner[part] = np.arange(S)[:, None]
+        owner[lp.E_node[lp.src]] = np.arange(S)
+        owner[lp.R_node[lp.src]] = np.arange(S)
+        owner[lp.f_k] = lp.fk_s
+        owner[lp.f_R] = lp.src_id[lp.pair_s[lp.fR_p]]
+        self.local = np.flatnonzero(~is_total)
+        self.owner = owner[self.local]
+        pos = np.full(n, -1, dtype=np.int64)
+        pos[self.local] = np.arange(len(self.local))
+        # x = X x_local, every total is the sum of its parts
+        rows = [self.local]
+        cols = [np.arange(len(self.local))]
+        for total, part in totals:
+            rows.append(np.repeat(total[None, :], S, axis=0).ravel())
+            cols.append(pos[part.ravel()])
+        rows = np.concatenate(rows)
+        self.X = sparse.csr_matrix((np.ones(len(rows)), (rows, np.concatenate(cols))), shape=(n, len(self.local)))
+
+        # The Sum_* rows hold trivially once the totals are substituted
+        drop = np.zeros(lp.nrows, dtype=bool)
+        for name in ['Sum_e_e', 'Sum_k_e', 'Sum_R_e', 'Sum_E_u', 'Sum_R_u']:
+            drop[lp.rows(name)] = True
+        A = [lp.A[~drop].dot(self.X)]
+        lo = [lp.row_lo[~drop]]
+        hi = [lp.row_hi[~drop]]
+        # Bounds on totals (fixed lim_s / lim_R) become rows on the parts
+        bounded = np.flatnonzero(is_total & ((lp.lb > 0) | np.isfinite(lp.ub)))
+        A.append(self.X[bounded])
+        lo.append(lp.lb[bounded])
+        hi.append(lp.ub[bounded])
+        A = sparse.vstack(A).tocsr()
+        lo = np.concatenate(lo)
+        hi = np.concatenate(hi)
+        self.c = self.X.T.dot(lp.c)
+        lb = lp.lb[self.local].copy()
+        ub = lp.ub[self.local].copy()
+
+        # Rows whose columns all belong to one source are local to it
+        A.eliminate_zeros()
+        nnz = np.diff(A.indptr)
+        nonempty = np.flatnonzero(nnz)
+        first = np.full(A.shape[0], -1, dtype=np.int64)
+        last = np.full(A.shape[0], -1, dtype=np.int64)
+        first[nonempty] = np.minimum.reduceat(self.owner[A.indices], A.indptr[nonempty])
+        last[nonempty] = np.maximum.reduceat(self.owner[A.indices], A.indptr[nonempty])
+        coupling = np.flatnonzero((first != last))
+        self.Ac = A[coupling]
+        self.lo = lo[coupling]
+        self.hi = hi[coupling]
+
+        # A coupling row with nonnegative coefficients on nonnegative
+        # columns also holds for each source's share alone (Cap), which
+        # keeps the blocks bounded
+        C = self.Ac.tocoo()
+        neg = np.zeros(len(coupling), dtype=bool)
+        np.logical_or.at(neg, C.row, (C.data < 0) | (lb[C.col] < 0))
+        share = ~neg[C.row] & np.isfinite(self.hi[C.row])
+        key = C.row[share] * S + self.owner[C.col[share]]
+        keys, inv = np.unique(key, return_inverse=True)
+        copy = sparse.csr_matrix((C.data[share], (inv, C.col[share])), shape=(len(keys), A.shape[1]))
+        block_A = sparse.vstack([A, copy]).tocsr()
+        block_lo = np.concatenate([lo, np.full(len(keys), -np.inf)])
+        block_hi = np.concatenate([hi, self.hi[keys // S]])
+        block_of = np.concatenate([np.where(first == last, first, -1), keys % S])
+
+        # E of a source is only ever needed up to what its out-edges can
+        # carry, bound it so that pricing never runs off to infinity
+        u, d, r = lp.u, lp.d, lp.r
+        need = np.bincount(u, weights=(1 - d) + (1 - d * r), minlength=lp.nodes)[lp.src]
+        col = pos[lp.E_node[lp.src]]
+        ub[col] = np.minimum(ub[col], np.maximum(need, lb[col]))
+
+        self.blocks = []
+        self.cols = []
+        for s in range(S):
+            cols = np.flatnonzero(self.owner == s)
+            rows = np.flatnonzero(block_of == s)
+            self.cols.append(cols)
+            self.blocks.append((lb[cols], ub[cols], block_A[rows][:, cols], block_lo[rows], block_hi[rows]))
+        self.Ac_s = [self.Ac[:, cols].tocsc() for cols in self.cols]
+        self.c_s = [self.c[cols] for cols in self.cols]
+
+    def start(self):
+        S = len(self.blocks)
+        processes = self.processes
+        if processes is None:
+            processes = min(S, os.cpu_count() or 1)
+        if processes <= 0:
+            self.models = [Block(*data, backend=self.backend) for data in self.blocks]
+            return
+        for w in range(min(processes, S)):
+            parent, child = Pipe()
+            blocks = [(s, self.blocks[s]) for s in range(w, S, processes)]
+            proc = Process(target=blockWorker, args=(child, blocks, self.backend))
+            proc.daemon = True
+            proc.start()
+            child.close()
+            self.workers.append((parent, proc, [s for s, data in blocks]))
+
+    def close(self):
+        for conn, proc, blocks in self.workers:
+            try:
+                conn.send(None)
+            except (OSError, EOFError):
+                pass
+            proc.join()
+        self.workers = []
+
+    def price(self, y):
+        # Best block solution for the reduced objective c_s - y A_s
+        coefs = [self.c_s[s] - self.Ac_s[s].T.dot(y) for s in range(len(self.blocks))]
+        if not self.workers:
+            return [m.price(c) for m, c in zip(self.models, coefs)]
+        for conn, proc, blocks in self.workers:
+            conn.send([(s, coefs[s]) for s in blocks])
+        ret = [None] * len(self.blocks)
+        for conn, proc, blocks in self.workers:
+            msg = conn.recv()
+            if isinstance(msg, Exception):
+                raise msg
+            for s, value, x in msg:
+                ret[s] = (value, x)
+        return ret
+
+    def createMaster(self):
+        self.master = createSolver('Master', self.backend)
+        inf = self.master.infinity()
+        self.objective = self.master.Objective()
+        self.objective.SetMaximization()
+        self.rows = [self.master.Constraint(lo if np.isfinite(lo) else -inf, hi if np.isfinite(hi) else inf)
+                     for lo, hi in zip(self.lo.tolist(), self.hi.tolist())]
+        self.convexity = [self.master.Constraint(1, 1) for s in self.blocks]
+        # Penalized slack keeps the master feasible before the columns
+        # can satisfy every coupling row
+        self.penalty = 1e4 * max(1.0, np.abs(self.c).max())
+        self.artificial = []
+        for ct, lo, hi in zip(self.rows, self.lo.tolist(), self.hi.tolist()):
+            for coef, side in [(1, lo), (-1, hi)]:
+                if np.isfinite(side):
+                    var = self.master.NumVar(0, inf, '')
+                    ct.SetCoefficient(var, coef)
+                    self.objective.SetCoefficient(var, -self.penalty)
+                    self.artificial.append(var)
+        self.columns = []
+
+    def addColumn(self, s, x):
+        a = self.Ac_s[s].dot(x)
+        var = self.master.NumVar(0, self.master.infinity(), '')
+        for i in np.flatnonzero(np.abs(a) > 1e-12).tolist():
+            self.rows[i].SetCoefficient(var, float(a[i]))
+        self.convexity[s].SetCoefficient(var, 1)
+        self.objective.SetCoefficient(var, float(self.c_s[s].dot(x)))
+        self.columns.append((s, var, x))
+
+    def duals(self):
+        y = np.array([ct.dual_value() for ct in self.rows])
+        # Duals with the right sign for the side each row can bind on
+        y = np.where(np.isfinite(self.hi), y, np.minimum(y, 0))
+        y = np.where(np.isfinite(self.lo), y, np.maximum(y, 0))
+        mu = np.array([ct.dual_value() for ct in self.convexity])
+        return y, mu
+
+    def bound(self, y, values):
+        # Lagrangian relaxation of the coupling rows at y
+        rhs = np.where(y > 0, self.hi, np.where(y < 0, self.lo, 0))
+        return sum(values) + y.dot(rhs)
+
+    def Solve(self):
+        start = time()
+        self.split()
+        self.start()
+        try:
+            return self.iterate(start)
+        finally:
+            self.close()
+
+    def iterate(self, start):
+        self.createMaster()
+        S = len(self.blocks)
+        for s, (lb, ub, A, lo, hi) in enumerate(self.blocks):
+            # All zero is feasible unless limits force flow
+            if (lb <= 0).all() and (ub >= 0).all() and (lo <= 0).all() and (hi >= 0).all():
+                self.addColumn(s, np.zeros(len(lb)))
+        y = np.zeros(len(self.rows))
+        results = self.price(y)
+        for s, (value, x) in enumerate(results):
+            self.addColumn(s, x)
+        self.upper = self.bound(y, [v for v, x in results])
+        self.lower = -np.inf
+        self.history = []
+        self.status = 'iteration limit'
+        for it in range(1, self.max_iter + 1):
+            status = self.master.Solve()
+            if status != OPTIMAL:
+                raise RuntimeError('master ended with status %d' % status)
+            infeasibility = sum(v.solution_value() for v in self.artificial)
+            if infeasibility <= 1e-9:
+                self.lower = max(self.lower, self.objective.Value() + self.penalty * infeasibility)
+            y, mu = self.duals()
+            results = self.price(y)
+            self.upper = min(self.upper, self.bound(y, [v for v, x in results]))
+            added = 0
+            for s, (value, x) in enumerate(results):
+                if value - mu[s] > 1e-9 * max(1.0, abs(value)):
+                    self.addColumn(s, x)
+                    added += 1
+            self.iterations = it
+            self.history.append((it, self.lower, self.upper, len(self.columns), time() - start))
+            if self.verbose:
+                print('%4d  lower %.12f  upper %.12f  gap %.2e  columns %d  %.2fs' % (
+                    it, self.lower, self.upper, self.relativeGap(), len(self.columns), time() - start),
+                    file=sys.stderr)
+            if self.relativeGap() <= self.gap:
+                self.status = 'optimal'
+                break
+            if not added:
+                self.status = 'optimal' if np.isfinite(self.lower) else 'infeasible'
+                break
+        if not np.isfinite(self.lower):
+            raise RuntimeError('no feasible combination of source solutions found')
+        # The combination of block solutions the master picked
+        x = np.zeros(len(self.local))
+        for s, var, xs in self.columns:
+            x[self.cols[s]] += var.solution_value() * xs
+        self.lp.x = self.X.dot(x)
+        self.lp.objective = self.lower
+        self.time = time() - start
+        return self.lp.rates()
+
+    def relativeGap(self):
+        return (self.upper - self.lower) / max(abs(self.upper), 1e-9)
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve a topology by Dantzig-Wolfe decomposition over its sources.')
+    parser.add_argument('inputs', nargs='+', help='.in or .npz topology files')
+    parser.add_argument('-j', '--processes', type=int, help='worker processes (default one per source, 0 runs in-process)')
+    parser.add_argument('-b', '--backend', default='glop')
+    parser.add_argument('-g', '--gap', type=float, default=1e-6, help='relative optimality gap to stop at')
+    parser.add_argument('--max-iter', type=int, default=500)
+    parser.add_argument('-v', '--verbose', action='store_true', help='print every iteration')
+    args = parser.parse_args()
+    print('%-24s %7s %5s %16s %16s %9s %9s %9s %s' % ('file', 'sources', 'iters', 'lower', 'upper', 'gap',
+                                                     'time (s)', 'mono (s)', 'monolithic'))
+    for filename in args.inputs:
+        dw = Decomposition.fromFile(filename, backend=args.backend, processes=args.processes,
+                                    gap=args.gap, max_iter=args.max_iter, verbose=args.verbose)
+        dw.Solve()
+        lp = SparseLP.fromFile(filename)
+        start = time()
+        lp.Solve(args.backend)
+        mono = time() - start
+        ok = dw.lower - 1e-9 <= lp.objective <= dw.upper + 1e-9
+        print('%-24s %7d %5d %16.12f %16.12f %9.2e %9.3f %9.3f %.12f %s' % (
+            filename, len(dw.blocks), dw.iterations, dw.lower, dw.upper, dw.relativeGap(), dw.time, mono,
+            lp.objective, 'ok' if ok else 'OUTSIDE BOUNDS'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+from __future__ import print_function
+import argparse
+import os
+import numpy as np
+from loader import Topology
+
+# Seeded families of topologies, each returned as (Topology, positions)
+# where positions is an (nodes, 2) array for the .pos file.
+#   line(n)                 path 0 -> 1 -> ... -> n-1 (GenerateInputLine.py)
+#   butterfly(depth)        2**depth wide butterfly with depth stages
+#   layered(layers, width)  consecutive layers joined with probability p
+#   randomDag(n, p)         every forward pair i < j joined with probability p
+#   grid(rows, cols)        edges to the right and downwards
+# d and r are drawn from a distribution given as a number ('0.1') or as
+# 'uniform:a,b', 'normal:mu,sigma' or 'beta:a,b'.
+
+def parseDist(spec):
+    if isinstance(spec, (int, float)):
+        return float(spec), None
+    spec = str(spec)
+    if ':' not in spec:
+        return float(spec), None
+    kind, args = spec.split(':', 1)
+    args = [float(x) for x in args.split(',')]
+    if kind not in ('uniform', 'normal', 'beta') or len(args) != 2:
+        raise ValueError('bad distribution %r' % spec)
+    return kind, args
+
+def draw(rng, spec, n, lo, hi):
+    kind, args = parseDist(spec)
+    if args is None:
+        x = np.full(n, kind)
+    elif kind == 'uniform':
+        x = rng.uniform(args[0], args[1], n)
+    elif kind == 'normal':
+        x = rng.normal(args[0], args[1], n)
+    else:
+        x = rng.beta(args[0], args[1], n)
+    # r is a divisor and d a loss rate, keep both inside the open interval
+    return np.clip(x, lo, hi)
+
+def choosePairs(rng, source, destination, pairs):
+    # pairs is 'all' or a number of random pairs, every source gets one
+    allPairs = np.array([(s, d) for s in source for d in destination if s != d], dtype=np.int64).reshape(-1, 2)
+    if pairs == 'all' or int(pairs) >= len(allPairs):
+        return allPairs
+    n = int(pairs)
+    first = [rng.choice(np.flatnonzero(allPairs[:, 0] == s)) for s in source]
+    rest = np.setdiff1d(np.arange(len(allPairs)), first)
+    extra = rng.choice(rest, max(0, n - len(first)), replace=False)
+    return allPairs[np.sort(np.concatenate([first, extra]).astype(np.int64))]
+
+def finish(rng, nodes, u, v, source, destination, d='0.1', r='0.05', pairs='all'):
+    m = len(u)
+    d = draw(rng, d, m, 0.0, 0.999)
+    r = draw(rng, r, m, 1e-3, 1.0)
+    s_to_d = choosePairs(rng, source, destination, pairs)
+    return Topology(nodes, u, v, d, r, source, destination, s_to_d, [], [])
+
+def line(n, rng, **kwargs):
+    u = np.arange(n - 1)
+    pos = np.column_stack([np.arange(n), np.zeros(n)])
+    return finish(rng, n, u, u + 1, [0], [n - 1], **kwargs), pos
+
+def butterfly(depth, rng, **kwargs):
+    width = 2 ** depth
+    u, v = [], []
+    for l in range(depth):
+        for i in range(width):
+            for j in (i, i ^ (1 << l)):
+                u.append(l * width + i)
+                v.append((l + 1) * width + j)
+    nodes = (depth + 1) * width
+    pos = np.column_stack([np.arange(nodes) // width, np.arange(nodes) % width])
+    return finish(rng, nodes, u, v, list(range(width)), list(range(nodes - width, nodes)), **kwargs), pos
+
+def layered(layers, width, rng, p=0.5, sources=None, destinations=None, **kwargs):
+    u, v = [], []
+    for l in range(layers - 1):
+        a = l * width + np.arange(width)
+        b = (l + 1) * width + np.arange(width)
+        mask = rng.random((width, width)) < p
+        # Every node keeps at least one edge to the next layer
+        mask[np.arange(width), rng.integers(0, width, width)] = True
+        i, j = np.nonzero(mask)
+        u.append(a[i])
+        v.append(b[j])
+    nodes = layers * width
+    u = np.concatenate(u) if u else np.zeros(0, dtype=np.int64)
+    v = np.concatenate(v) if v else np.zeros(0, dtype=np.int64)
+    source = np.arange(width)[:sources or width]
+    destination = np.arange(nodes - width, nodes)[:destinations or width]
+    pos = np.column_stack([np.arange(nodes) // width, np.arange(nodes) % width])
+    return finish(rng, nodes, u, v, source.tolist(), destination.tolist(), **kwargs), pos
+
+def randomDag(n, rng, p=0.1, sources=1, destinations=1, **kwargs):
+    # Nodes are numbered in topological order
+    total = n * (n - 1) // 2
+    m = rng.binomial(total, p) if total else 0
+    k = rng.choice(total, m, replace=False) if m else np.zeros(0, dtype=np.int64)
+    # k-th forward pair in row order: row u starts at u (2n - u - 1) / 2,
+    # the float root is off by at most one row
+    u = ((2 * n - 1 - np.sqrt((2 * n - 1) ** 2 - 8.0 * k)) // 2).astype(np.int64)
+    u -= u * (2 * n - u - 1) // 2 > k
+    u += (u + 1) * (2 * n - u - 2) // 2 <= k
+    v = k - u * (2 * n - u - 1) // 2 + u + 1
+    # Every node after the first has an edge in and every node before
+    # the last an edge out, so sources and destinations are connected
+    has_in = np.zeros(n, dtype=bool)
+    has_in[v] = True
+    has_out = np.zeros(n, dtype=bool)
+    has_out[u] = True
+    lonely = np.flatnonzero(~has_in[1:]) + 1
+    extra_u = [rng.integers(0, x) for x in lonely]
+    extra_v = lonely.tolist()
+    has_out[extra_u] = True
+    lonely = np.flatnonzero(~has_out[:-1])
+    extra_u += lonely.tolist()
+    extra_v += [rng.integers(x + 1, n) for x in lonely]
+    u = np.concatenate([u, np.asarray(extra_u, dtype=np.int64)])
+    v = np.concatenate([v, np.asarray(extra_v, dtype=np.int64)])
+    order = np.lexsort([v, u])
+    pos = np.column_stack([np.arange(n), rng.random(n) * n ** 0.5])
+    source = list(range(sources))
+    destination = list(range(n - destinations, n))
+    return finish(rng, n, u[order], v[order], source, destination, **kwargs), pos
+
+def grid(rows, cols, rng, **kwargs):
+    idx = np.arange(rows * cols).reshape(rows, cols)
+    u = np.concatenate([idx[:, :-1].ravel(), idx[:-1, :].ravel()])
+    v = np.concatenate([idx[:, 1:].ravel(), idx[1:, :].ravel()])
+    order = np.lexsort([v, u])
+    pos = np.column_stack([np.arange(rows * cols) % cols, -(np.arange(rows * cols) // cols)])
+    return finish(rng, rows * cols, u[order], v[order], [0], [rows * cols - 1], **kwargs), pos
+
+def writeTopology(topo, pos, prefix):
+    # prefix.in and prefix.pos in the format of input/
+    with open(prefix + '.in', 'w') as f:
+        f.write('%d\n%d\n' % (topo.nodes, topo.numEdges()))
+        if topo.numEdges():
+            np.savetxt(f, np.column_stack([topo.u, topo.v, topo.d, topo.r]), fmt='%d %d %.6g %.6g')
+        for lst in [topo.source, topo.destination]:
+            f.write('%d\n' % len(lst))
+            np.savetxt(f, lst, fmt='%d')
+        f.write('%d\n' % len(topo.s_to_d))
+        np.savetxt(f, topo.s_to_d, fmt='%d %d')
+        for lim in [topo.lim_s, topo.lim_R]:
+            f.write('%d\n' % len(lim))
+            np.savetxt(f, lim, fmt='%d %.6g')
+    with open(prefix + '.pos', 'w') as f:
+        np.savetxt(f, pos, fmt='%.6g %.6g')
+
+def generate(family, size, seed=0, **kwargs):
+    # size is a node count for line/randomDag, depth for butterfly,
+    # layers for layered (with width=) and rows for grid (with cols=)
+    rng = np.random.default_rng(seed)
+    if family == 'line':
+        return line(size, rng, **kwargs)
+    if family == 'butterfly':
+        return butterfly(size, rng, **kwargs)
+    if family == 'layered':
+        width = kwargs.pop('width', 4)
+        return layered(size, width, rng, **kwargs)
+    if family == 'random':
+        return randomDag(size, rng, **kwargs)
+    if family == 'grid':
+        cols = kwargs.pop('cols', None) or size
+        return grid(size, cols, rng, **kwargs)
+    raise ValueError('unknown family %r' % family)
+
+FAMILIES = ['line', 'butterfly', 'layered', 'random', 'grid']
+# Options of main() that only some families take
+OPTIONS = {'width': ['layered'], 'cols': ['grid'], 'p': ['layered', 'random'], 'sources': ['layered', 'random'],
+           'destinations': ['layered', 'random']}
+
+def main():
+    parser = argparse.ArgumentParser(description='Write seeded families of .in/.pos topologies.')
+    parser.add_argument('family', choices=FAMILIES)
+    parser.add_argument('sizes', type=int, nargs='+',
+                        help='nodes (line, random), depth (butterfly), layers (layered) or rows (grid)')
+    parser.add_argument('-o', '--out', default='input/gen', help='output directory')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--count', type=int, default=1, help='instances per size, seeds seed, seed+1, ...')
+    parser.add_argument('-d', default='0.1', help="erasure probability, e.g. 0.1 or 'uniform:0.05,0.2'")
+    parser.add_argument('-r', default='0.05', help="eavesdrop probability, e.g. 0.05 or 'beta:2,30'")
+    parser.add_argument('--pairs', default='all', help="'all' or a number of random s -> d pairs")
+    parser.add_argument('--width', type=int, help='layered: nodes per layer')
+    parser.add_argument('--cols', type=int, help='grid: columns (default rows)')
+    parser.add_argument('-p', type=float, help='layered/random: edge probability')
+    parser.add_argument('--sources', type=int, help='layered/random: number of sources')
+    parser.add_argument('--destinations', type=int, help='layered/random: number of destinations')
+    args = parser.parse_args()
+
+    kwargs = dict(d=args.d, r=args.r, pairs=args.pairs)
+    for key, families in OPTIONS.items():
+        if getattr(args, key) is not None:
+            if args.family not in families:
+                flag = '-p' if key == 'p' else '--' + key
+                parser.error('%s does not apply to %s, only to %s' % (flag, args.family, ' and '.join(families)))
+            kwargs[key] = getattr(args, key)
+    if not os.path.isdir(args.out):
+        os.makedirs(args.out)
+    for size in args.sizes:
+        for i in range(args.count):
+            seed = args.seed + i
+            topo, pos = generate(args.family, size, seed, **dict(kwargs))
+            name = '%s%d' % (args.family, size) + ('_%d' % seed if args.count > 1 else '')
+            writeTopology(topo, pos, os.path.join(args.out, name))
+            print('%s: %d nodes, %d edges' % (name, topo.nodes, topo.numEdges()))
+
+if __name__ == '__main__':
+    main()
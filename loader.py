@@ -0,0 +1,163 @@
+from __future__ import print_function
+import zipfile
+import numpy as np
+
+# Topology files (.in) hold whitespace separated numbers:
+#   nodes, edges, then `edges` lines "u v d r",
+#   sources, destinations and s -> d pairs as counted lists,
+#   lim_s and lim_R as counted "node value" lists.
+# Topology keeps them as NumPy arrays with CSR adjacency, and can be
+# stored as an uncompressed .npz whose arrays are memory-mapped on load.
+
+class Topology:
+
+    def __init__(self, nodes, u, v, d, r, source, destination, s_to_d, lim_s, lim_R):
+        self.nodes = int(nodes)
+        self.u = np.asarray(u, dtype=np.int64)
+        self.v = np.asarray(v, dtype=np.int64)
+        self.d = np.asarray(d, dtype=np.float64)
+        self.r = np.asarray(r, dtype=np.float64)
+        self.source = np.asarray(source, dtype=np.int64)
+        self.destination = np.asarray(destination, dtype=np.int64)
+        self.s_to_d = np.asarray(s_to_d, dtype=np.int64).reshape(-1, 2)
+        # (node, value) rows
+        self.lim_s = np.asarray(lim_s, dtype=np.float64).reshape(-1, 2)
+        self.lim_R = np.asarray(lim_R, dtype=np.float64).reshape(-1, 2)
+        self.createAdjacency()
+
+    def createAdjacency(self):
+        # Edge ids grouped by tail (forward) and by head (reverse), file order kept
+        self.fwd_edge = np.argsort(self.u, kind='stable')
+        self.fwd_ptr = np.concatenate([[0], np.cumsum(np.bincount(self.u, minlength=self.nodes))])
+        self.rev_edge = np.argsort(self.v, kind='stable')
+        self.rev_ptr = np.concatenate([[0], np.cumsum(np.bincount(self.v, minlength=self.nodes))])
+
+    def numEdges(self):
+        return len(self.u)
+
+    def outEdges(self, n):
+        return self.fwd_edge[self.fwd_ptr[n]:self.fwd_ptr[n+1]]
+
+    def inEdges(self, n):
+        return self.rev_edge[self.rev_ptr[n]:self.rev_ptr[n+1]]
+
+    def edgeArray(self):
+        return np.column_stack([self.u, self.v, self.d, self.r])
+
+    def graphs(self):
+        # graph / reverse_graph in the dict-of-tuples form SolverLP uses
+        graph = dict()
+        reverse_graph = dict()
+        for i, (u, v, d, r) in enumerate(zip(self.u.tolist(), self.v.tolist(), self.d.tolist(), self.r.tolist())):
+            graph.setdefault(u, []).append((v, d, r, i))
+            reverse_graph.setdefault(v, []).append((u, d, r, i))
+        return graph, reverse_graph
+
+    def pairs(self):
+        return [tuple(p) for p in self.s_to_d.tolist()]
+
+    def limits(self):
+        lim_s = dict((int(n), x) for n, x in self.lim_s.tolist())
+        lim_R = dict((int(n), x) for n, x in self.lim_R.tolist())
+        return lim_s, lim_R
+
+    def args(self):
+        # Positional arguments of SolverLP / SparseLP
+        edges = list(zip(self.u.tolist(), self.v.tolist(), self.d.tolist(), self.r.tolist()))
+        graph, reverse_graph = self.graphs()
+        s_to_d = self.pairs()
+        lim_s, lim_R = self.limits()
+        return (self.nodes, edges, self.source.tolist(), self.destination.tolist(),
+                graph, reverse_graph, s_to_d, lim_s, lim_R)
+
+    def save(self, filename):
+        # Uncompressed on purpose, so that loadBinary can memory-map it
+        np.savez(filename, nodes=np.array([self.nodes]), u=self.u, v=self.v, d=self.d, r=self.r,
+                 source=self.source, destination=self.destination, s_to_d=self.s_to_d,
+                 lim_s=self.lim_s, lim_R=self.lim_R)
+
+def parseText(text):
+    data = np.array(text.split(), dtype=np.float64)
+    pos = [0]
+
+    def take(n):
+        block = data[pos[0]:pos[0]+n]
+        if len(block) != n:
+            raise ValueError('topology ends early, expected %d more numbers' % n)
+        pos[0] += n
+        return block
+
+    def count():
+        return int(take(1)[0])
+
+    nodes = count()
+    edges = take(4 * count()).reshape(-1, 4)
+    source = take(count())
+    destination = take(count())
+    s_to_d = take(2 * count())
+    lim_s = take(2 * count())
+    lim_R = take(2 * count())
+    return Topology(nodes, edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3],
+                    source, destination, s_to_d, lim_s, lim_R)
+
+def mapArrays(filename):
+    # Every member of an uncompressed .npz as a read-only memory map
+    a = dict()
+    with zipfile.ZipFile(filename) as z, open(filename, 'rb') as f:
+        for info in z.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError('%s is compressed and cannot be memory-mapped' % filename)
+            # Skip the local file header to reach the .npy member
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype='<u2')
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            key = info.filename[:-4]
+            if np.prod(shape) == 0:
+                a[key] = np.zeros(shape, dtype=dtype)
+            else:
+                a[key] = np.memmap(filename, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                   order='F' if fortran else 'C')
+    return a
+
+def loadBinary(filename, mmap=True):
+    if not mmap:
+        with np.load(filename) as z:
+            a = dict((k, z[k]) for k in z.files)
+    else:
+        a = mapArrays(filename)
+    return Topology(int(a['nodes'][0]), a['u'], a['v'], a['d'], a['r'], a['source'],
+                    a['destination'], a['s_to_d'], a['lim_s'], a['lim_R'])
+
+def loadTopology(filename, mmap=True):
+    if filename.endswith('.npz'):
+        return loadBinary(filename, mmap)
+    with open(filename, 'r') as f:
+        return parseText(f.read())
+
+def readInput(f):
+    # SolverLP arguments from an open .in file (or stdin)
+    return parseText(f.read()).args()
+
+def readPositions(filename, nodes):
+    pos = dict()
+    with open(filename, 'r') as f:
+        for i in range(nodes):
+            pos[i] = [float(x) for x in f.readline().split()]
+    return pos
+
+def main():
+    # python loader.py input/Butterfly.in [input/Butterfly.npz]
+    from sys import argv
+    topo = loadTopology(argv[1])
+    print('%d nodes, %d edges, %d sources, %d destinations, %d pairs' % (
+        topo.nodes, topo.numEdges(), len(topo.source), len(topo.destination), len(topo.s_to_d)))
+    if len(argv) > 2:
+        topo.save(argv[2])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+from __future__ import print_function
+import argparse
+import io, contextlib
+from time import time
+import numpy as np
+
+# Exact reductions of a topology, run on the SolverLP arguments before
+# any variable is created:
+#   prune   an edge stays if it lies on an s -> d path of some pair (it
+#           can carry messages), or if a source reaches its tail and its
+#           head reaches the tail of such an edge or a node with lim_s (it
+#           can carry keys that something uses). Nodes left without edges
+#           go too, except sources, destinations and nodes with limits.
+#   series  a run of three or more edges with the same d and r through
+#           plain nodes (one edge in, one out, not a source, destination
+#           or limit) keeps its first two edges, the second one now ends
+#           where the run ends. The first edge bounds the keys that reach
+#           the second by its capacity 1-d-R, so the second can use e alone
+#           and still pass them all on, and every later copy of it only
+#           repeats the second's rows.
+# Parallel edges stay as they are: every edge has its own Cap and LM rows,
+# keyed by (u, v), and no single edge of that form carries a whole bundle.
+# Nodes are numbered again in their old order; node_map and edge_map give
+# the new index of every original node and edge (-1 if it is gone). An
+# edge cut from a run maps to the edge that stands for the run, whose
+# message flow it shares. update() and limits() carry later changes of the
+# original topology over to the reduced one, as far as the reductions
+# stay exact under them.
+
+def reachable(starts, adj):
+    seen = set(starts)
+    stack = list(seen)
+    while stack:
+        n = stack.pop()
+        for x in adj.get(n, []):
+            if x[0] not in seen:
+                seen.add(x[0])
+                stack.append(x[0])
+    return seen
+
+class Presolve:
+
+    def __init__(self, nodes, edges, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R, series=True):
+        self.nodes = nodes
+        self.edges = [tuple(e) for e in edges]
+        if graph is None or reverse_graph is None:
+            graph, reverse_graph = dict(), dict()
+            for i, (u, v, d, r) in enumerate(self.edges):
+                graph.setdefault(int(u), []).append((int(v), d, r, i))
+                reverse_graph.setdefault(int(v), []).append((int(u), d, r, i))
+        self.source = list(source)
+        self.destination = list(destination)
+        self.s_to_d = list(s_to_d)
+        self.lim_s = dict(lim_s)
+        self.lim_R = dict(lim_R)
+        self.special = set(self.source) | set(self.destination) | set(self.lim_s) | set(self.lim_R)
+        for s, d in self.s_to_d:
+            self.special.update((s, d))
+        start = time()
+        keep = self.prune(graph, reverse_graph)
+        self.pruned = len(self.edges) - len(keep)
+        # head[i] is where kept edge i ends, a run moves it
+        head = dict((i, int(self.edges[i][1])) for i in keep)
+        target = dict((i, i) for i in keep)
+        # Collapsed runs, by original edge index
+        self.runs = []
+        if series:
+            self.collapse(keep, head, target)
+        self.series = len(keep) - len(set(target.values()))
+        self.renumber(keep, head, target)
+        self.time = time() - start
+
+    def prune(self, graph, reverse_graph):
+        # Indices of the edges that can carry messages or used keys
+        message = set()
+        for s, d in dict.fromkeys(self.s_to_d):
+            after, before = reachable([s], graph), reachable([d], reverse_graph)
+            message.update(i for i, (u, v, de, re) in enumerate(self.edges) if u in after and v in before)
+        tails = set(self.edges[i][0] for i in message)
+        tails.update(n for n in self.lim_s if n not in self.source)
+        fed, feeds = reachable(self.source, graph), reachable(tails, reverse_graph)
+        return sorted(i for i, (u, v, d, r) in enumerate(self.edges)
+                      if i in message or (u in fed and v in feeds))
+
+    def collapse(self, keep, head, target):
+        out = dict()
+        into = dict()
+        for i in keep:
+            u, v, d, r = self.edges[i]
+            out.setdefault(u, []).append(i)
+            into.setdefault(v, []).append(i)
+
+        def plain(n):
+            return n not in self.special and len(out.get(n, [])) == 1 and len(into.get(n, [])) == 1
+
+        def same(i, j):
+            return self.edges[i][2:] == self.edges[j][2:]
+
+        seen = set()
+        for i in keep:
+            u = self.edges[i][0]
+            # Runs start where the edge before is not part of them
+            if i in seen or (plain(u) and same(into[u][0], i)):
+                continue
+            run = [i]
+            seen.add(i)
+            while plain(head[run[-1]]) and same(out[head[run[-1]]][0], i) and out[head[run[-1]]][0] not in seen:
+                run.append(out[head[run[-1]]][0])
+                seen.add(run[-1])
+            if len(run) < 3:
+                continue
+            head[run[1]] = head[run[-1]]
+            for j in run[2:]:
+                target[j] = run[1]
+            self.runs.append(run)
+
+    def renumber(self, keep, head, target):
+        used = set(self.special)
+        for i in keep:
+            if target[i] == i:
+                used.update((int(self.edges[i][0]), head[i]))
+        order = sorted(used)
+        self.node_map = np.full(self.nodes, -1, dtype=np.int64)
+        self.node_map[order] = np.arange(len(order))
+        n = self.node_map
+        self.reduced = []
+        self.edge_map = np.full(len(self.edges), -1, dtype=np.int64)
+        for i in keep:
+            if target[i] == i:
+                u, v, d, r = self.edges[i]
+                self.edge_map[i] = len(self.reduced)
+                self.reduced.append((int(n[u]), int(n[head[i]]), d, r))
+        for i in keep:
+            self.edge_map[i] = self.edge_map[target[i]]
+
+    def args(self):
+        # Positional arguments of SolverLP for the reduced topology
+        n = self.node_map
+        edges = list(self.reduced)
+        graph, reverse_graph = dict(), dict()
+        for i, (u, v, d, r) in enumerate(edges):
+            graph.setdefault(u, []).append((v, d, r, i))
+            reverse_graph.setdefault(v, []).append((u, d, r, i))
+        return (int((n >= 0).sum()), edges, [int(n[x]) for x in self.source], [int(n[x]) for x in self.destination],
+                graph, reverse_graph, [(int(n[s]), int(n[d])) for s, d in self.s_to_d],
+                dict((int(n[x]), y) for x, y in self.lim_s.items()), dict((int(n[x]), y) for x, y in self.lim_R.items()))
+
+    def update(self, changes):
+        # Applies {edge: (d, r)} to the original edges, None keeps a value,
+        # and returns the changes of the reduced edges. The edges of a run
+        # stand for each other only while they share d and r
+        edges = list(self.edges)
+        for i, (d, r) in changes.items():
+            u, v, de, re = edges[i]
+            edges[i] = (u, v, de if d is None else d, re if r is None else r)
+        for run in self.runs:
+            if len(set(edges[i][2:] for i in run)) > 1:
+                raise ValueError('edges %s are collapsed into one and can only change together, build without '
+                                 'presolve to change them one by one' % run)
+        self.edges = edges
+        ret = dict()
+        for i in changes:
+            if self.edge_map[i] >= 0:
+                ret[int(self.edge_map[i])] = edges[i][2:]
+        return ret
+
+    def limits(self, lim_s=None, lim_R=None):
+        # {node: value or None} of the original nodes for the reduced ones.
+        # Only a node that had the limit can change it, a new one could
+        # keep edges the presolve has removed
+        ret = []
+        for name, lim, new in [('lim_s', self.lim_s, lim_s), ('lim_R', self.lim_R, lim_R)]:
+            for n in new or dict():
+                if n not in lim:
+                    raise ValueError('node %d had no %s before the presolve, build without presolve to add one'
+                                     % (n, name))
+            ret.append(dict((int(self.node_map[n]), x) for n, x in (new or dict()).items()))
+        return ret
+
+    def edgeValues(self, x):
+        # Per-edge values of the reduced model on the original edges, 0 on
+        # pruned ones
+        x = np.asarray(x, dtype=np.float64)
+        return np.where(self.edge_map >= 0, x[np.maximum(self.edge_map, 0)] if len(x) else 0.0, 0.0)
+
+    def stats(self):
+        return {'nodes': self.nodes, 'edges': len(self.edges), 'reduced_nodes': int((self.node_map >= 0).sum()),
+                'reduced_edges': len(self.reduced), 'pruned': self.pruned, 'series': self.series, 'time': self.time}
+
+def check(filenames, backend='glop', keyflow='full', tol=1e-9):
+    # Presolved and full models must reach the same objective
+    from project import SolverLP
+    bad = 0
+    print('%-24s %11s %11s %15s %15s %16s %16s %9s %9s' % ('file', 'nodes', 'edges', 'full vars/rows', 'presolved',
+                                                         'full', 'presolved', 'full', 'presolved'))
+    for filename in filenames:
+        ret = []
+        for presolve in [False, True]:
+            start = time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                with SolverLP.fromFile(filename, backend=backend, keyflow=keyflow, presolve=presolve, debug=False) as solv:
+                    solv.build()
+                    solv.solver.Solve()
+                    ret.append((solv.solver.NumVariables(), solv.solver.NumConstraints(),
+                                solv.solver.Objective().Value(), time() - start, solv.presolved))
+                    weight = solv.edgesWeight()
+        stats = ret[1][4].stats()
+        ok = abs(ret[0][2] - ret[1][2]) <= tol * max(1, abs(ret[0][2])) and len(weight) == stats['edges']
+        bad += not ok
+        print('%-24s %5d/%-5d %5d/%-5d %7d/%-7d %7d/%-7d %16.12f %16.12f %8.3fs %8.3fs %s' % (
+            filename, stats['nodes'], stats['reduced_nodes'], stats['edges'], stats['reduced_edges'],
+            ret[0][0], ret[0][1], ret[1][0], ret[1][1], ret[0][2], ret[1][2], ret[0][3], ret[1][3],
+            'ok' if ok else 'MISMATCH'))
+    return bad
+
+def main():
+    parser = argparse.ArgumentParser(description='Reduce topologies before building the LP and check that the '
+                                     'objective does not change.')
+    parser.add_argument('inputs', nargs='*', help='.in or .npz topology files (default input/*.in)')
+    parser.add_argument('-b', '--backend', default='glop')
+    parser.add_argument('-k', '--keyflow', default='full', choices=['full', 'reduced'])
+    args = parser.parse_args()
+    from glob import glob
+    if check(args.inputs or sorted(glob('input/*.in')), args.backend, args.keyflow):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,390 +1,611 @@
 from __future__ import print_function
-from ortools.linear_solver import pywraplp
+import numpy as np
+from backend import createSolver, OPTIMAL
+from registry import Registry
+from presolve import Presolve
+from loader import loadTopology, readInput
 from pprint import pprint
-from sys import argv
+from itertools import combinations
+from sys import argv, stdin, exit
+from os import environ, path, replace
+import hashlib
+import json
 
-def show(num):
-    return "{:.3f}".format(num)
+# Debug output is switched on by `python project.py debug`, by NC_DEBUG=1
+# or per model with SolverLP(..., debug=True). It is read once here.
+DEBUG_MODE = (len(argv) > 1 and argv[1] == 'debug') or environ.get('NC_DEBUG', '0') not in ('', '0')
 
-def DEBUG(text):
-    if len(argv) > 1:
-        if argv[1] == 'debug':
-            print(text)
+# Structured arrays of SolverLP.variableTable(), rowTable(), pairRates()
+# and edgeLoads(). index holds up to three indices, -1 padded
+VARIABLE_DTYPE = np.dtype([('family', 'U8'), ('index', np.int32, 3), ('column', np.int32),
+                           ('value', np.float64), ('reduced_cost', np.float64)])
+ROW_DTYPE = np.dtype([('family', 'U16'), ('key', 'U48'), ('row', np.int32), ('dual', np.float64)])
+PAIR_DTYPE = np.dtype([('s', np.int32), ('d', np.int32), ('rate', np.float64)])
+EDGE_DTYPE = np.dtype([('u', np.int32), ('v', np.int32), ('message', np.float64), ('key', np.float64),
+                       ('random', np.float64), ('used', np.float64), ('capacity', np.float64),
+                       ('slack', np.float64), ('dual', np.float64), ('bottleneck', bool)])
+
+# keyflow='reduced' keeps the key commodity s -> d only in the form the
+# optimum needs, every step exact:
+#   unused  d whose key bits can reach no tail of an edge that carries
+#           messages, and that has no lim_s, gets none: E_d is 0
+#   cuts    E_s[d] <= max flow s -> d is a row per minimal s -> d edge cut
+#           (max-flow min-cut) instead of a flow, for d with at most
+#           CUT_NODES nodes between s and d and no more cuts than edges
+#   chain   d reached through single in-edges from an anchor a is bounded
+#           by the commodity s -> a and a ChainCap row per chain edge,
+#           or by the cuts of s -> a and the chain edges as cuts
+# Cuts and chains are left out on cycles. A share k_s, e_s on an edge only
+# one source's keys can use, or E_s of a node only one source reaches, is
+# the total k, e or E_node itself.
+CUT_NODES = 8
 
 class SolverLP:    
 
-    solver = pywraplp.Solver('Network', pywraplp.Solver.GLOP_LINEAR_PROGRAMMING)
-    # Constraints
-    constraints = dict()
+    def __init__(self, nodes, edges, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R, prune=True, debug=None, dump=None, backend='glop', keyflow='full', presolve=False):
+        # Every instance owns its solver and variables, so several models
+        # can be built and solved at the same time
+        self.solver = createSolver('Network', backend)
+        # Constraints
+        self.constraints = dict()
+
+        # Variables, by family:
+        #   R_node, E_node [node]        messages / random bits in nodes
+        #   k, e, R_edge [edge]          random bits k, e and messages on edges
+        #   k_s, e_s, R_s_edge [s, edge] their share from source s
+        #   E_s, R_s [s, node]           node totals from source s
+        #   f_k [s, d, edge]             flow of keys
+        #   f_R [pair, edge]             flow of messages
+        # with s the position in source, edge the index in edges and pair
+        # the position in s_to_d without duplicates
+        self.vars = Registry(self.solver)
 
-    # Variables
-    R = dict() # Messages
-    k = dict() # Random bits k (on edges)
-    e = dict() # Random bits e (on edges)
-    E = dict() # Random bits in nodes
-    f_k = dict() # Flow of Keys
-    f_R = dict() # Flow of Messages
+        # presolve=True builds the model of the topology Presolve reduces:
+        # nodes, edges and every index below are the reduced ones. The
+        # edits (updateEdge() to sweep()) take and the edge reports
+        # (edgesWeight(), edgeLoads(), bottlenecks(), report()) give the
+        # original edges and nodes
+        self.presolved = None
+        if presolve:
+            self.presolved = Presolve(nodes, edges, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R)
+            nodes, edges, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R = self.presolved.args()
 
-    def __init__(self, nodes, edges, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R):
+        # Own copies, updateEdge(), addEdge() and updateLimits() change
+        # them and other models may be built from the same arguments
         self.nodes = nodes
-        self.edges = edges
-        self.source = source
-        self.destination = destination
-        self.graph = graph
-        self.reverse_graph = reverse_graph
-        self.s_to_d = s_to_d
-        self.lim_s = lim_s
-        self.lim_R = lim_R
+        self.edges = list(edges)
+        self.source = list(source)
+        self.destination = list(destination)
+        self.graph = dict((u, list(x)) for u, x in graph.items())
+        self.reverse_graph = dict((v, list(x)) for v, x in reverse_graph.items())
+        self.s_to_d = list(s_to_d)
+        self.lim_s = dict(lim_s)
+        self.lim_R = dict(lim_R)
+        # Only create flow variables on edges that lie on some s -> d path
+        self.prune = prune
+        self.desc = None
+        # 'full' builds one key commodity per (source, non-source node),
+        # 'reduced' only what createKeyPlan() keeps
+        if keyflow not in ('full', 'reduced'):
+            raise ValueError('keyflow must be full or reduced, not %r' % keyflow)
+        self.keyflow = keyflow
+        self.key_skip = set()
+        self.key_flow, self.key_cuts, self.key_chain = set(), dict(), dict()
+        self.key_users, self.key_sources, self.key_cut_rows = dict(), dict(), dict()
+        # Edge indices switched off by disableEdge()
+        self.disabled = set()
+        self.built = False
+        self.debug = DEBUG_MODE if debug is None else debug
+        # Write the built model to this .lp/.mps file before solving
+        self.dump = environ.get('NC_DUMP') if dump is None else dump
+        # (file, key) of a saved built model, set by fromFile(compiled=True)
+        self.compiled = None
+
+    @classmethod
+    def fromFile(cls, filename, compiled=None, **kwargs):
+        # .in text or .npz binary topology. compiled=True (or NC_COMPILED=1)
+        # saves the built model next to the file, input/X.in ->
+        # input/X.model.npz, and later builds load it instead
+        solv = cls(*loadTopology(filename).args(), **kwargs)
+        if compiled is None:
+            compiled = environ.get('NC_COMPILED', '0') not in ('', '0')
+        # Loaded rows and columns have no names to debug or dump with
+        if compiled and not (solv.debug or solv.dump):
+            solv.compiled = (compiledPath(filename), solv.modelKey(filename))
+        return solv
+
+    def modelKey(self, filename):
+        # A saved model is only used for the same file contents, options,
+        # solver and MODEL_VERSION
+        from cache import MODEL_VERSION, solverVersion
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        backend = self.solver.stats['backend']
+        digest.update(json.dumps([self.prune, self.keyflow, self.presolved is not None, backend,
+                                  solverVersion(backend), MODEL_VERSION]).encode())
+        return digest.hexdigest()
+
+    def saveBuilt(self, filename, key):
+        # Solver model, variable tables and row keys in one .npz, written
+        # to a temporary file first so that a reader never sees half of it
+        arrays = dict(('model_' + k, v) for k, v in self.solver.saveModel().items())
+        arrays.update(('vars_' + k, v) for k, v in self.vars.arrays().items())
+        rows = [[mp, ct.index()] for mp, ct in self.constraints.items()]
+        arrays['index'] = np.array(json.dumps({'key': key, 'rows': rows}))
+        tmp = '%s.%d.tmp' % (filename, id(self))
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        replace(tmp, filename)
+
+    def loadBuilt(self, filename, key):
+        # Builds the model from saveBuilt()'s file, False if there is none
+        # for this key
+        if not path.exists(filename):
+            return False
+        with np.load(filename) as data:
+            index = json.loads(str(data['index']))
+            if index['key'] != key:
+                return False
+            self.createIndex()
+            self.solver.restoreModel(dict((k[6:], data[k]) for k in data.files if k.startswith('model_')))
+            self.vars.restore(dict((k[5:], data[k]) for k in data.files if k.startswith('vars_')))
+        rows = self.solver.constraints()
+        self.constraints = dict((tupled(mp), rows[i]) for mp, i in index['rows'])
+        if self.prune or self.keyflow == 'reduced':
+            self.createReachability()
+        if self.keyflow == 'reduced':
+            self.createKeyPlan()
+        self.objective = self.solver.Objective()
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Clear()
+        return False
+
+    def createIndex(self):
+        # Dense positions of sources, edges and pairs for the registry
+        self.src_id = dict((s, i) for i, s in enumerate(dict.fromkeys(self.source)))
+        self.edge_id = dict(((u, v), i) for i, (u, v, d, r) in enumerate(self.edges))
+        self.pair_id = dict((p, i) for i, p in enumerate(dict.fromkeys(self.s_to_d)))
+        V, M, S, P = self.nodes, len(self.edges), len(self.src_id), len(self.pair_id)
+        for name, shape in [('R_node', [V]), ('E_node', [V]), ('k', [M]), ('e', [M]), ('R_edge', [M]),
+                            ('k_s', [S, M]), ('e_s', [S, M]), ('R_s_edge', [S, M]), ('E_s', [S, V]),
+                            ('R_s', [S, V])]:
+            self.vars.family(name, shape)
+        # The flows only exist on the edges pruning keeps
+        self.vars.family('f_k', [S, V, M], sparse=True)
+        self.vars.family('f_R', [P, M], sparse=True)
+
+    def createReachability(self):
+        # desc[n] is a bitset of the nodes reachable from n (n included)
+        indeg = [0] * self.nodes
+        for u, v, d, r in self.edges:
+            indeg[v] += 1
+        order = [n for n in range(self.nodes) if indeg[n] == 0]
+        for n in order:
+            for v, de, re, i in self.graph.get(n, []):
+                indeg[v] -= 1
+                if indeg[v] == 0:
+                    order.append(v)
+        self.desc = [1 << n for n in range(self.nodes)]
+        if len(order) == self.nodes:
+            for n in reversed(order):
+                for v, de, re, i in self.graph.get(n, []):
+                    self.desc[n] |= self.desc[v]
+        else:
+            # Not a DAG, search from every node instead
+            for n in range(self.nodes):
+                stack = [n]
+                while stack:
+                    u = stack.pop()
+                    for v, de, re, i in self.graph.get(u, []):
+                        if not (self.desc[n] >> v) & 1:
+                            self.desc[n] |= 1 << v
+                            stack.append(v)
+
+    def canReach(self, u, v):
+        return not self.prune or (self.desc[u] >> v) & 1 == 1
+
+    def onPath(self, s, d, edge):
+        # edge can carry s -> d flow
+        return self.canReach(s, edge[0]) and self.canReach(edge[1], d)
+
+    def createKeyPlan(self):
+        # Sorts the key commodities of the reduced model, see the comment
+        # above CUT_NODES. key_flow holds the (s, d) with a flow of their
+        # own, key_cuts and key_chain the others, key_users[i] the sources
+        # whose keys can use edge i and key_sources[d] the ones that reach d
+        desc = self.desc
+        source = set(self.source)
+
+        def reach(u, v):
+            return (desc[u] >> v) & 1 == 1
+
+        def cyclic(n):
+            return any(reach(v, n) for v, de, re, i in self.graph.get(n, []))
+
+        # Without pruning any edge may carry messages
+        tails = set(n for n in self.lim_s if n not in source)
+        for s, d in dict.fromkeys(self.s_to_d):
+            tails.update(u for u, v, de, re in self.edges if not self.prune or (reach(s, u) and reach(v, d)))
+        used = 0
+        for n in tails:
+            used |= 1 << n
+        self.key_skip = set(d for d in range(self.nodes) if d not in source and d not in tails
+                            and not any(desc[v] & used for v, de, re, i in self.graph.get(d, [])))
+
+        chains = dict()
+        for d in range(self.nodes):
+            if d in source or d in self.key_skip:
+                continue
+            chain, a, seen = [], d, set([d])
+            while a not in source and len(self.reverse_graph.get(a, [])) == 1:
+                u, de, re, i = self.reverse_graph[a][0]
+                chain.append(i)
+                a = u
+                if a in seen:
+                    # A cycle, no anchor to hang the chain on
+                    chain = []
+                    break
+                seen.add(a)
+            if chain and not any(cyclic(n) for n in seen):
+                chains[d] = (a, chain)
+
+        self.key_flow, self.key_cuts, self.key_chain = set(), dict(), dict()
+
+        def plan(s, d):
+            if (s, d) in self.key_flow or (s, d) in self.key_cuts or (s, d) in self.key_chain:
+                return
+            if d in chains and (chains[d][0] == s or chains[d][0] not in source):
+                a, chain = chains[d]
+                cuts = []
+                if a != s:
+                    plan(s, a)
+                    if (s, a) not in self.key_cuts:
+                        self.key_chain[(s, d)] = (a, chain)
+                        return
+                    cuts = self.key_cuts[(s, a)]
+                self.key_cuts[(s, d)] = cuts + [(i,) for i in chain]
+                return
+            cuts = None if cyclic(d) else self.keyCuts(s, d)
+            if cuts is None:
+                self.key_flow.add((s, d))
+            else:
+                self.key_cuts[(s, d)] = cuts
+
+        self.key_users, self.key_sources, self.key_cut_rows = dict(), dict(), dict()
+        for s, si in self.src_id.items():
+            for d in range(self.nodes):
+                if d in source or d in self.key_skip or not (reach(s, d) or (not self.prune and cyclic(d))):
+                    continue
+                plan(s, d)
+                if (s, d) in self.key_flow:
+                    edges = [i for i, (u, v, de, re) in enumerate(self.edges) if self.onPath(s, d, (u, v))]
+                elif (s, d) in self.key_cuts:
+                    edges = []
+                    for j, cut in enumerate(self.key_cuts[(s, d)]):
+                        edges += cut
+                        for i in cut:
+                            self.key_cut_rows.setdefault(i, []).append((si, ('KeyCut', s, d, j)))
+                else:
+                    edges = self.key_chain[(s, d)][1]
+                self.key_sources.setdefault(d, set()).add(si)
+                for i in edges:
+                    self.key_users.setdefault(i, set()).add(si)
+
+    def keyCuts(self, s, d):
+        # Minimal s -> d edge cuts among the edges s -> d can use, None if
+        # there are too many nodes between them to try every side or more
+        # cuts than edges
+        desc = self.desc
+        mids = [n for n in range(self.nodes) if n != s and n != d and (desc[s] >> n) & 1 and (desc[n] >> d) & 1]
+        if len(mids) > CUT_NODES:
+            return None
+        edges = [(i, u, v) for i, (u, v, de, re) in enumerate(self.edges) if (desc[s] >> u) & 1 and (desc[v] >> d) & 1]
+        found = set()
+        for mask in range(1 << len(mids)):
+            side = set([s])
+            side.update(n for j, n in enumerate(mids) if (mask >> j) & 1)
+            found.add(frozenset(i for i, u, v in edges if u in side and v not in side))
+        cuts = [c for c in found if not any(x < c for x in found)]
+        if len(cuts) > len(edges):
+            return None
+        return sorted(tuple(sorted(c)) for c in cuts)
+
+    def keyCommodity(self, s, d):
+        # Whether s -> d keeps its own key flow variables
+        return self.keyflow == 'full' or (s, d) in self.key_flow
+
+    def keyShare(self, name, si, i):
+        # k_s / e_s of source si on edge i, the total k / e when it is the
+        # only source whose keys can use the edge
+        if self.keyflow == 'reduced' and len(self.key_users.get(i, ())) == 1:
+            return self.var(name[0], i)
+        return self.var(name, si, i)
+
+    def keyBits(self, si, u):
+        # E_s of source si in node u, E_node when it is the only source
+        # that reaches u
+        if self.keyflow == 'reduced' and len(self.key_sources.get(u, ())) == 1:
+            return self.var('E_node', u)
+        return self.var('E_s', si, u)
+
+    def rowName(self, mp):
+        # Rows and variables are only named when the model is going to be dumped
+        if self.debug or self.dump:
+            return '_'.join(str(x) for x in mp).replace(' ', '')
+        return ''
+
+    def newVar(self, name, index, lb, ub):
+        # Building again after addEdge() only creates what is missing
+        return self.vars.add(name, index, lb, ub, self.rowName((name,) + index))
+
+    def var(self, name, *index):
+        return self.vars.var(name, index)
+
+    def newRow(self, mp, lb, ub):
+        if mp not in self.constraints:
+            self.constraints[mp] = self.solver.Constraint(lb, ub, self.rowName(mp))
+        return self.constraints[mp]
 
     def createVariables(self):
         INF = self.solver.infinity()
+        self.createIndex()
+        if self.prune or self.keyflow == 'reduced':
+            self.createReachability()
+        if self.keyflow == 'reduced':
+            self.createKeyPlan()
         # Variables in nodes
         for i in range(self.nodes):
             if i in self.lim_R:
-                self.R[i] = self.solver.NumVar(self.lim_R[i], self.lim_R[i], 'R_'+str(i))
+                self.newVar('R_node', (i,), self.lim_R[i], self.lim_R[i])
             else:
-                self.R[i] = self.solver.NumVar(0, INF, 'R_'+str(i))
+                self.newVar('R_node', (i,), 0, INF)
             if i in self.lim_s:
-                self.E[i] = self.solver.NumVar(self.lim_s[i], self.lim_s[i], 'E_'+str(i))
+                self.newVar('E_node', (i,), self.lim_s[i], self.lim_s[i])
             else:
-                self.E[i] = self.solver.NumVar(0, INF, 'E_'+str(i))
+                self.newVar('E_node', (i,), 0, INF)
         
         # Variables on edges
-        for u, v, d, r in self.edges:
-            edge = (u, v)
-            nm = 'k_('+str(u)+','+str(v)+')'
-            self.k[edge] = self.solver.NumVar(0, INF, nm)
-            nm = 'e_('+str(u)+','+str(v)+')'
-            self.e[edge] = self.solver.NumVar(0, INF, nm)
-            nm = 'R_('+str(u)+','+str(v)+')'
-            self.R[edge] = self.solver.NumVar(0, INF, nm)
+        for i in range(len(self.edges)):
+            self.newVar('k', (i,), 0, INF)
+            self.newVar('e', (i,), 0, INF)
+            self.newVar('R_edge', (i,), 0, INF)
         
         # Create Flow Variables
-        for s in self.source:
+        for s, si in self.src_id.items():
             for d in range(self.nodes):
-                if d in self.source:
+                if d in self.source or not self.keyCommodity(s, d):
                     continue
-                for u, v, de, re in self.edges:
-                    edge = (u, v)
-                    key = (s, d, edge)
-                    nm = 'f_k('+str(s)+' to '+str(d)+','+str(edge)+')'
-                    self.f_k[key] = self.solver.NumVar(0, INF, nm)
+                for i, (u, v, de, re) in enumerate(self.edges):
+                    if not self.onPath(s, d, (u, v)):
+                        continue
+                    self.newVar('f_k', (si, d, i), 0, INF)
         
     def createSecurityConstraint(self):
         INF = self.solver.infinity()
-        DEBUG("==== Security Constraints ====")
-        DEBUG('--Key--')
-        for u, v, d, r in self.edges:
+        var = self.var
+        for i, (u, v, d, r) in enumerate(self.edges):
             edge = (u, v)
             # Constraint 1 Random bits for generate Key
             mp = ('Key', edge)
-            self.constraints[mp] = self.solver.Constraint(0, INF)
-            self.constraints[mp].SetCoefficient(self.k[edge], 1-d*r)
-            self.constraints[mp].SetCoefficient(self.e[edge], (1-d)*r)
-            self.constraints[mp].SetCoefficient(self.R[edge], -(1-r))
-            DEBUG(show(1-d*r) + ' ' + self.k[edge].name() + ' + ' +
-                  show((1-d)*r) + ' ' + self.e[edge].name() + ' >= ' +
-                  show((1-r)) + ' ' + self.R[edge].name() )
-        DEBUG('--Capacity--')
-        for u, v, d, r in self.edges:
+            self.newRow(mp, 0, INF)
+            self.constraints[mp].SetCoefficient(var('k', i), 1-d*r)
+            self.constraints[mp].SetCoefficient(var('e', i), (1-d)*r)
+            self.constraints[mp].SetCoefficient(var('R_edge', i), -(1-r))
+        for i, (u, v, d, r) in enumerate(self.edges):
             edge = (u, v)
             # Constraint 2 Capacity
             mp = ('Cap', edge)
-            self.constraints[mp] = self.solver.Constraint(-INF, 1-d)
-            self.constraints[mp].SetCoefficient(self.R[edge], 1)
-            self.constraints[mp].SetCoefficient(self.k[edge], 1/r)
-            self.constraints[mp].SetCoefficient(self.e[edge], 1)
-            # print('--Capacity--')
-            DEBUG(self.R[edge].name() + ' + ' +
-                  show(1/r) + ' ' + self.k[edge].name() + ' + ' +
-                  self.e[edge].name() + ' <= ' + show(1-d))
-        DEBUG('--Limit of random bits--')
-        for u, v, d, r in self.edges:
+            self.newRow(mp, -INF, 1-d)
+            self.constraints[mp].SetCoefficient(var('R_edge', i), 1)
+            self.constraints[mp].SetCoefficient(var('k', i), 1/r)
+            self.constraints[mp].SetCoefficient(var('e', i), 1)
+        for i, (u, v, d, r) in enumerate(self.edges):
             edge = (u, v)
             # Constraint 3 u has random bits for sending
             mp = ('LM', edge)
-            self.constraints[mp] = self.solver.Constraint(-INF, 0)
-            self.constraints[mp].SetCoefficient(self.k[edge], 1-d*r)
-            self.constraints[mp].SetCoefficient(self.E[u], -(1-d)*r)
-            self.constraints[mp].SetCoefficient(self.e[edge], (1-d)*r)
-            DEBUG(show(1-d*r) + ' ' + self.k[edge].name() + ' <= ' +
-                  show((1-d)*r) + ' ' + '(' + self.E[u].name() + ' - ' + self.e[edge].name() + ')')
-        DEBUG('--Summation of e from source--')
-        for u, v, d, r in self.edges:
-            edge = (u, v)
-            # Constraint 4 Sum e_e = Sum e_e from Si
-            mp = ('Sum_e_e', edge)
-            self.constraints[mp] = self.solver.Constraint(0, 0)
-            self.constraints[mp].SetCoefficient(self.e[edge], 1)
-            plus = False
-            out = self.e[edge].name() + ' = '
-            for w in self.source:
-                s_e = (w, 'to', edge)
-                nm = 'e_('+str(w)+' to '+str(edge)+')'
-                self.e[s_e] = self.solver.NumVar(0, INF, nm)
-                self.constraints[mp].SetCoefficient(self.e[s_e], -1)
-                out += (' + ' if plus else '') + self.e[s_e].name()
-                plus = True
-            DEBUG(out)
-        DEBUG('--Summation of k from source--')
-        for u, v, d, r in self.edges:
-            edge = (u, v)
-            # Constraint 5 Sum ke = Sum ke from Si
-            mp = ('Sum_k_e', edge)
-            self.constraints[mp] = self.solver.Constraint(0, 0)
-            self.constraints[mp].SetCoefficient(self.k[edge], 1)
-            plus = False
-            out = self.k[edge].name() + ' = '
-            for w in self.source:
-                s_e = (w, 'to', edge)
-                nm = 'k_('+str(w)+' to '+str(edge)+')'
-                self.k[s_e] = self.solver.NumVar(0, INF, nm)
-                self.constraints[mp].SetCoefficient(self.k[s_e], -1)
-                out += (' + ' if plus else '') + self.k[s_e].name()
-                plus = True
-            DEBUG(out)
-        DEBUG('--Summation of E from source--')
-        for u in range(self.nodes):
-            if u not in self.source:
-                # Constraint 6 Eu = Sum Eu from Si
-                mp = ('Sum_E_u', u)
-                self.constraints[mp] = self.solver.Constraint(0, 0)
-                self.constraints[mp].SetCoefficient(self.E[u], 1)
-                out = self.E[u].name() + ' = '
-                plus = False
-                for s in self.source:
-                    s_u = (s, 'to', u)
-                    nm = 'E_('+str(s)+' to '+str(u)+')'
-                    self.E[s_u] = self.solver.NumVar(0, INF, nm)
-                    self.constraints[mp].SetCoefficient(self.E[s_u], -1)
-                    out += (' + ' if plus else '') + self.E[s_u].name()
-                    plus = True
-                DEBUG(out)
-        DEBUG('--Summation of R_u from source--')
-        for u in range(self.nodes):
-            if u not in self.source:
-                mp = ('Sum_R_u', u)
-                self.constraints[mp] = self.solver.Constraint(0, 0)
-                self.constraints[mp].SetCoefficient(self.R[u], 1)
-                out = self.R[u].name() + ' = '
-                plus = False
-                for s in self.source:
-                    s_u = (s, 'to', u)
-                    nm = 'R_('+str(s)+' to '+str(u)+')'
-                    self.R[s_u] = self.solver.NumVar(0, INF, nm)
-                    self.constraints[mp].SetCoefficient(self.R[s_u], -1)
-                    out += (' + ' if plus else '') + self.R[s_u].name()
-                    plus = True
-                DEBUG(out)
-        DEBUG('--Summation of R_e from source--')
-        for u, v, d, r in self.edges:
-            edge = (u, v)
-            mp = ('Sum_R_e', edge)
-            self.constraints[mp] = self.solver.Constraint(0, 0)
-            self.constraints[mp].SetCoefficient(self.R[edge], 1)
-            plus = False
-            out = self.R[edge].name() + ' = '
-            for w in self.source:
-                s_e = (w, 'to', edge)
-                nm = 'R_('+str(w)+' to '+str(edge)+')'
-                self.R[s_e] = self.solver.NumVar(0, INF, nm)
-                self.constraints[mp].SetCoefficient(self.R[s_e], -1)
-                out += (' + ' if plus else '') + self.R[s_e].name()
-                plus = True
-            DEBUG(out)
+            self.newRow(mp, -INF, 0)
+            self.constraints[mp].SetCoefficient(var('k', i), 1-d*r)
+            self.constraints[mp].SetCoefficient(var('E_node', u), -(1-d)*r)
+            self.constraints[mp].SetCoefficient(var('e', i), (1-d)*r)
+        # Constraint 4 Sum e_e = Sum e_e from Si
+        # Constraint 5 Sum ke = Sum ke from Si
+        # and Sum R_e = Sum R_e from Si
+        for name, total, part in [('Sum_e_e', 'e', 'e_s'), ('Sum_k_e', 'k', 'k_s'), ('Sum_R_e', 'R_edge', 'R_s_edge')]:
+            for i, (u, v, d, r) in enumerate(self.edges):
+                parts = self.src_id.values()
+                if self.keyflow == 'reduced' and part != 'R_s_edge':
+                    parts = sorted(self.key_users.get(i, ()))
+                    if len(parts) < 2:
+                        continue
+                mp = (name, (u, v))
+                self.newRow(mp, 0, 0)
+                self.constraints[mp].SetCoefficient(var(total, i), 1)
+                for si in parts:
+                    self.newVar(part, (si, i), 0, INF)
+                    self.constraints[mp].SetCoefficient(var(part, si, i), -1)
+        # Constraint 6 Eu = Sum Eu from Si
+        # and Ru = Sum Ru from Si
+        for name, total, part in [('Sum_E_u', 'E_node', 'E_s'), ('Sum_R_u', 'R_node', 'R_s')]:
+            for u in range(self.nodes):
+                if u not in self.source:
+                    parts = self.src_id.values()
+                    if self.keyflow == 'reduced' and part == 'E_s':
+                        parts = sorted(self.key_sources.get(u, ()))
+                        if len(parts) == 1:
+                            continue
+                    mp = (name, u)
+                    self.newRow(mp, 0, 0)
+                    self.constraints[mp].SetCoefficient(var(total, u), 1)
+                    for si in parts:
+                        self.newVar(part, (si, u), 0, INF)
+                        self.constraints[mp].SetCoefficient(var(part, si, u), -1)
 
     def createFlowConstraint(self):
         INF = self.solver.infinity()
+        var = self.var
+        get = self.vars.get
 
-        DEBUG("==== Flow Constraints ====")
         # Flow in == Flow out
-        DEBUG('--Flow in == Flow out--')
-        for s in self.source:
+        for s, si in self.src_id.items():
             for d in range(self.nodes):
-                if d in self.source:
+                if d in self.source or not self.keyCommodity(s, d):
                     continue
                 for n in range(self.nodes):
                      # s to d through n
-                    if n != s and n != d:
+                    if n != s and n != d and self.canReach(s, n) and self.canReach(n, d):
                         flow = ('Flow_in_out', s, d, n)
-                        self.constraints[flow] = self.solver.Constraint(0, 0)
-                        out = ''
-                        plus = False
+                        self.newRow(flow, 0, 0)
                         # IN
-                        if n in self.reverse_graph:
-                            for u, de, re, i in self.reverse_graph[n]:
-                                edge = (u, n)
-                                key = (s, d, edge)
-                                nm = 'f_k('+str(s)+' to '+str(d)+','+str(edge)+')'
-                                self.constraints[flow].SetCoefficient(self.f_k[key], 1)
-                                out += (' + ' if plus else '') + self.f_k[key].name()
-                                plus = True
+                        for u, de, re, i in self.reverse_graph.get(n, []):
+                            x = get('f_k', (si, d, i))
+                            if x is not None:
+                                self.constraints[flow].SetCoefficient(x, 1)
                         # OUT
-                        if n in self.graph:
-                            for v, de, re, i in self.graph[n]:
-                                edge = (n, v)
-                                key = (s, d, edge)
-                                nm = 'f_k('+str(s)+' to '+str(d)+','+str(edge)+')'
-                                self.constraints[flow].SetCoefficient(self.f_k[key], -1)
-                                out += ' - ' + self.f_k[key].name()
-                        out += ' = 0'
-                        DEBUG(out)
+                        for v, de, re, i in self.graph.get(n, []):
+                            x = get('f_k', (si, d, i))
+                            if x is not None:
+                                self.constraints[flow].SetCoefficient(x, -1)
         # Flow Capacity
-        DEBUG('--Flow capacity--')
-        for s in self.source:
-            for u, v, de, re in self.edges:
+        for s, si in self.src_id.items():
+            for i, (u, v, de, re) in enumerate(self.edges):
                 edge = (u, v)
                 for d in range(self.nodes):
                     if d in self.source:
                         continue
+                    x = get('f_k', (si, d, i))
+                    if x is None:
+                        continue
                     mp = ('FlowCap', s, d, edge)
-                    self.constraints[mp] = self.solver.Constraint(-INF, 0)
-                    key = (s, d, edge)
-                    self.constraints[mp].SetCoefficient(self.f_k[key], 1)
-                    out = self.f_k[key].name()
-                    s_e = (s, 'to', edge)
-                    self.constraints[mp].SetCoefficient(self.k[s_e], -1/re)
-                    self.constraints[mp].SetCoefficient(self.e[s_e], -1)
-                    out += ' <= ' + show(1/re) + ' ' + self.k[s_e].name() + ' + ' + self.e[s_e].name()
-                    DEBUG(out)
+                    self.newRow(mp, -INF, 0)
+                    self.constraints[mp].SetCoefficient(x, 1)
+                    self.constraints[mp].SetCoefficient(self.keyShare('k_s', si, i), -1/re)
+                    self.constraints[mp].SetCoefficient(self.keyShare('e_s', si, i), -1)
         # Limit of Flow
-        DEBUG('--Limit flow--')
-        for s in self.source:
+        for s, si in self.src_id.items():
             for d in range(self.nodes):
-                if d in self.source:
+                if d in self.source or not self.keyCommodity(s, d):
                     continue
                 mp = ('LM_Flow', s, d)
-                self.constraints[mp] = self.solver.Constraint(-INF, 0)
-                self.constraints[mp].SetCoefficient(self.E[s], -1)
-                out = ''
-                plus = False
-                for v, de, re, i in self.graph[s]:
-                    edge = (s, v)
-                    key = (s, d, edge)
-                    self.constraints[mp].SetCoefficient(self.f_k[key], 1)
-                    out += (' + ' if plus else '') + self.f_k[key].name()
-                    plus = True
-                out += ' <= ' + self.E[s].name()
-                DEBUG(out)
+                self.newRow(mp, -INF, 0)
+                self.constraints[mp].SetCoefficient(var('E_node', s), -1)
+                for v, de, re, i in self.graph.get(s, []):
+                    x = get('f_k', (si, d, i))
+                    if x is not None:
+                        self.constraints[mp].SetCoefficient(x, 1)
         
         # Limit of E from Source i
-        DEBUG('--Limit random bits--')
         for u in range(self.nodes):
             if u not in self.source:
-                for s in self.source:
+                for s, si in self.src_id.items():
+                    if self.keyflow == 'reduced' and si not in self.key_sources.get(u, ()):
+                        continue
                     s_u = (s, 'to', u)
                     mp = ('LM_bits', s_u)
-                    self.constraints[mp] = self.solver.Constraint(-INF, 0)
-                    self.constraints[mp].SetCoefficient(self.E[s_u], 1)
-                    out = self.E[s_u].name() + ' <= '
-                    plus = False
-                    for v, de, re, i in self.reverse_graph[u]:
-                        edge = (v, u)
-                        key = (s, u, edge)
-                        self.constraints[mp].SetCoefficient(self.f_k[key], -1)
-                        out += (' + ' if plus else '') + self.f_k[key].name()
-                        plus = True
-                    DEBUG(out)
+                    self.newRow(mp, -INF, 0)
+                    bits = self.keyBits(si, u)
+                    self.constraints[mp].SetCoefficient(bits, 1)
+                    a = u
+                    if (s, u) in self.key_cuts:
+                        # Bounded by E_s and every minimal cut instead of a flow
+                        self.constraints[mp].SetCoefficient(var('E_node', s), -1)
+                        for j, cut in enumerate(self.key_cuts[(s, u)]):
+                            row = ('KeyCut', s, u, j)
+                            self.newRow(row, -INF, 0)
+                            self.constraints[row].SetCoefficient(bits, 1)
+                            for i in cut:
+                                self.constraints[row].SetCoefficient(self.keyShare('k_s', si, i), -1/self.edges[i][3])
+                                self.constraints[row].SetCoefficient(self.keyShare('e_s', si, i), -1)
+                        continue
+                    if (s, u) in self.key_chain:
+                        # Bounded by the anchor's key flow and by every edge
+                        # of the chain
+                        a, chain = self.key_chain[(s, u)]
+                        for i in chain:
+                            x, y, de, re = self.edges[i]
+                            cap = ('ChainCap', s, u, (x, y))
+                            self.newRow(cap, -INF, 0)
+                            self.constraints[cap].SetCoefficient(bits, 1)
+                            self.constraints[cap].SetCoefficient(self.keyShare('k_s', si, i), -1/re)
+                            self.constraints[cap].SetCoefficient(self.keyShare('e_s', si, i), -1)
+                    for v, de, re, i in self.reverse_graph.get(a, []):
+                        x = get('f_k', (si, a, i))
+                        if x is not None:
+                            self.constraints[mp].SetCoefficient(x, -1)
         
         # Flow_R in == Flow_R out
-        DEBUG('--Flow_R in == Flow_R out--')
         for s, d in self.s_to_d:
+            p = self.pair_id[(s, d)]
             for n in range(self.nodes):
                     # s to d through n
-                if n != s and n != d:
+                if n != s and n != d and self.canReach(s, n) and self.canReach(n, d):
                     flow = ('Flow_R_in_out', s, d, n)
-                    self.constraints[flow] = self.solver.Constraint(0, 0)
-                    out = ''
-                    plus = False
+                    self.newRow(flow, 0, 0)
                     # IN
-                    if n in self.reverse_graph:
-                        for u, de, re, i in self.reverse_graph[n]:
-                            edge = (u, n)
-                            key = (s, d, edge)
-                            nm = 'f_R('+str(s)+' to '+str(d)+','+str(edge)+')'
-                            if key not in self.f_R:
-                                self.f_R[key] = self.solver.NumVar(0, INF, nm)
-                            self.constraints[flow].SetCoefficient(self.f_R[key], 1)
-                            out += (' + ' if plus else '') + self.f_R[key].name()
-                            plus = True
+                    for u, de, re, i in self.reverse_graph.get(n, []):
+                        if not self.onPath(s, d, (u, n)):
+                            continue
+                        self.newVar('f_R', (p, i), 0, INF)
+                        self.constraints[flow].SetCoefficient(var('f_R', p, i), 1)
                     # OUT
-                    if n in self.graph:
-                        for v, de, re, i in self.graph[n]:
-                            edge = (n, v)
-                            key = (s, d, edge)
-                            nm = 'f_R('+str(s)+' to '+str(d)+','+str(edge)+')'
-                            if key not in self.f_R:
-                                self.f_R[key] = self.solver.NumVar(0, INF, nm)
-                            self.constraints[flow].SetCoefficient(self.f_R[key], -1)
-                            out += ' - ' + self.f_R[key].name()
-                    out += ' = 0'
-                    DEBUG(out)
+                    for v, de, re, i in self.graph.get(n, []):
+                        if not self.onPath(s, d, (n, v)):
+                            continue
+                        self.newVar('f_R', (p, i), 0, INF)
+                        self.constraints[flow].SetCoefficient(var('f_R', p, i), -1)
 
         # Flow_R Capacity
-        DEBUG('--Flow_R capacity--')
         to = dict()
         for s, d in self.s_to_d:
             if s not in to:
                 to[s] = [d]
             else:
                 to[s].append(d)
-        for s in self.source:
-            for u, v, de, re in self.edges:
+        for s, si in self.src_id.items():
+            for i, (u, v, de, re) in enumerate(self.edges):
                 edge = (u, v)
                 mp = ('Flow_R_Cap', s, edge)
-                self.constraints[mp] = self.solver.Constraint(-INF, 0)
-                out = ''
-                plus = False
-                for d in to[s]:
-                    key = (s, d, edge)
-                    if key not in self.f_R:
-                        nm = 'f_R('+str(s)+' to '+str(d)+','+str(edge)+')'
-                        self.f_R[key] = self.solver.NumVar(0, INF, nm)
-                    self.constraints[mp].SetCoefficient(self.f_R[key], 1)
-                    out += (' + ' if plus else '') + self.f_R[key].name()
-                    plus = True
-                s_e = (s, 'to', edge)
-                self.constraints[mp].SetCoefficient(self.R[s_e], -1)
-                out += ' <= ' + self.R[s_e].name()
-                DEBUG(out)
+                self.newRow(mp, -INF, 0)
+                for d in to.get(s, []):
+                    if not self.onPath(s, d, edge):
+                        continue
+                    p = self.pair_id[(s, d)]
+                    self.newVar('f_R', (p, i), 0, INF)
+                    self.constraints[mp].SetCoefficient(var('f_R', p, i), 1)
+                self.constraints[mp].SetCoefficient(var('R_s_edge', si, i), -1)
         
         # Limit_R of Flow
-        DEBUG('--Limit flow_R--')
-        for s in self.source:
+        for s in self.src_id:
             mp = ('LM_Flow_R', s)
-            self.constraints[mp] = self.solver.Constraint(-INF, 0)
-            self.constraints[mp].SetCoefficient(self.R[s], -1)
-            out = ''
-            plus = False
-            for d in to[s]:
-                for v, de, re, i in self.graph[s]:
-                    edge = (s, v)
-                    key = (s, d, edge)
-                    self.constraints[mp].SetCoefficient(self.f_R[key], 1)
-                    out += (' + ' if plus else '') + self.f_R[key].name()
-                    plus = True
-            out += ' <= ' + self.R[s].name()
-            DEBUG(out)
+            self.newRow(mp, -INF, 0)
+            self.constraints[mp].SetCoefficient(var('R_node', s), -1)
+            for d in to.get(s, []):
+                p = self.pair_id[(s, d)]
+                for v, de, re, i in self.graph.get(s, []):
+                    x = get('f_R', (p, i))
+                    if x is not None:
+                        self.constraints[mp].SetCoefficient(x, 1)
         
         # Limit of R from Source i
-        DEBUG('--Limit messages--')
         for u in self.destination:
             if u not in self.source:
-                for s in self.source:
+                for s, si in self.src_id.items():
                     s_u = (s, 'to', u)
                     mp = ('LM_R_bits', s_u)
-                    self.constraints[mp] = self.solver.Constraint(-INF, 0)
-                    self.constraints[mp].SetCoefficient(self.R[s_u], 1)
-                    out = self.R[s_u].name() + ' <= '
-                    plus = False
-                    for d in to[s]:
-                        for v, de, re, i in self.reverse_graph[u]:
-                            edge = (v, u)
-                            key = (s, d, edge)
-                            self.constraints[mp].SetCoefficient(self.f_R[key], -1)
-                            out += (' + ' if plus else '') + self.f_R[key].name()
-                            plus = True
-                    DEBUG(out)
+                    self.newRow(mp, -INF, 0)
+                    self.constraints[mp].SetCoefficient(var('R_s', si, u), 1)
+                    for d in to.get(s, []):
+                        p = self.pair_id[(s, d)]
+                        for v, de, re, i in self.reverse_graph.get(u, []):
+                            x = get('f_R', (p, i))
+                            if x is not None:
+                                self.constraints[mp].SetCoefficient(x, -1)
 
     def createConstraints(self):
         self.createSecurityConstraint()
@@ -393,107 +614,595 @@ class SolverLP:
     def createObjective(self):
         self.objective = self.solver.Objective()
         for u in self.destination:
-            self.objective.SetCoefficient(self.R[u], 1)
+            self.objective.SetCoefficient(self.var('R_node', u), 1)
         self.objective.SetMaximization()
 
-    def resultValue(self):
-        if len(argv) > 1:
-            if argv[1] == 'debug':
-                opt_sol = 0
-                for u in self.destination:
-                    opt_sol += self.R[u].solution_value()
-                print('Optimal objective value =', opt_sol)
-                for var in [self.R, self.E, self.k, self.e, self.f_k, self.f_R]:
-                    for k in var.keys():
-                        print(var[k].name() + ' = ' + str(var[k].solution_value()))
+    def pairColumns(self):
+        # Columns of the message flow into d of every distinct pair, their
+        # sum is the pair's rate
+        pairs, head, dest = self.pairIndex()
+        index, cols = self.vars.entries('f_R')
+        into = head[index[:, 1]] == dest[index[:, 0]]
+        ret = [[] for p in range(len(dest))]
+        for p, col in zip(index[into, 0].tolist(), cols[into].tolist()):
+            ret[p].append(col)
+        return ret
+
+    def pairWeights(self, weights):
+        # {(s, d): w} or one weight per s_to_d entry, as an array by pair
+        w = np.zeros(len(self.pair_id))
+        if isinstance(weights, dict):
+            for p, x in weights.items():
+                w[self.pair_id[tuple(p)]] += x
         else:
-            opt_sol = 0
-            for u in self.destination:
-                opt_sol += self.R[u].solution_value()
-            print('Optimal objective value =', opt_sol)
+            for p, x in zip(self.s_to_d, weights):
+                w[self.pair_id[p]] += x
+        return w
+
+    def setObjective(self, pairs=None, nodes=None):
+        # Maximize the weighted rates of pairs ({(s, d): w} or a weight per
+        # s_to_d entry) plus the weighted R_u of nodes ({u: w}). Without
+        # either it is the sum of R_u over the destinations again. Only
+        # the objective changes, the model is not rebuilt
+        if not self.built:
+            self.build()
+        self.relaxFairness()
+        self.objective = self.solver.Objective()
+        self.objective.Clear()
+        if pairs is None and nodes is None:
+            nodes = dict((u, 1) for u in self.destination)
+        for u, w in (nodes or dict()).items():
+            self.objective.SetCoefficient(self.var('R_node', u), w)
+        if pairs is not None:
+            w = self.pairWeights(pairs)
+            for p, cols in enumerate(self.pairColumns()):
+                for col in cols:
+                    self.objective.SetCoefficient(self.solver.variable(col), float(w[p]))
+        self.objective.SetMaximization()
+
+    def relaxFairness(self):
+        # Switch off the rows maxMinFair() added
+        if 't' not in self.vars.tables or not self.vars.has('t', (0,)):
+            return
+        INF = self.solver.infinity()
+        for p in range(len(self.pair_id)):
+            ct = self.constraints.get(('Fair', p))
+            if ct is not None:
+                ct.SetBounds(-INF, INF)
+        self.var('t', 0).SetBounds(0, 0)
+
+    def maxMinFair(self, weights=None, tol=1e-9):
+        # Weighted max-min fair rates by progressive filling: maximize t
+        # with rate_p >= w_p t for the pairs not fixed yet, then fix at
+        # w_p t the pairs whose row has a nonzero dual. By complementary
+        # slackness that row is tight in every optimum, so they cannot gain
+        # without another pair losing, and as the duals of the rows sum to
+        # 1 / w there is one in every round. Returns the rates in s_to_d
+        # order and leaves t as the objective until setObjective()
+        if not self.built:
+            self.build()
+        INF = self.solver.infinity()
+        w = np.ones(len(self.pair_id)) if weights is None else self.pairWeights(weights)
+        if (w <= 0).any():
+            raise ValueError('max-min fairness needs a positive weight for every pair')
+        self.vars.family('t', [1])
+        self.newVar('t', (0,), 0, INF)
+        t = self.var('t', 0)
+        t.SetBounds(0, INF)
+        rows = []
+        pair_cols = self.pairColumns()
+        for p, cols in enumerate(pair_cols):
+            mp = ('Fair', p)
+            self.newRow(mp, 0, INF)
+            ct = self.constraints[mp]
+            ct.SetBounds(0, INF)
+            for col in cols:
+                ct.SetCoefficient(self.solver.variable(col), 1)
+            ct.SetCoefficient(t, -w[p])
+            rows.append(ct)
+        self.objective = self.solver.Objective()
+        self.objective.Clear()
+        self.objective.SetCoefficient(t, 1)
+        self.objective.SetMaximization()
+        free = set(range(len(rows)))
+        self.solver.incremental()
+        try:
+            while free:
+                if self.solver.Solve() != OPTIMAL:
+                    raise RuntimeError('max-min fairness ended with status %d' % self.solver.stats['status'])
+                level = self.solver.Objective().Value()
+                self.vars.load()
+                fixed = [p for p in free if abs(self.vars.dual[rows[p].index()]) > tol]
+                if not fixed:
+                    # Duals lost in the tolerances, fix the tight rows instead
+                    fixed = [p for p in free if self.vars.x[pair_cols[p]].sum() <= w[p] * level + tol]
+                for p in fixed:
+                    rows[p].SetCoefficient(t, 0)
+                    rows[p].SetBounds(w[p] * level * (1 - 1e-9), INF)
+                    free.discard(p)
+        finally:
+            self.solver.incremental(False)
+        return self.rates()
+
+    def rateRegion(self, pairs=None, points=None, tol=1e-9):
+        # Pareto frontier of the achievable rates of pairs (default every
+        # pair) from the built model, re-solving with only the objective
+        # changed. For two pairs and no points it is exact: starting from
+        # the two extremes, every segment of the frontier found so far is
+        # checked with the weights normal to it until none has a point
+        # beyond it. Otherwise the weights are a grid with `points`
+        # steps per axis (default 4). Returns the frontier's rate tuples.
+        if not self.built:
+            self.build()
+        pairs = [tuple(p) for p in (pairs or self.pair_id)]
+        eps = 1e-6
+
+        def solve(w):
+            self.setObjective(pairs=dict(zip(pairs, w)))
+            if self.solver.Solve() != OPTIMAL:
+                raise RuntimeError('rate region ended with status %d' % self.solver.stats['status'])
+            rate = dict(zip(self.s_to_d, self.rates()))
+            return tuple(rate[p] for p in pairs)
+
+        self.solver.incremental(dual=False)
+        try:
+            if len(pairs) == 2 and points is None:
+                a, b = solve((1, eps)), solve((eps, 1))
+                front = [a, b]
+                todo = [(a, b)]
+                while todo:
+                    a, b = todo.pop()
+                    w = (b[1] - a[1], a[0] - b[0])
+                    if w[0] <= tol or w[1] <= tol:
+                        continue
+                    c = solve(w)
+                    if w[0] * (c[0] - a[0]) + w[1] * (c[1] - a[1]) > tol * max(1, abs(w[0]) + abs(w[1])):
+                        front.append(c)
+                        todo += [(a, c), (c, b)]
+            else:
+                steps = points or 4
+                front = []
+                for split in combinations(range(steps + len(pairs) - 1), len(pairs) - 1):
+                    # A composition of steps into len(pairs) parts
+                    cuts = (-1,) + split + (steps + len(pairs) - 1,)
+                    w = [(cuts[j + 1] - cuts[j] - 1) / float(steps) + eps for j in range(len(pairs))]
+                    front.append(solve(w))
+        finally:
+            self.solver.incremental(False)
+            self.setObjective()
+        # Drop repeats and points another one dominates
+        front = sorted(set(tuple(round(x, 12) for x in p) for p in front))
+        return [p for p in front if not any(q != p and all(b >= a - tol for a, b in zip(p, q)) for q in front)]
+
+    def modelText(self, fmt='lp'):
+        if fmt == 'mps':
+            return self.solver.ExportModelAsMpsFormat(False, False)
+        return self.solver.ExportModelAsLpFormat(False)
+
+    def exportModel(self, filename):
+        fmt = 'mps' if filename.endswith('.mps') else 'lp'
+        with open(filename, 'w') as f:
+            f.write(self.modelText(fmt))
+
+    def resultValue(self):
+        self.vars.load()
+        opt_sol = sum(self.vars.value('R_node', u) for u in self.destination)
+        print('Optimal objective value =', opt_sol)
+        if self.debug:
+            for name, index, col in self.vars.items():
+                print(self.rowName((name,) + index) + ' = ' + str(self.vars.x[col]))
 
     def clearConstraints(self):
-        for var in [self.R, self.E, self.k, self.e, self.f_k, self.f_R]:
-            var.clear()
+        self.vars.clear()
+
+    def build(self):
+        if self.compiled is None or not self.loadBuilt(*self.compiled):
+            self.createVariables()
+            self.createConstraints()
+            self.createObjective()
+            if self.compiled is not None:
+                self.saveBuilt(*self.compiled)
+        for i in self.disabled:
+            if self.modelEdge(i) >= 0:
+                self.setEdgeBounds(self.modelEdge(i), 0)
+        self.built = True
+        if self.debug:
+            print('Number of Constraints = ' + str(self.solver.NumConstraints()))
+            print(self.modelText())
+        if self.dump:
+            self.exportModel(self.dump)
+
+    def inputEdges(self):
+        # The edges as given to __init__, with their current d and r
+        return self.edges if self.presolved is None else self.presolved.edges
+
+    def modelEdge(self, i):
+        # Index in the model of edge i of inputEdges(), -1 if the presolve
+        # removed it
+        return i if self.presolved is None else int(self.presolved.edge_map[i])
+
+    def updateEdge(self, i, d=None, r=None):
+        # Change the erasure d / eavesdrop r of edge i in the built model
+        self.updateEdges({i: (d, r)})
+
+    def updateEdges(self, changes):
+        # {edge: (d, r)} with None keeping a value
+        if self.presolved is not None:
+            changes = self.presolved.update(changes)
+        for i, (d, r) in changes.items():
+            self.changeEdge(i, d, r)
+
+    def changeEdge(self, i, d, r):
+        # updateEdge() on edge i of the model
+        u, v, de, re = self.edges[i]
+        d = de if d is None else d
+        r = re if r is None else r
+        self.edges[i] = (u, v, d, r)
+        for lst, w in [(self.graph[u], v), (self.reverse_graph[v], u)]:
+            for j, (x, a, b, idx) in enumerate(lst):
+                if idx == i:
+                    lst[j] = (w, d, r, i)
+        if not self.built:
+            return
+        INF = self.solver.infinity()
+        var = self.var
+        edge = (u, v)
+        ct = self.constraints[('Key', edge)]
+        ct.SetCoefficient(var('k', i), 1-d*r)
+        ct.SetCoefficient(var('e', i), (1-d)*r)
+        ct.SetCoefficient(var('R_edge', i), -(1-r))
+        ct = self.constraints[('Cap', edge)]
+        ct.SetBounds(-INF, 1-d)
+        ct.SetCoefficient(var('k', i), 1/r)
+        ct = self.constraints[('LM', edge)]
+        ct.SetCoefficient(var('k', i), 1-d*r)
+        ct.SetCoefficient(var('E_node', u), -(1-d)*r)
+        ct.SetCoefficient(var('e', i), (1-d)*r)
+        if r != re:
+            for s, si in self.src_id.items():
+                for n in range(self.nodes):
+                    for mp in [('FlowCap', s, n, edge), ('ChainCap', s, n, edge)]:
+                        if mp in self.constraints:
+                            self.constraints[mp].SetCoefficient(self.keyShare('k_s', si, i), -1/r)
+            for si, mp in self.key_cut_rows.get(i, []):
+                self.constraints[mp].SetCoefficient(self.keyShare('k_s', si, i), -1/r)
+
+    def setEdgeBounds(self, i, ub):
+        # The per-source shares and both flows follow the edge totals
+        # through the Sum, FlowCap and Flow_R_Cap rows
+        for name in ['k', 'e', 'R_edge']:
+            self.var(name, i).SetBounds(0, ub)
+
+    def disableEdge(self, i):
+        # Edge i carries nothing until enableEdge(i), the model stays built.
+        # Any edge of a collapsed run cuts the run
+        self.disabled.add(i)
+        if self.built and self.modelEdge(i) >= 0:
+            self.setEdgeBounds(self.modelEdge(i), 0)
+
+    def enableEdge(self, i):
+        self.disabled.discard(i)
+        j = self.modelEdge(i)
+        if self.built and j >= 0 and not any(self.modelEdge(x) == j for x in self.disabled):
+            self.setEdgeBounds(j, self.solver.infinity())
+
+    def addEdge(self, u, v, d, r):
+        # Returns the new edge index. A built model gets only the missing
+        # variables and rows, its solver and basis are kept.
+        if self.presolved is not None:
+            raise ValueError('edges cannot be added to a presolved model, build it without presolve')
+        if any(x == u and y == v for x, y, de, re in self.edges):
+            raise ValueError('edge (%d, %d) already exists' % (u, v))
+        if self.built and self.keyflow != 'full':
+            raise ValueError("edges can only be added to a built model with keyflow='full'")
+        i = len(self.edges)
+        self.edges.append((u, v, d, r))
+        self.graph.setdefault(u, []).append((v, d, r, i))
+        self.reverse_graph.setdefault(v, []).append((u, d, r, i))
+        if self.built:
+            # New paths also add flow variables and rows on old edges
+            self.createVariables()
+            self.createConstraints()
+        return i
+
+    def failureRanking(self, edges=None):
+        # N-1 analysis: solve with each edge disabled in turn, from the
+        # basis of the previous solve. Returns (edge index, objective,
+        # loss) with the most damaging failure first. An edge the presolve
+        # removed loses nothing, the edges of a collapsed run are solved
+        # once. A failure without an optimum (lim_R out of reach) has NaN
+        # objective and loss and comes first
+        if not self.built:
+            self.build()
+        status = self.solver.Solve()
+        if status != OPTIMAL:
+            raise RuntimeError('the model without failures has status %d' % status)
+        base = self.solver.Objective().Value()
+        ret = []
+        done = dict()
+        self.solver.incremental()
+        try:
+            for i in range(len(self.inputEdges())) if edges is None else edges:
+                if i in self.disabled:
+                    continue
+                j = self.modelEdge(i)
+                if j < 0:
+                    ret.append((i, base, 0.0))
+                    continue
+                if j not in done:
+                    self.disableEdge(i)
+                    try:
+                        status = self.solver.Solve()
+                        done[j] = self.solver.Objective().Value() if status == OPTIMAL else np.nan
+                    finally:
+                        self.enableEdge(i)
+                ret.append((i, done[j], base - done[j]))
+        finally:
+            self.solver.incremental(False)
+        ret.sort(key=lambda x: (not np.isnan(x[2]), -x[2]))
+        return ret
+
+    def updateLimits(self, lim_s=None, lim_R=None):
+        # Fix E_u / R_u to new values, None frees a previously fixed node
+        INF = self.solver.infinity()
+        if self.presolved is not None:
+            lim_s, lim_R = self.presolved.limits(lim_s, lim_R)
+        for lim, name, new in [(self.lim_s, 'E_node', lim_s), (self.lim_R, 'R_node', lim_R)]:
+            for u, x in (new or dict()).items():
+                if x is None:
+                    lim.pop(u, None)
+                    if self.built:
+                        self.var(name, u).SetBounds(0, INF)
+                else:
+                    if self.built and name == 'E_node' and u in self.key_skip:
+                        raise ValueError('node %d has no key flow in the reduced model, rebuild it to fix E_%d' % (u, u))
+                    lim[u] = x
+                    if self.built:
+                        self.var(name, u).SetBounds(x, x)
+
+    def sweep(self, points):
+        # Each point is a dict with any of
+        #   'd', 'r': one value for every edge, a list per edge or {edge index: value}
+        #   'lim_s', 'lim_R': {node: value or None}
+        # The model is built once, each point only changes the affected
+        # coefficients and bounds and re-solves from the previous basis.
+        # Yields (point, objective, per-pair rates), NaN for a point
+        # without an optimum; its status is in self.solver.stats['status'].
+        if not self.built:
+            self.build()
+        M = len(self.inputEdges())
+        for point in points:
+            d = self.edgeValues(point.get('d'), M)
+            r = self.edgeValues(point.get('r'), M)
+            self.updateEdges(dict((i, (d.get(i), r.get(i))) for i in set(d) | set(r)))
+            self.updateLimits(point.get('lim_s'), point.get('lim_R'))
+            if self.solver.Solve() != OPTIMAL:
+                yield point, np.nan, [np.nan] * len(self.s_to_d)
+                continue
+            yield point, self.solver.Objective().Value(), self.rates()
+
+    @staticmethod
+    def edgeValues(x, M):
+        if x is None:
+            return dict()
+        if isinstance(x, dict):
+            return x
+        if isinstance(x, (list, tuple)):
+            return dict(enumerate(x))
+        return dict((i, x) for i in range(M))
 
     def Solve(self):
-        self.createVariables()
-        self.createConstraints()
-        DEBUG('Number of Constraints = ' + str(self.solver.NumConstraints()))
-        self.createObjective()
+        if not self.built:
+            self.build()
         self.solver.Solve()
         self.resultValue()
-        ret = []
-        for s, d in self.s_to_d:
-            opt = 0
-            for u, de, re, i in self.reverse_graph[d]:
-                edge = (u, d)
-                key = (s, d, edge)
-                opt += self.f_R[key].solution_value()
-            ret.append(opt)
-        return ret
+        return self.rates()
+
+    def pairIndex(self):
+        # Pair of every s_to_d entry, and the head of every edge
+        pairs = np.array([self.pair_id[p] for p in self.s_to_d], dtype=np.int64)
+        head = np.array([v for u, v, d, r in self.edges], dtype=np.int64).reshape(-1)
+        dest = np.array([d for s, d in self.pair_id], dtype=np.int64).reshape(-1)
+        return pairs, head, dest
+
+    def rates(self):
+        # Message flow entering d for each pair, from the last solve
+        self.vars.load()
+        pairs, head, dest = self.pairIndex()
+        index, cols = self.vars.entries('f_R')
+        into = head[index[:, 1]] == dest[index[:, 0]]
+        rate = np.bincount(index[into, 0], weights=self.vars.x[cols[into]], minlength=len(dest))
+        return rate[pairs].tolist()
    
     def edgesWeight(self):
-        ret = []
-        for u, v, de, re in self.edges:
-            k = 0
-            for s, d in self.s_to_d:
-                edge = (u, v)
-                key = (s, d, edge)
-                k += self.f_R[key].solution_value()
-            ret.append(k)
-        return ret
+        # Every s_to_d entry counts, duplicates included
+        self.vars.load()
+        pairs, head, dest = self.pairIndex()
+        count = np.bincount(pairs, minlength=len(self.pair_id))
+        index, cols = self.vars.entries('f_R')
+        weight = np.bincount(index[:, 1], weights=count[index[:, 0]] * self.vars.x[cols], minlength=len(self.edges))
+        if self.presolved is not None:
+            weight = self.presolved.edgeValues(weight)
+        return weight.tolist()
+
+    def edgeRows(self, name):
+        # Row index of the per-edge constraint family name (Key, Cap, LM,
+        # Sum_*_e) for every edge, -1 where the edge has none
+        rows = np.full(len(self.edges), -1, dtype=np.int64)
+        for i, (u, v, d, r) in enumerate(self.edges):
+            ct = self.constraints.get((name, (u, v)))
+            if ct is not None:
+                rows[i] = ct.index()
+        return rows
+
+    def variableTable(self):
+        # Every variable of the last solve as one structured array: family,
+        # index padded with -1, column, value and reduced cost
+        self.vars.load()
+        ret = np.zeros(self.vars.count(), dtype=VARIABLE_DTYPE)
+        pos = 0
+        for name in self.vars.tables:
+            where, cols = self.vars.entries(name)
+            end = pos + len(cols)
+            ret['family'][pos:end] = name
+            ret['index'][pos:end] = -1
+            ret['index'][pos:end, :where.shape[1]] = where
+            ret['column'][pos:end] = cols
+            ret['value'][pos:end] = self.vars.x[cols]
+            ret['reduced_cost'][pos:end] = self.vars.reduced[cols]
+            pos = end
+        return ret[np.argsort(ret['column'], kind='stable')]
+
+    def rowTable(self):
+        # Every constraint as one structured array: family, the rest of its
+        # key as text, row and dual value
+        self.vars.load()
+        ret = np.zeros(len(self.constraints), dtype=ROW_DTYPE)
+        for j, (mp, ct) in enumerate(self.constraints.items()):
+            ret[j] = (mp[0], ' '.join(str(x) for x in mp[1:]), ct.index(), 0.0)
+        ret['dual'] = self.vars.dual[ret['row']]
+        return ret[np.argsort(ret['row'], kind='stable')]
+
+    def pairRates(self):
+        # rates() of every distinct pair as a structured array
+        rates = dict(zip(self.s_to_d, self.rates()))
+        pairs = sorted(self.pair_id, key=self.pair_id.get)
+        return np.array([(s, d, rates[(s, d)]) for s, d in pairs], dtype=PAIR_DTYPE)
+
+    def edgeLoads(self, tol=1e-9):
+        # Per edge: messages R_edge, key bits k and random bits e carried,
+        # the capacity they use (R + k/r + e) out of 1-d, and the dual of
+        # its Cap row. Saturated edges with a positive dual are bottlenecks
+        self.vars.load()
+        ret = np.zeros(len(self.edges), dtype=EDGE_DTYPE)
+        if len(self.edges):
+            u, v, d, r = [np.array(x, dtype=np.float64) for x in zip(*self.edges)]
+            ret['u'] = u
+            ret['v'] = v
+            ret['message'] = self.vars.values('R_edge')
+            ret['key'] = self.vars.values('k')
+            ret['random'] = self.vars.values('e')
+            ret['used'] = ret['message'] + ret['key'] / r + ret['random']
+            ret['capacity'] = 1 - d
+            ret['slack'] = ret['capacity'] - ret['used']
+            rows = self.edgeRows('Cap')
+            ret['dual'] = np.where(rows >= 0, self.vars.dual[rows], 0.0)
+            ret['bottleneck'] = (ret['slack'] <= tol) & (ret['dual'] > tol)
+        if self.presolved is None:
+            return ret
+        # On the original edges as edgesWeight(): a removed edge carries
+        # nothing, every edge of a collapsed run what the edge standing for
+        # it does
+        edge_map = self.presolved.edge_map
+        full = np.zeros(len(edge_map), dtype=EDGE_DTYPE)
+        if len(ret):
+            full[edge_map >= 0] = ret[edge_map[edge_map >= 0]]
+        for i, (u, v, d, r) in enumerate(self.presolved.edges):
+            full[i]['u'], full[i]['v'], full[i]['capacity'] = u, v, 1 - d
+        full['slack'] = full['capacity'] - full['used']
+        return full
+
+    def bottlenecks(self, tol=1e-9):
+        # Bottleneck edges, the largest gain per unit of capacity first
+        loads = self.edgeLoads(tol)
+        edges = np.flatnonzero(loads['bottleneck'])
+        return edges[np.argsort(-loads['dual'][edges], kind='stable')].tolist()
+
+    def report(self):
+        # Pair rates, edge loads and bottlenecks of the last solve
+        print('Objective = %.12f' % self.solver.Objective().Value())
+        print('%6s %6s %16s' % ('s', 'd', 'rate'))
+        for s, d, rate in self.pairRates():
+            print('%6d %6d %16.12f' % (s, d, rate))
+        loads = self.edgeLoads()
+        print('%5s %10s %12s %12s %12s %12s %12s %12s' % ('edge', 'u -> v', 'message', 'key', 'random',
+                                                         'used', 'capacity', 'dual'))
+        for i, x in enumerate(loads):
+            print('%5d %10s %12.8f %12.8f %12.8f %12.8f %12.8f %12.8f%s' % (
+                i, '%d -> %d' % (x['u'], x['v']), x['message'], x['key'], x['random'],
+                x['used'], x['capacity'], x['dual'], ' *' if x['bottleneck'] else ''))
+        print('Bottlenecks = %s' % self.bottlenecks())
 
     def Clear(self):
         self.solver.Clear()
         self.clearConstraints()
+        self.constraints.clear()
+        self.built = False
         
 
-def main():
-    graph = dict()
-    reverse_graph = dict()
-    nodes = int(input())
-    edges = int(input())
-    edge = []
-    for i in range(edges):
-        inp = input().split()
-        u, v, d, r = int(inp[0]), int(inp[1]), float(inp[2]), float(inp[3])
-        edge.append((u, v, d, r))
-        if u in graph:
-            graph[u].append((v, d, r, i))
-        else:
-            graph[u] = [(v, d, r, i)]
-        if v in reverse_graph:
-            reverse_graph[v].append((u, d, r, i))
-        else:
-            reverse_graph[v] = [(u, d, r, i)]
+def compiledPath(filename):
+    return path.splitext(filename)[0] + '.model.npz'
 
-    source = []
-    for i in range(int(input())):
-        source.append(int(input()))
-    
-    destination = []
-    for i in range(int(input())):
-        destination.append(int(input()))
-    
-    s_to_d = []
-    for i in range(int(input())):
-        (s, d) = [int(x) for x in input().split()]
-        s_to_d.append((s, d))
-    
-    lim_s = dict()
-    for i in range(int(input())):
-        inp = input().split()
-        lim_s[int(inp[0])] = float(inp[1])
-
-    lim_R = dict()
-    for i in range(int(input())):
-        inp = input().split()
-        lim_R[int(inp[0])] = float(inp[1])
-
-    solv = SolverLP(nodes, edge, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R)
-    print(solv.Solve())
-    solv.Clear()
+def tupled(x):
+    # Row keys come back from JSON with lists for tuples, the edge or
+    # (s, 'to', u) inside a key is the deepest one
+    return tuple(tuple(y) if y.__class__ is list else y for y in x)
+
+def solveFile(filename):
+    # Top-level so that it can be handed to a multiprocessing pool
+    with SolverLP.fromFile(filename) as solv:
+        return solv.Solve()
+
+def checkKeyFlow(filenames):
+    # Both key flow formulations must reach the same objective
+    import io, contextlib
+    bad = 0
+    print('%-24s %15s %15s %16s %16s' % ('file', 'full vars/rows', 'reduced', 'full', 'reduced'))
+    for filename in filenames:
+        ret = []
+        for keyflow in ['full', 'reduced']:
+            with contextlib.redirect_stdout(io.StringIO()):
+                with SolverLP.fromFile(filename, keyflow=keyflow, debug=False) as solv:
+                    solv.Solve()
+                    ret.append((solv.solver.NumVariables(), solv.solver.NumConstraints(),
+                                solv.solver.Objective().Value()))
+        ok = abs(ret[0][2] - ret[1][2]) <= 1e-9 * max(1, abs(ret[0][2]))
+        bad += not ok
+        print('%-24s %7d/%-7d %7d/%-7d %16.12f %16.12f %s' % (filename, ret[0][0], ret[0][1], ret[1][0], ret[1][1],
+                                                           ret[0][2], ret[1][2], 'ok' if ok else 'MISMATCH'))
+    return bad
+
+def main():
+    # python project.py debug [model.lp|model.mps] < input/Butterfly.in
+    # python project.py check [input/*.in]
+    # python project.py n1 input/Butterfly.in [top]
+    # python project.py report input/Butterfly.in
+    # python project.py fair input/Butterfly.in
+    # python project.py region input/X-Network.in [points]
+    if len(argv) > 1 and argv[1] == 'check':
+        from glob import glob
+        exit(1 if checkKeyFlow(argv[2:] or sorted(glob('input/*.in'))) else 0)
+    if len(argv) > 2 and argv[1] == 'report':
+        with SolverLP.fromFile(argv[2], debug=False) as solv:
+            solv.build()
+            solv.solver.Solve()
+            solv.report()
+        return
+    if len(argv) > 2 and argv[1] == 'fair':
+        with SolverLP.fromFile(argv[2], debug=False) as solv:
+            rates = dict(zip(solv.s_to_d, solv.maxMinFair()))
+            print('%6s %6s %16s' % ('s', 'd', 'rate'))
+            for s, d in solv.pair_id:
+                print('%6d %6d %16.12f' % (s, d, rates[(s, d)]))
+        return
+    if len(argv) > 2 and argv[1] == 'region':
+        with SolverLP.fromFile(argv[2], debug=False) as solv:
+            front = solv.rateRegion(points=int(argv[3]) if len(argv) > 3 else None)
+            print(' '.join('%16s' % ('%d -> %d' % p) for p in solv.pair_id))
+            for point in front:
+                print(' '.join('%16.12f' % x for x in point))
+        return
+    if len(argv) > 2 and argv[1] == 'n1':
+        with SolverLP.fromFile(argv[2], debug=False) as solv:
+            ranking = solv.failureRanking()
+            print('%5s %10s %16s %16s' % ('edge', 'u -> v', 'objective', 'loss'))
+            for i, obj, loss in ranking[:int(argv[3]) if len(argv) > 3 else None]:
+                u, v, d, r = solv.inputEdges()[i]
+                print('%5d %10s %16.12f %16.12f' % (i, '%d -> %d' % (u, v), obj, loss))
+        return
+    dump = argv[2] if DEBUG_MODE and len(argv) > 2 else None
+    with SolverLP(*readInput(stdin), dump=dump) as solv:
+        print(solv.Solve())
 
 if __name__ == '__main__':
     main()
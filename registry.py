@@ -0,0 +1,213 @@
+from __future__ import print_function
+import sys
+from array import array
+import numpy as np
+
+# Solver columns for the variables of a model. Each family is addressed
+# the way the model addresses it (node, edge, [source, edge], [source,
+# node, edge], ...) and gives the column or -1 where the variable does
+# not exist. Small families are dense int32 tables. The flow families
+# f_k [s, d, edge] and f_R [pair, edge] only have variables on the edges
+# pruning keeps, so they are a SparseTable instead. Variable objects are
+# not kept, they are looked up by column when a coefficient is set.
+# After a solve the values are one flat array by column and a family is
+# a single gather.
+
+class SparseTable:
+    # One row per leading index that has variables, e.g. (s, d) of f_k:
+    # a bitset of the edges it has and their columns in edge order. About
+    # M / 8 bytes per row and 4 per variable instead of 4 M per row
+
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self.rows = dict()
+
+    def get(self, index):
+        row = self.rows.get(index[:-1])
+        if row is None:
+            return -1
+        i = int(index[-1])
+        if not row[0] >> i & 1:
+            return -1
+        return row[1][(row[0] & ((1 << i) - 1)).bit_count()]
+
+    def set(self, index, col):
+        row = self.rows.get(index[:-1])
+        if row is None:
+            row = self.rows[index[:-1]] = [0, array('i')]
+        i = int(index[-1])
+        row[1].insert((row[0] & ((1 << i) - 1)).bit_count(), col)
+        row[0] |= 1 << i
+
+    def reshape(self, shape):
+        # Only the edge count grows when the model gains edges
+        self.shape = tuple(shape)
+
+    def packed(self):
+        # (row indices, bitsets as bytes, columns in row order, row lengths)
+        keys = sorted(self.rows)
+        width = (self.shape[-1] + 7) // 8
+        bits = np.zeros((len(keys), width), dtype=np.uint8)
+        lens = np.zeros(len(keys), dtype=np.int64)
+        for j, key in enumerate(keys):
+            bits[j] = np.frombuffer(self.rows[key][0].to_bytes(width, 'little'), dtype=np.uint8)
+            lens[j] = len(self.rows[key][1])
+        cols = np.concatenate([np.frombuffer(self.rows[key][1], dtype=np.int32) for key in keys] or
+                              [np.zeros(0, dtype=np.int32)])
+        keys = np.array(keys, dtype=np.int64).reshape(len(keys), len(self.shape) - 1)
+        return keys, bits, cols, lens
+
+    def unpack(self, keys, bits, cols, lens):
+        ends = np.cumsum(lens)
+        for key, b, end, n in zip(keys.tolist(), bits, ends.tolist(), lens.tolist()):
+            self.rows[tuple(key)] = [int.from_bytes(b.tobytes(), 'little'), array('i', cols[end - n:end].tobytes())]
+
+    def entries(self):
+        # (indices as an (n, ndim) array, columns), sorted by index
+        keys, bits, cols, lens = self.packed()
+        edges = np.nonzero(np.unpackbits(bits, axis=1, bitorder='little')[:, :self.shape[-1]])
+        return np.column_stack([keys[edges[0]], edges[1]]).reshape(-1, len(self.shape)), cols
+
+    def count(self):
+        return sum(len(row[1]) for row in self.rows.values())
+
+    def nbytes(self):
+        # Memory of the rows and their dict, not just their contents
+        ret = sys.getsizeof(self.rows)
+        for key, row in self.rows.items():
+            ret += sys.getsizeof(key) + sys.getsizeof(row) + sys.getsizeof(row[0]) + sys.getsizeof(row[1])
+        return ret
+
+class Registry:
+
+    def __init__(self, solver):
+        self.solver = solver
+        self.tables = dict()
+        self.x = None
+        # Row duals and reduced costs from the same solve as x
+        self.dual = None
+        self.reduced = None
+        # Solve count of the solver when x was read
+        self.loaded = -1
+
+    def family(self, name, shape, sparse=False):
+        # Creates the table, or grows it when the model gained edges
+        shape = tuple(shape)
+        old = self.tables.get(name)
+        if sparse:
+            if old is None:
+                self.tables[name] = SparseTable(shape)
+            elif old.shape != shape:
+                old.reshape(shape)
+        elif old is None or old.shape != shape:
+            table = np.full(shape, -1, dtype=np.int32)
+            if old is not None:
+                table[tuple(slice(0, n) for n in old.shape)] = old
+            self.tables[name] = table
+        return self.tables[name]
+
+    def add(self, name, index, lb, ub, nm=''):
+        # Column of the variable, created unless it already exists
+        col = self.col(name, index)
+        if col < 0:
+            col = self.solver.NumVar(lb, ub, nm).index()
+            table = self.tables[name]
+            if isinstance(table, SparseTable):
+                table.set(index, col)
+            else:
+                table[index] = col
+        return col
+
+    def has(self, name, index):
+        return self.col(name, index) >= 0
+
+    def col(self, name, index):
+        table = self.tables[name]
+        if table.__class__ is SparseTable:
+            return table.get(index)
+        return int(table[index])
+
+    def var(self, name, index):
+        return self.solver.variable(self.col(name, index))
+
+    def get(self, name, index):
+        # The variable, or None where it does not exist, in one lookup
+        col = self.col(name, index)
+        return self.solver.variable(col) if col >= 0 else None
+
+    def entries(self, name):
+        # (indices as an (n, ndim) array, columns) of the variables of a
+        # family that exist
+        table = self.tables[name]
+        if isinstance(table, SparseTable):
+            return table.entries()
+        where = np.argwhere(table >= 0)
+        return where, table[tuple(where.T)]
+
+    def load(self):
+        # Only copies the values out again after another solve
+        solves = self.solver.stats['solves']
+        if self.x is None or solves != self.loaded or len(self.x) != self.solver.NumVariables():
+            self.x, self.dual, self.reduced = self.solver.solutionArrays()
+            self.loaded = solves
+
+    def value(self, name, index):
+        col = self.col(name, index)
+        return float(self.x[col]) if col >= 0 else 0.0
+
+    def values(self, name, x=None):
+        # The whole family as an array of its table's shape, 0 where a
+        # variable does not exist. x is another array by column, e.g.
+        # the reduced costs
+        table = self.tables[name]
+        x = self.x if x is None else x
+        if isinstance(table, SparseTable):
+            ret = np.zeros(table.shape)
+            if len(x):
+                index, cols = table.entries()
+                ret[tuple(index.T)] = x[cols]
+            return ret
+        if not len(x):
+            return np.zeros(table.shape)
+        return np.where(table >= 0, x[table], 0.0)
+
+    def items(self):
+        # (family, index, column) of every variable
+        for name in self.tables:
+            index, cols = self.entries(name)
+            for i, col in zip(index.tolist(), cols.tolist()):
+                yield name, tuple(i), col
+
+    def count(self):
+        return sum(t.count() if isinstance(t, SparseTable) else int((t >= 0).sum()) for t in self.tables.values())
+
+    def nbytes(self):
+        return sum(t.nbytes() if isinstance(t, SparseTable) else t.nbytes for t in self.tables.values())
+
+    def arrays(self):
+        # The tables as plain arrays for np.savez, restore() reads them
+        ret = dict()
+        for name, t in self.tables.items():
+            if isinstance(t, SparseTable):
+                for part, x in zip(['keys', 'bits', 'cols', 'lens'], t.packed()):
+                    ret['%s__%s' % (name, part)] = x
+                ret[name + '__shape'] = np.array(t.shape, dtype=np.int64)
+            else:
+                ret[name] = t
+        return ret
+
+    def restore(self, arrays):
+        for k, v in arrays.items():
+            if k.endswith('__shape'):
+                name = k[:-7]
+                t = self.tables[name] = SparseTable(v.tolist())
+                t.unpack(*[arrays['%s__%s' % (name, part)] for part in ['keys', 'bits', 'cols', 'lens']])
+            elif '__' not in k:
+                self.tables[k] = v
+
+    def clear(self):
+        self.tables.clear()
+        self.x = None
+        self.dual = None
+        self.reduced = None
+        self.loaded = -1
@@ -0,0 +1,207 @@
+from __future__ import print_function
+import argparse
+from time import time
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from backend import BASIC
+from project import SolverLP
+
+# Sensitivity of a solved SolverLP from its final simplex basis.
+# The rows are written as activities s = A x, so the basis is m columns
+# of [A -I]. Moving the right-hand side of a row that is at its bound
+# moves its activity, and the basic values along B^-1 e_i; the ratio test
+# over their bounds gives the interval in which the basis, and so the
+# dual, stays optimal. Per edge:
+#   capacity   1-d of the Cap row, its dual is the throughput gained per
+#              unit of capacity
+#   key        -dual of the Key row, throughput per free key bit
+#   random     dual of the LM row, throughput per random bit the tail
+#              node is given for this edge
+# Needs a backend that reports its basis, one of BASIS_BACKENDS.
+BASIS_BACKENDS = ['glop', 'clp']
+
+SENSITIVITY_DTYPE = np.dtype([('u', np.int32), ('v', np.int32), ('capacity', np.float64),
+                              ('cap_value', np.float64), ('cap_lo', np.float64), ('cap_hi', np.float64),
+                              ('key_value', np.float64), ('random_value', np.float64),
+                              ('random_lo', np.float64), ('random_hi', np.float64)])
+
+class Sensitivity:
+
+    def __init__(self, solv, tol=1e-9, chunk=64):
+        self.solv = solv
+        self.tol = tol
+        self.chunk = chunk
+        solver = solv.solver
+        if solver.stats['backend'] not in BASIS_BACKENDS:
+            raise ValueError('sensitivity needs the final basis, which only %s report, not %s'
+                             % (' and '.join(BASIS_BACKENDS), solver.stats['backend']))
+        solv.vars.load()
+        self.dual = solv.vars.dual
+        self.objective = solver.Objective().Value()
+        A, self.lo, self.hi = solver.matrix()
+        lb, ub = solver.bounds()
+        col, row = solver.basis()
+        m, n = A.shape
+        self.activity = A.dot(solv.vars.x)
+        self.basic_row = row == BASIC
+        basic = np.concatenate([col == BASIC, self.basic_row])
+        if basic.sum() != m:
+            raise ValueError('the basis has %d columns for %d rows' % (basic.sum(), m))
+        B = sparse.hstack([A, -sparse.identity(m, format='csr')]).tocsc()[:, np.flatnonzero(basic)]
+        self.lu = splu(B.tocsc())
+        self.xB = np.concatenate([solv.vars.x, self.activity])[basic]
+        self.lowB = np.concatenate([lb, self.lo])[basic]
+        self.upB = np.concatenate([ub, self.hi])[basic]
+
+    def rhs(self, rows):
+        # The bound of each row that ranging moves: the active one, else
+        # the finite one (upper for a <= row, lower for a >= row)
+        lo, hi, act = self.lo[rows], self.hi[rows], self.activity[rows]
+        upper = np.isfinite(hi) & (~np.isfinite(lo) | (np.abs(act - hi) <= np.abs(act - lo)))
+        return np.where(upper, hi, lo), upper
+
+    def ranges(self, rows):
+        # Interval of the right-hand side of every row in rows over which
+        # the basis stays optimal, as (lower, upper) arrays
+        rows = np.asarray(rows, dtype=np.int64)
+        b, upper = self.rhs(rows)
+        low = np.full(len(rows), -np.inf)
+        high = np.full(len(rows), np.inf)
+        # A basic row only stays slack while its bound does not cross the
+        # activity, an equality row that is basic cannot move at all
+        basic = self.basic_row[rows]
+        act = self.activity[rows]
+        eq = self.lo[rows] == self.hi[rows]
+        low[basic & upper] = act[basic & upper]
+        high[basic & ~upper] = act[basic & ~upper]
+        low[basic & eq] = b[basic & eq]
+        high[basic & eq] = b[basic & eq]
+        nonbasic = np.flatnonzero(~basic)
+        up_room = self.upB - self.xB
+        down_room = self.lowB - self.xB
+        for start in range(0, len(nonbasic), self.chunk):
+            part = nonbasic[start:start + self.chunk]
+            E = np.zeros((len(self.xB), len(part)))
+            E[rows[part], np.arange(len(part))] = 1
+            W = self.lu.solve(E)
+            pos = W > self.tol
+            neg = W < -self.tol
+            with np.errstate(divide='ignore', invalid='ignore'):
+                step_up = np.where(pos, up_room[:, None] / W, np.where(neg, down_room[:, None] / W, np.inf))
+                step_down = np.where(pos, down_room[:, None] / W, np.where(neg, up_room[:, None] / W, -np.inf))
+            low[part] = b[part] + np.minimum(step_down.max(axis=0, initial=-np.inf), 0)
+            high[part] = b[part] + np.maximum(step_up.min(axis=0, initial=np.inf), 0)
+        return low, high
+
+    def edges(self):
+        # Per-edge values and ranges as a structured array, by the edges
+        # given to SolverLP. After a presolve an edge it removed has no
+        # rows, and the edges of a collapsed run stand for each other and
+        # cannot change alone, so their values are NaN
+        solv = self.solv
+        edges = solv.inputEdges()
+        ret = np.zeros(len(edges), dtype=SENSITIVITY_DTYPE)
+        if not len(edges):
+            return ret
+        ret['u'] = [u for u, v, d, r in edges]
+        ret['v'] = [v for u, v, d, r in edges]
+        ret['capacity'] = [1 - d for u, v, d, r in edges]
+        model = np.array([solv.modelEdge(i) for i in range(len(edges))], dtype=np.int64)
+        run = np.zeros(len(edges), dtype=bool)
+        for x in (solv.presolved.runs if solv.presolved is not None else []):
+            run[x] = True
+        for name, value, lo, hi, sign in [('Cap', 'cap_value', 'cap_lo', 'cap_hi', 1),
+                                          ('Key', 'key_value', None, None, -1),
+                                          ('LM', 'random_value', 'random_lo', 'random_hi', 1)]:
+            # The last entry, -1, is the row of an edge the presolve removed
+            rows = np.append(solv.edgeRows(name), -1)[model]
+            has = (rows >= 0) & ~run
+            # + 0.0 turns the -0.0 of degenerate duals into 0.0
+            ret[value] = np.where(has, sign * self.dual[rows], 0.0) + 0.0
+            ret[value][run] = np.nan
+            if lo is not None:
+                ret[lo] = ret[hi] = np.nan
+                ret[lo][has], ret[hi][has] = self.ranges(rows[has])
+        return ret
+
+    def topEdges(self, k=None, upgrade=None):
+        # Edges whose capacity upgrade raises the objective most, as
+        # (edge, gain, value, allowable increase). upgrade is the capacity
+        # added to every edge, at most up to 1 (d = 0), by default all of
+        # it. The gain is value * min(upgrade, allowable increase): exact
+        # inside the range and a lower bound beyond it, as more capacity
+        # never hurts. Only the Cap bound moves; lowering d itself also
+        # changes the Key and LM coefficients
+        sens = self.edges()
+        room = sens['cap_hi'] - sens['capacity']
+        add = 1 - sens['capacity']
+        if upgrade is not None:
+            add = np.minimum(add, float(upgrade))
+        gain = sens['cap_value'] * np.clip(np.minimum(add, room), 0, None)
+        order = np.lexsort((-sens['cap_value'], -gain))
+        ret = [(int(i), float(gain[i]), float(sens['cap_value'][i]), float(room[i])) for i in order if gain[i] > self.tol]
+        return ret[:k]
+
+    def report(self, k=10, upgrade=None):
+        print('Objective = %.12f' % self.objective)
+        print('%5s %10s %9s %12s %23s %12s %12s %23s' % ('edge', 'u -> v', 'capacity', 'cap value', 'cap range',
+                                                        'key value', 'rand value', 'random range'))
+        for i, x in enumerate(self.edges()):
+            print('%5d %10s %9.6f %12.8f [%10.6f, %10.6f] %12.8f %12.8f [%10.6f, %10.6f]' % (
+                i, '%d -> %d' % (x['u'], x['v']), x['capacity'], x['cap_value'], x['cap_lo'], x['cap_hi'],
+                x['key_value'], x['random_value'], x['random_lo'], x['random_hi']))
+        print('Top %d upgrades' % k)
+        top = self.topEdges(k, upgrade)
+        if not top:
+            print('none, no single edge upgrade raises the objective inside its range')
+            return
+        print('%5s %10s %16s %12s %12s' % ('edge', 'u -> v', 'gain', 'value', 'allowable'))
+        for i, gain, value, room in top:
+            u, v, d, r = self.solv.inputEdges()[i]
+            print('%5d %10s %16.12f %12.8f %12.6f' % (i, '%d -> %d' % (u, v), gain, value, room))
+
+def check(solv, sens, k=None, upgrade=None, tol=1e-7):
+    # Re-solves every top edge with its Cap bound raised: the objective
+    # must gain the predicted amount inside the range and no less beyond
+    bad = 0
+    INF = solv.solver.infinity()
+    for i, gain, value, room in sens.topEdges(k, upgrade):
+        # The Cap row of the edge in the model, renumbered by a presolve
+        u, v, d, r = solv.edges[solv.modelEdge(i)]
+        add = d if upgrade is None else min(float(upgrade), d)
+        ct = solv.constraints[('Cap', (u, v))]
+        ct.SetBounds(-INF, 1 - d + add)
+        solv.solver.Solve()
+        actual = solv.solver.Objective().Value() - sens.objective
+        ct.SetBounds(-INF, 1 - d)
+        ok = actual >= gain - tol and (add > room + tol or abs(actual - gain) <= tol)
+        bad += not ok
+        print('%5d %16.12f %16.12f %s' % (i, gain, actual, 'ok' if ok else 'MISMATCH'))
+    return bad
+
+def main():
+    parser = argparse.ArgumentParser(description='Shadow prices and ranging of the edge constraints.')
+    parser.add_argument('inputs', nargs='+', help='.in or .npz topology files')
+    parser.add_argument('-k', '--top', type=int, default=10, help='upgrades to list')
+    parser.add_argument('-u', '--upgrade', type=float, help='capacity added per edge (default up to d = 0)')
+    parser.add_argument('-b', '--backend', default='glop', choices=BASIS_BACKENDS)
+    parser.add_argument('--check', action='store_true', help='re-solve every listed upgrade')
+    args = parser.parse_args()
+    bad = 0
+    for filename in args.inputs:
+        print(filename)
+        with SolverLP.fromFile(filename, backend=args.backend, debug=False) as solv:
+            solv.build()
+            solv.solver.Solve()
+            start = time()
+            sens = Sensitivity(solv)
+            sens.report(args.top, args.upgrade)
+            print('%.3fs' % (time() - start))
+            if args.check:
+                bad += check(solv, sens, args.top, args.upgrade)
+    if bad:
+        raise SystemExit('%d upgrades off their prediction' % bad)
+
+if __name__ == '__main__':
+    main()
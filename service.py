@@ -0,0 +1,438 @@
+from __future__ import print_function
+import argparse
+import json
+import sys
+import threading
+import zlib
+from collections import deque
+from itertools import count
+from multiprocessing import get_context
+from time import time
+
+# Long-running solver service on localhost HTTP. Worker processes import
+# OR-tools once and keep built SolverLP models in memory; every model
+# lives in one worker, chosen by a hash of its name, so its edits and
+# solves run in order and re-solve from its last basis. A worker takes
+# everything waiting in its queue as one batch, and a model that did not
+# change since its last solve answers from that solve.
+#
+#   POST /  {"op": "solve", "file": "input/Butterfly.in"}
+#           {"op": "load", "file": ..., "model": name, "keyflow": "reduced"}
+#           {"op": "edit", "model": ..., "disable": [3], "enable": [],
+#            "update": {"2": {"d": 0.2}}, "add": [[0, 5, 0.1, 0.05]],
+#            "lim_s": {"4": 0.1}, "lim_R": {"9": null}}
+#           {"op": "sweep", "model": ..., "points": [{"d": 0.2}, ...]}
+#           {"op": "n1", "model": ..., "edges": [0, 1]}
+#           {"op": "drop", "model": ...}
+#   GET /metrics, GET /models
+# "model" defaults to "file", and a model named by a file is loaded on
+# first use. sweep restores the model afterwards, edit keeps its changes.
+
+OPS = ['load', 'solve', 'edit', 'sweep', 'n1', 'drop', 'models']
+
+def intKeys(x):
+    # JSON object keys are strings, edge and node indices are ints
+    return dict((int(k), v) for k, v in x.items()) if isinstance(x, dict) else x
+
+def finite(x):
+    # NaN marks a solve without an optimum, JSON has null for it
+    return None if x != x else x
+
+def solveResult(solv):
+    solv.solver.Solve()
+    st = solv.solver.stats
+    return {'objective': solv.solver.Objective().Value(), 'status': st['status'], 'rates': solv.rates(),
+            'edges_weight': solv.edgesWeight(), 'solve_time': st['solve_time']}
+
+class Model:
+
+    def __init__(self, filename, backend, keyflow='full'):
+        from project import SolverLP
+        self.solv = SolverLP.fromFile(filename, backend=backend, keyflow=keyflow, debug=False)
+        self.solv.build()
+        # Result of the last solve, None after a change
+        self.last = None
+
+    def solve(self):
+        cached = self.last is not None
+        if not cached:
+            self.last = solveResult(self.solv)
+        return dict(self.last, cached=cached)
+
+    def edit(self, req):
+        # Forget the last solve first, an edit that fails halfway still
+        # changed the model
+        self.last = None
+        solv = self.solv
+        for i in req.get('disable', []):
+            solv.disableEdge(int(i))
+        for i in req.get('enable', []):
+            solv.enableEdge(int(i))
+        for i, x in intKeys(req.get('update', dict())).items():
+            solv.updateEdge(i, x.get('d'), x.get('r'))
+        for u, v, d, r in req.get('add', []):
+            solv.addEdge(int(u), int(v), float(d), float(r))
+        solv.updateLimits(intKeys(req.get('lim_s')), intKeys(req.get('lim_R')))
+        return self.solve()
+
+    def sweep(self, points):
+        solv = self.solv
+        edges = list(solv.edges)
+        lim_s, lim_R = dict(solv.lim_s), dict(solv.lim_R)
+        ret = []
+        try:
+            points = [dict((k, intKeys(v)) for k, v in p.items()) for p in points]
+            for point, obj, rates in solv.sweep(points):
+                ret.append({'objective': finite(obj), 'rates': [finite(x) for x in rates],
+                            'status': solv.solver.stats['status']})
+        finally:
+            for i, (u, v, d, r) in enumerate(edges):
+                if solv.edges[i] != (u, v, d, r):
+                    solv.updateEdge(i, d, r)
+            solv.updateLimits(dict((u, lim_s.get(u)) for u in set(solv.lim_s) | set(lim_s)),
+                              dict((u, lim_R.get(u)) for u in set(solv.lim_R) | set(lim_R)))
+        return {'points': ret}
+
+def handle(models, req, backend):
+    op = req.get('op')
+    name = req.get('model') or req.get('file')
+    if op == 'models':
+        return {'models': sorted(models)}
+    if op not in OPS:
+        raise ValueError('unknown op %r, expected one of %s' % (op, ', '.join(OPS)))
+    if name is None:
+        raise ValueError('%s needs a model or a file' % op)
+    if op == 'drop':
+        model = models.pop(name, None)
+        if model is not None:
+            model.solv.Clear()
+        return {'dropped': model is not None}
+    if op == 'load' or name not in models:
+        if 'file' not in req:
+            raise KeyError('no model %r loaded' % name)
+        start = time()
+        models[name] = Model(req['file'], req.get('backend', backend), req.get('keyflow', 'full'))
+        if op == 'load':
+            return {'model': name, 'build_time': time() - start,
+                    'variables': models[name].solv.solver.NumVariables(),
+                    'constraints': models[name].solv.solver.NumConstraints()}
+    model = models[name]
+    if op == 'solve':
+        return model.solve()
+    if op == 'edit':
+        return model.edit(req)
+    if op == 'sweep':
+        return model.sweep(req.get('points', []))
+    if op == 'n1':
+        model.last = None
+        ranking = model.solv.failureRanking(req.get('edges'))
+        return {'ranking': [{'edge': i, 'objective': finite(obj), 'loss': finite(loss)} for i, obj, loss in ranking]}
+
+def worker(requests, results, backend):
+    # Requests are (id, request), None stops the worker. Results are
+    # (id, response, service time, batch size, models held)
+    import queue
+    models = dict()
+    while True:
+        batch = [requests.get()]
+        while True:
+            try:
+                batch.append(requests.get_nowait())
+            except queue.Empty:
+                break
+        for item in batch:
+            if item is None:
+                return
+            rid, req = item
+            start = time()
+            try:
+                ret = handle(models, req, backend)
+            except Exception as e:
+                ret = {'error': '%s: %s' % (type(e).__name__, e)}
+            results.put((rid, ret, time() - start, len(batch), len(models)))
+
+def percentiles(x):
+    import numpy as np
+    if not x:
+        return {'count': 0}
+    x = np.array(x) * 1000
+    return {'count': len(x), 'mean_ms': float(x.mean()), 'p50_ms': float(np.percentile(x, 50)),
+            'p95_ms': float(np.percentile(x, 95)), 'p99_ms': float(np.percentile(x, 99)), 'max_ms': float(x.max())}
+
+class Service:
+
+    def __init__(self, workers=2, backend='glop', window=10000, timeout=None):
+        self.ctx = get_context('fork' if sys.platform != 'win32' else 'spawn')
+        self.backend = backend
+        self.ids = count()
+        self.pending = dict()
+        self.lock = threading.Lock()
+        self.started = time()
+        # Seconds call() waits for an answer, None for as long as the
+        # worker lives
+        self.timeout = timeout
+        # Metrics: outstanding requests per worker, latencies per op (the
+        # last `window`), service time, batch sizes and models per worker
+        self.depth = [0] * workers
+        self.latency = dict((op, deque(maxlen=window)) for op in OPS)
+        self.service = deque(maxlen=window)
+        self.batches = deque(maxlen=window)
+        self.held = [0] * workers
+        self.errors = 0
+        self.served = 0
+        self.restarts = 0
+        self.queues = [None] * workers
+        self.procs = [None] * workers
+        for w in range(workers):
+            self.spawn(w)
+
+    def spawn(self, w):
+        # Every worker process has its own queues and reader thread: one
+        # killed while it reads or writes leaves its queue locked
+        self.queues[w] = self.ctx.Queue()
+        results = self.ctx.Queue()
+        self.procs[w] = self.ctx.Process(target=worker, args=(self.queues[w], results, self.backend), daemon=True)
+        self.procs[w].start()
+        threading.Thread(target=self.collect, args=(results, self.procs[w]), daemon=True).start()
+
+    def restart(self, w, proc):
+        # Called with the lock held once proc, worker w, died. Its models
+        # are gone and every request still waiting on it fails; the new
+        # worker loads a model again on first use
+        if self.procs[w] is not proc:
+            return
+        error = RuntimeError('worker %d exited with code %s' % (w, proc.exitcode))
+        for rid, entry in list(self.pending.items()):
+            if entry[4] == w and entry[1] is None:
+                entry[1] = error
+                self.depth[w] -= 1
+                self.errors += 1
+                if entry[0] is None:
+                    del self.pending[rid]
+                else:
+                    entry[0].set()
+        self.held[w] = 0
+        self.restarts += 1
+        self.spawn(w)
+
+    def route(self, req):
+        name = req.get('model') or req.get('file') or ''
+        return zlib.crc32(str(name).encode()) % len(self.queues)
+
+    def call(self, req, timeout=None):
+        if not isinstance(req, dict):
+            raise ValueError('a request is a JSON object, not %s' % type(req).__name__)
+        return self.ask(self.route(req), req, timeout)
+
+    def ask(self, w, req, timeout=None):
+        # Blocks until worker w answers. Raises TimeoutError after `timeout`
+        # seconds (default self.timeout), an answer that comes after that
+        # is dropped. A dead worker is restarted, and the requests it held
+        # raise RuntimeError
+        timeout = self.timeout if timeout is None else timeout
+        timeout = float('inf') if timeout is None else timeout
+        event = threading.Event()
+        with self.lock:
+            if not self.procs[w].is_alive():
+                self.restart(w, self.procs[w])
+            proc = self.procs[w]
+            rid = next(self.ids)
+            self.pending[rid] = [event, None, req.get('op'), time(), w]
+            self.depth[w] += 1
+            self.queues[w].put((rid, req))
+        start = time()
+        while not event.wait(min(0.5, timeout)):
+            alive = proc.is_alive()
+            if alive and time() - start < timeout:
+                continue
+            with self.lock:
+                if event.is_set():
+                    break
+                if not alive:
+                    self.restart(w, proc)
+                    break
+                self.errors += 1
+                self.pending[rid][0] = None
+            raise TimeoutError('no answer from worker %d in %gs' % (w, timeout))
+        with self.lock:
+            ret = self.pending.pop(rid)[1]
+        if isinstance(ret, Exception):
+            raise ret
+        return ret
+
+    def collect(self, results, proc):
+        # Answers of one worker process until it is gone
+        import queue
+        while True:
+            try:
+                item = results.get(timeout=0.5)
+            except queue.Empty:
+                if proc.is_alive():
+                    continue
+                return
+            rid, ret, took, batch, held = item
+            with self.lock:
+                entry = self.pending.get(rid)
+                if entry is None or entry[1] is not None:
+                    # Failed by restart() already
+                    continue
+                entry[1] = ret
+                event = entry[0]
+                if event is None:
+                    # The caller gave up waiting
+                    del self.pending[rid]
+                w = entry[4]
+                self.depth[w] -= 1
+                self.held[w] = held
+                self.served += 1
+                self.errors += 'error' in ret
+                if entry[2] in self.latency:
+                    self.latency[entry[2]].append(time() - entry[3])
+                self.service.append(took)
+                self.batches.append(batch)
+            if event is not None:
+                event.set()
+
+    def metrics(self):
+        with self.lock:
+            return {'uptime': time() - self.started, 'served': self.served, 'errors': self.errors,
+                    'restarts': self.restarts,
+                    'queue_depth': list(self.depth), 'models': list(self.held),
+                    'latency': dict((op, percentiles(list(x))) for op, x in self.latency.items() if x),
+                    'service': percentiles(list(self.service)),
+                    'mean_batch': sum(self.batches) / float(len(self.batches)) if self.batches else 0.0}
+
+    def models(self):
+        ret = []
+        for w in range(len(self.queues)):
+            # Ask every worker directly, route() would pick one
+            ret.extend(self.ask(w, {'op': 'models'})['models'])
+        return {'models': sorted(ret)}
+
+    def close(self):
+        for q in self.queues:
+            q.put(None)
+        for p in self.procs:
+            p.join()
+
+def makeServer(service, host='127.0.0.1', port=8765):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def reply(self, code, value):
+            body = json.dumps(value).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def answer(self, fn, *args):
+            # A worker that takes too long or died is the service's fault,
+            # an error in the request the client's
+            try:
+                ret = fn(*args)
+            except TimeoutError as e:
+                self.reply(504, {'error': 'TimeoutError: %s' % e})
+            except RuntimeError as e:
+                self.reply(503, {'error': 'RuntimeError: %s' % e})
+            else:
+                self.reply(400 if 'error' in ret else 200, ret)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self.reply(200, service.metrics())
+            elif self.path == '/models':
+                self.answer(service.models)
+            else:
+                self.reply(404, {'error': 'GET /metrics or /models'})
+
+        def do_POST(self):
+            try:
+                req = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not isinstance(req, dict):
+                    raise ValueError('expected an object, got %s' % type(req).__name__)
+            except ValueError as e:
+                self.reply(400, {'error': 'bad JSON: %s' % e})
+                return
+            self.answer(service.call, req)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    # Room for many clients connecting at once, the default backlog is 5
+    ThreadingHTTPServer.request_queue_size = 128
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+def serve(host='127.0.0.1', port=8765, workers=2, backend='glop', timeout=600):
+    service = Service(workers, backend, timeout=timeout)
+    server = makeServer(service, host, port)
+    print('serving on http://%s:%d with %d workers' % (host, server.server_address[1], workers), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+class Client:
+
+    def __init__(self, url='http://127.0.0.1:8765'):
+        self.url = url.rstrip('/')
+
+    def request(self, path, body=None):
+        from urllib.request import Request, urlopen
+        from urllib.error import HTTPError
+        data = None if body is None else json.dumps(body).encode()
+        req = Request(self.url + path, data, {'Content-Type': 'application/json'})
+        try:
+            with urlopen(req) as f:
+                return json.loads(f.read())
+        except HTTPError as e:
+            return json.loads(e.read())
+
+    def call(self, op, **kwargs):
+        kwargs['op'] = op
+        return self.request('/', kwargs)
+
+    def metrics(self):
+        return self.request('/metrics')
+
+def main():
+    parser = argparse.ArgumentParser(description='Solver service on localhost HTTP, and a client for it.')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('serve', help='run the service')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('-p', '--port', type=int, default=8765)
+    p.add_argument('-j', '--workers', type=int, default=2)
+    p.add_argument('-b', '--backend', default='glop')
+    p.add_argument('-t', '--timeout', type=float, default=600, help='seconds a request may wait for its worker')
+    p = sub.add_parser('call', help='send one request, e.g. call solve file=input/Butterfly.in')
+    p.add_argument('op', choices=OPS)
+    p.add_argument('args', nargs='*', help='key=value, values are JSON or plain strings')
+    p.add_argument('-u', '--url', default='http://127.0.0.1:8765')
+    p = sub.add_parser('metrics', help='print the service metrics')
+    p.add_argument('-u', '--url', default='http://127.0.0.1:8765')
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(args.host, args.port, args.workers, args.backend, args.timeout)
+    elif args.command == 'call':
+        kwargs = dict()
+        for item in args.args:
+            key, value = item.split('=', 1)
+            try:
+                kwargs[key] = json.loads(value)
+            except ValueError:
+                kwargs[key] = value
+        print(json.dumps(Client(args.url).call(args.op, **kwargs)))
+    elif args.command == 'metrics':
+        print(json.dumps(Client(args.url).metrics(), indent=1))
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
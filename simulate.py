@@ -0,0 +1,209 @@
+from __future__ import print_function
+import argparse
+import io, contextlib
+import os
+from multiprocessing import Pool
+from time import time
+import numpy as np
+from scipy import stats
+from project import SolverLP
+
+# Monte Carlo check of a solved SolverLP under the channel model behind
+# its Key and Cap rows (see RY-network.py). Each time unit every edge is
+# used once: its head loses the packet with probability d and the
+# eavesdropper misses it with probability r, independently.
+#   messages  R per time unit, sent again until the head has them, so
+#             R/(1-d) uses; the eavesdropper reads a message if it catches
+#             any copy, (1-r)/(1-dr) of them on average
+#   k         key bits from k/((1-d)r) uses of fresh random packets: the
+#             ones the head gets and the eavesdropper misses
+#   e         random packets sent like messages (e/(1-d) uses), key from
+#             the ones the eavesdropper never catches, (1-d)r/(1-dr)
+# Messages read beyond the key bits of the edge leak. A pair's messages
+# take the paths of its f_R flow, and a path carries its flow times the
+# delivered share of its slowest edge. There is one eavesdropper on one
+# edge, so a pair leaks the largest share of an edge's leak it has. The
+# random bits E_u that the LM rows bound the keys by are taken as given.
+# Use counts are rounded at random so that their mean is exact. Shares and
+# leaks are averaged per edge over the trials before the min and max over
+# edges, which would otherwise turn trial noise into lost throughput and
+# leaks. Their intervals are Bonferroni corrected over the pair's edges.
+
+def decompose(flow, edges, s, d, tol=1e-12):
+    # Paths of one pair's edge flow as (edge indices, flow)
+    flow = flow.copy()
+    out = dict()
+    for i, (u, v, de, re) in enumerate(edges):
+        out.setdefault(u, []).append((v, i))
+    paths = []
+    while True:
+        path, n, seen = [], s, set([s])
+        while n != d:
+            step = [(v, i) for v, i in out.get(n, []) if flow[i] > tol and v not in seen]
+            if not step:
+                break
+            n, i = max(step, key=lambda x: flow[x[1]])
+            seen.add(n)
+            path.append(i)
+        if n != d or not path:
+            return paths
+        f = flow[path].min()
+        flow[path] -= f
+        paths.append((path, f))
+
+def edgePlan(solv):
+    # What a solved SolverLP sends on every edge, and the paths of every
+    # distinct pair
+    solv.vars.load()
+    f_R = np.clip(solv.vars.values('f_R'), 0, None)
+    plan = {'d': np.array([d for u, v, d, r in solv.edges], dtype=np.float64),
+            'r': np.array([r for u, v, d, r in solv.edges], dtype=np.float64),
+            'R': f_R.sum(axis=0), 'flow': f_R,
+            'k': np.clip(solv.vars.values('k'), 0, None), 'e': np.clip(solv.vars.values('e'), 0, None)}
+    plan['paths'] = [decompose(f_R[p], solv.edges, s, d) for (s, d), p in solv.pair_id.items()]
+    return plan
+
+def useRates(plan):
+    # Channel uses per time unit of every kind (messages, k, e) and edge,
+    # the Cap row keeps their sum on an edge at most 1
+    d, r = plan['d'], plan['r']
+    ok = d < 1
+    need = np.stack([plan['R'], np.where(r > 0, plan['k'] / np.where(r > 0, r, 1), 0), plan['e']])
+    return np.where(ok, need / np.where(ok, 1 - d, 1), 0)
+
+def schedule(plan, uses, rng):
+    x = useRates(plan) * uses
+    n = np.floor(x)
+    return (n + (rng.random(x.shape) < x - n)).astype(np.int64)
+
+def trial(plan, uses, rng):
+    # One run of `uses` time units. Returns per time unit, for every edge,
+    # the delivered messages, the messages the eavesdropper read and the
+    # key bits
+    d, r = plan['d'], plan['r']
+    M = len(d)
+    lens = schedule(plan, uses, rng).ravel()
+    N = int(lens.sum())
+    if N == 0:
+        return np.zeros((3, M))
+    # Segments of uses by kind (messages, k, e), then edge
+    seg = np.repeat(np.arange(3 * M), lens)
+    head = rng.random(N) >= np.repeat(np.tile(d, 3), lens)
+    eve = rng.random(N) >= np.repeat(np.tile(r, 3), lens)
+    # A packet runs up to the use that delivers it, or to the end of its
+    # segment undelivered
+    last = np.zeros(N, dtype=bool)
+    last[np.cumsum(lens)[lens > 0] - 1] = True
+    end = head | last
+    start = np.flatnonzero(np.concatenate([[True], end[:-1]]))
+    caught = np.logical_or.reduceat(eve, start)
+    got = head[np.concatenate([start[1:], [N]]) - 1]
+    pseg = seg[start]
+    delivered = np.bincount(pseg, weights=got, minlength=3 * M).reshape(3, M)
+    read = np.bincount(pseg, weights=got & caught, minlength=3 * M).reshape(3, M)
+    fresh = np.bincount(seg, weights=head & ~eve, minlength=3 * M).reshape(3, M)
+    return np.stack([delivered[0], read[0], fresh[1] + delivered[2] - read[2]]) / float(uses)
+
+def runTrials(args):
+    # Runs inside a pool worker
+    plan, uses, seeds = args
+    return np.array([trial(plan, uses, np.random.default_rng(s)) for s in seeds])
+
+def meanError(x):
+    # Mean over the trials (axis 0) and its standard error
+    n = len(x)
+    return x.mean(axis=0), (x.std(axis=0, ddof=1) / np.sqrt(n) if n > 1 else np.zeros(x.shape[1:]))
+
+def criticalValue(level, n, m):
+    # t quantile of a two-sided interval at `level` shared by m estimates
+    return stats.t.ppf(1 - (1 - level) / (2 * m), n - 1) if n > 1 else 0.0
+
+class Simulator:
+
+    def __init__(self, solv):
+        self.solv = solv
+        self.plan = edgePlan(solv)
+        self.pairs = list(solv.pair_id)
+
+    def run(self, packets=10 ** 7, trials=32, processes=None, seed=0):
+        # Runs as many time units as make `packets` channel uses over all
+        # edges and trials. Returns per-trial arrays (trials, 3, edges) as
+        # trial()
+        plan = self.plan
+        self.uses = max(1, int(packets / (trials * max(useRates(plan).sum(), 1e-12))))
+        seeds = np.random.SeedSequence(seed).spawn(trials)
+        processes = processes or os.cpu_count()
+        start = time()
+        if processes > 1:
+            chunks = [(plan, self.uses, seeds[i::processes]) for i in range(processes) if seeds[i::processes]]
+            pool = Pool(len(chunks))
+            try:
+                parts = pool.map(runTrials, chunks)
+            finally:
+                pool.close()
+                pool.join()
+            # Back to seed order, chunk i holds trials i, i + processes, ...
+            self.trials = np.empty((trials,) + parts[0].shape[1:])
+            for i, part in enumerate(parts):
+                self.trials[i::processes] = part
+        else:
+            self.trials = runTrials((plan, self.uses, seeds))
+        self.time = time() - start
+        # Expected, the counts of a trial are rounded at random
+        self.packets = int(round(useRates(plan).sum() * self.uses * trials))
+        return self.trials
+
+    def pairStats(self, level=0.95):
+        # Per distinct pair: LP rate, achieved throughput and leak (both per
+        # time unit) as (mean, low, high) over the trials
+        plan = self.plan
+        delivered, read, key = self.trials[:, 0], self.trials[:, 1], self.trials[:, 2]
+        R = plan['R']
+        n = len(self.trials)
+        share, share_se = meanError(np.where(R > 0, delivered / np.where(R > 0, R, 1), 1))
+        leak, leak_se = meanError(read - key)
+        ret = []
+        for p, paths in enumerate(plan['paths']):
+            rate = sum(f for path, f in paths)
+            mine = plan['flow'][p] / np.where(R > 0, R, 1)
+            on = sorted(set(i for path, f in paths for i in path))
+            z = criticalValue(level, n, max(1, len(on)))
+            got = tuple(sum(f * min(1, (share + sign * z * share_se)[path].min()) for path, f in paths)
+                        for sign in (0, -1, 1))
+            z = criticalValue(level, n, max(1, (mine > 0).sum()))
+            lost = tuple(max(0, ((leak + sign * z * leak_se) * mine).max()) if len(mine) else 0.0
+                         for sign in (0, -1, 1))
+            ret.append((rate, got, lost))
+        return ret
+
+    def report(self, level=0.95):
+        print('%d trials of %d time units, %d packets in %.3fs (%.1f Mpackets/s)' % (
+            len(self.trials), self.uses, self.packets, self.time, self.packets / max(self.time, 1e-9) / 1e6))
+        print('%6s %6s %14s %14s %25s %14s %25s' % ('s', 'd', 'LP rate', 'throughput', '%g%% interval' % (100 * level),
+                                                   'leak', '%g%% interval' % (100 * level)))
+        for (s, d), (rate, got, lost) in zip(self.pairs, self.pairStats(level)):
+            print('%6d %6d %14.10f %14.10f [%11.8f, %11.8f] %14.10f [%11.8f, %11.8f]' % (
+                s, d, rate, got[0], got[1], got[2], lost[0], lost[1], lost[2]))
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate the packets of a solved topology under erasures and one '
+                                     'eavesdropper.')
+    parser.add_argument('input', help='.in or .npz topology file')
+    parser.add_argument('-n', '--packets', type=float, default=1e7, help='channel uses over all edges and trials')
+    parser.add_argument('-t', '--trials', type=int, default=32)
+    parser.add_argument('-j', '--processes', type=int, default=os.cpu_count(), help='pool size')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-l', '--level', type=float, default=0.95, help='confidence level')
+    parser.add_argument('-b', '--backend', default='glop')
+    args = parser.parse_args()
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv = SolverLP.fromFile(args.input, backend=args.backend, debug=False)
+        solv.Solve()
+    print('Objective = %.12f' % solv.solver.Objective().Value())
+    sim = Simulator(solv)
+    sim.run(int(args.packets), args.trials, args.processes, args.seed)
+    sim.report(args.level)
+    solv.Clear()
+
+if __name__ == '__main__':
+    main()
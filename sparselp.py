@@ -0,0 +1,346 @@
+from __future__ import print_function
+from time import time
+import numpy as np
+from scipy import sparse
+from project import SolverLP
+from loader import loadTopology
+from backend import createSolver, OPTIMAL
+
+INF = np.inf
+
+# Same model as SolverLP, but every variable and constraint family is
+# built at once as NumPy arrays indexed by integer ids:
+#   nodes 0..V-1, edges 0..M-1 (file order), sources 0..S-1,
+#   non-source nodes 0..W-1, pairs 0..P-1 (s_to_d without duplicates)
+class SparseLP:
+
+    def __init__(self, nodes, edges, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R, prune=True):
+        self.nodes = nodes
+        self.edges = edges
+        self.source = source
+        self.destination = destination
+        self.graph = graph
+        self.reverse_graph = reverse_graph
+        self.s_to_d = s_to_d
+        self.lim_s = lim_s
+        self.lim_R = lim_R
+        self.prune = prune
+        self.x = None
+
+    @classmethod
+    def fromFile(cls, filename, **kwargs):
+        topo = loadTopology(filename)
+        lim_s, lim_R = topo.limits()
+        # Only the edge array is needed, not the dict graphs
+        return cls(topo.nodes, topo.edgeArray(), topo.source, topo.destination, None, None,
+                   topo.pairs(), lim_s, lim_R, **kwargs)
+
+    def createIndex(self):
+        V = self.nodes
+        # edges is a list of (u, v, d, r) or an (M, 4) array
+        edges = np.asarray(self.edges, dtype=np.float64).reshape(-1, 4)
+        self.u = edges[:, 0].astype(np.int64)
+        self.v = edges[:, 1].astype(np.int64)
+        self.d = edges[:, 2]
+        self.r = edges[:, 3]
+        self.src = np.array(list(dict.fromkeys(self.source)), dtype=np.int64)
+        is_src = np.zeros(V, dtype=bool)
+        is_src[self.src] = True
+        self.nonsrc = np.flatnonzero(~is_src)
+        # Position of a node in src / nonsrc, -1 if it is not there
+        self.src_id = np.full(V, -1, dtype=np.int64)
+        self.src_id[self.src] = np.arange(len(self.src))
+        self.nonsrc_id = np.full(V, -1, dtype=np.int64)
+        self.nonsrc_id[self.nonsrc] = np.arange(len(self.nonsrc))
+        pairs = list(dict.fromkeys(self.s_to_d))
+        self.pair_s = np.array([s for s, d in pairs], dtype=np.int64)
+        self.pair_d = np.array([d for s, d in pairs], dtype=np.int64)
+        pair_id = dict((p, i) for i, p in enumerate(pairs))
+        self.pair_of = np.array([pair_id[p] for p in self.s_to_d], dtype=np.int64)
+        dest = np.array(list(dict.fromkeys(self.destination)), dtype=np.int64)
+        self.dest = dest[~is_src[dest]] if len(dest) else dest
+        self.objective_nodes = dest
+
+    def createReachability(self):
+        # reach[a, b] is True when b can be reached from a
+        V = self.nodes
+        if not self.prune:
+            self.reach = np.ones((V, V), dtype=bool)
+            return
+        self.reach = np.eye(V, dtype=bool)
+        indeg = np.bincount(self.v, minlength=V)
+        children = [[] for n in range(V)]
+        for a, b in zip(self.u.tolist(), self.v.tolist()):
+            children[a].append(b)
+        order = [n for n in range(V) if indeg[n] == 0]
+        for n in order:
+            for b in children[n]:
+                indeg[b] -= 1
+                if indeg[b] == 0:
+                    order.append(b)
+        if len(order) == V:
+            for n in reversed(order):
+                if children[n]:
+                    self.reach[n] |= self.reach[children[n]].any(axis=0)
+        else:
+            # Not a DAG, iterate to a fixed point instead
+            adj = sparse.csr_matrix((np.ones(len(self.u)), (self.u, self.v)), shape=(V, V))
+            while True:
+                nxt = self.reach | (adj.dot(self.reach.astype(np.float64)) > 0)
+                if (nxt == self.reach).all():
+                    break
+                self.reach = nxt
+
+    def addColumns(self, name, count, lb=0.0, ub=INF):
+        start = self.ncols
+        self.col_start[name] = start
+        self.ncols += count
+        self.col_lb.append(np.broadcast_to(np.asarray(lb, dtype=np.float64), (count,)))
+        self.col_ub.append(np.broadcast_to(np.asarray(ub, dtype=np.float64), (count,)))
+        return start + np.arange(count, dtype=np.int64)
+
+    def addRows(self, name, count, lb, ub, rows, cols, vals):
+        # rows are local to this block and get shifted by the current row count
+        start = self.nrows
+        self.row_start[name] = start
+        self.row_count[name] = count
+        self.nrows += count
+        self.row_lb.append(np.broadcast_to(np.asarray(lb, dtype=np.float64), (count,)))
+        self.row_ub.append(np.broadcast_to(np.asarray(ub, dtype=np.float64), (count,)))
+        rows = [np.asarray(x, dtype=np.int64) + start for x in rows]
+        cols = [np.asarray(x, dtype=np.int64) for x in cols]
+        vals = [np.broadcast_to(np.asarray(x, dtype=np.float64), c.shape) for x, c in zip(vals, cols)]
+        self.coo_rows.extend(rows)
+        self.coo_cols.extend(cols)
+        self.coo_vals.extend(vals)
+
+    def createVariables(self):
+        V, M = self.nodes, len(self.edges)
+        S, W = len(self.src), len(self.nonsrc)
+        self.ncols = 0
+        self.col_start = dict()
+        self.col_lb = []
+        self.col_ub = []
+        lim_R = np.full(V, np.nan)
+        lim_s = np.full(V, np.nan)
+        for i, x in self.lim_R.items():
+            lim_R[i] = x
+        for i, x in self.lim_s.items():
+            lim_s[i] = x
+        fixed = ~np.isnan(lim_R)
+        self.R_node = self.addColumns('R_node', V, np.where(fixed, lim_R, 0), np.where(fixed, lim_R, INF))
+        fixed = ~np.isnan(lim_s)
+        self.E_node = self.addColumns('E_node', V, np.where(fixed, lim_s, 0), np.where(fixed, lim_s, INF))
+        self.k = self.addColumns('k', M)
+        self.e = self.addColumns('e', M)
+        self.R_edge = self.addColumns('R_edge', M)
+        # [source, edge] and [source, non-source node] families
+        self.e_s = self.addColumns('e_s', S * M).reshape(S, M)
+        self.k_s = self.addColumns('k_s', S * M).reshape(S, M)
+        self.E_s = self.addColumns('E_s', S * W).reshape(S, W)
+        self.R_s = self.addColumns('R_s', S * W).reshape(S, W)
+        self.R_s_edge = self.addColumns('R_s_edge', S * M).reshape(S, M)
+        # Flow of keys: (source, non-source d, edge) on some s -> d path
+        mask = self.reach[self.src][:, self.u][:, None, :] & self.reach[self.v][:, self.nonsrc].T[None, :, :]
+        self.fk_s, self.fk_d, self.fk_e = np.nonzero(mask)
+        self.f_k = self.addColumns('f_k', len(self.fk_e))
+        # Flow of messages: (pair, edge) on the s -> d path
+        mask = self.reach[self.pair_s][:, self.u] & self.reach[self.v][:, self.pair_d].T
+        self.fR_p, self.fR_e = np.nonzero(mask)
+        self.f_R = self.addColumns('f_R', len(self.fR_e))
+
+    def flowRows(self, commodity, ends, tail, head, var):
+        # Flow in == flow out on every inner node of a commodity.
+        # commodity/tail/head/var describe one entry per flow variable,
+        # ends[c] is the pair of nodes that are not conserved for c.
+        V = self.nodes
+        key = np.concatenate([commodity * V + head, commodity * V + tail])
+        coef = np.concatenate([np.ones(len(var)), -np.ones(len(var))])
+        cols = np.concatenate([var, var])
+        node = key % V
+        c = key // V
+        keep = (node != ends[0][c]) & (node != ends[1][c])
+        keys, rows = np.unique(key[keep], return_inverse=True)
+        return len(keys), rows, cols[keep], coef[keep]
+
+    def createSecurityConstraint(self):
+        M, S, W = len(self.edges), len(self.src), len(self.nonsrc)
+        d, r = self.d, self.r
+        m = np.arange(M)
+        # Constraint 1 Random bits for generate Key
+        self.addRows('Key', M, 0, INF, [m, m, m], [self.k, self.e, self.R_edge],
+                     [1-d*r, (1-d)*r, -(1-r)])
+        # Constraint 2 Capacity
+        self.addRows('Cap', M, -INF, 1-d, [m, m, m], [self.R_edge, self.k, self.e], [1, 1/r, 1])
+        # Constraint 3 u has random bits for sending
+        self.addRows('LM', M, -INF, 0, [m, m, m], [self.k, self.E_node[self.u], self.e],
+                     [1-d*r, -(1-d)*r, (1-d)*r])
+        # Constraints 4, 5 and the R_e sum: x_e = Sum x_e from Si
+        sm = np.tile(m, S)
+        for name, total, part in [('Sum_e_e', self.e, self.e_s), ('Sum_k_e', self.k, self.k_s),
+                                  ('Sum_R_e', self.R_edge, self.R_s_edge)]:
+            self.addRows(name, M, 0, 0, [m, sm], [total, part.ravel()], [1, -1])
+        # Constraint 6 and the R_u sum: x_u = Sum x_u from Si
+        w = np.arange(W)
+        sw = np.tile(w, S)
+        for name, total, part in [('Sum_E_u', self.E_node, self.E_s), ('Sum_R_u', self.R_node, self.R_s)]:
+            self.addRows(name, W, 0, 0, [w, sw], [total[self.nonsrc], part.ravel()], [1, -1])
+
+    def createFlowConstraint(self):
+        M, S, W = len(self.edges), len(self.src), len(self.nonsrc)
+        P = len(self.pair_s)
+        fk_u, fk_v = self.u[self.fk_e], self.v[self.fk_e]
+        fk_src = self.src[self.fk_s]
+        # Flow in == Flow out
+        commodity = self.fk_s * W + self.fk_d
+        ends = (np.repeat(self.src, W), np.tile(self.nonsrc, S))
+        n, rows, cols, coef = self.flowRows(commodity, ends, fk_u, fk_v, self.f_k)
+        self.addRows('Flow_in_out', n, 0, 0, [rows], [cols], [coef])
+        # Flow Capacity
+        n = len(self.f_k)
+        self.addRows('FlowCap', n, -INF, 0, [np.arange(n)] * 3,
+                     [self.f_k, self.k_s[self.fk_s, self.fk_e], self.e_s[self.fk_s, self.fk_e]],
+                     [1, -1/self.r[self.fk_e], -1])
+        # Limit of Flow
+        out = fk_u == fk_src
+        sw = np.arange(S * W)
+        self.addRows('LM_Flow', S * W, -INF, 0, [sw, commodity[out]],
+                     [np.repeat(self.E_node[self.src], W), self.f_k[out]], [-1, 1])
+        # Limit of E from Source i, row (u, s)
+        into = fk_v == self.nonsrc[self.fk_d]
+        self.addRows('LM_bits', W * S, -INF, 0, [np.arange(W * S), self.fk_d[into] * S + self.fk_s[into]],
+                     [self.E_s.T.ravel(), self.f_k[into]], [1, -1])
+
+        fR_u, fR_v = self.u[self.fR_e], self.v[self.fR_e]
+        fR_si = self.src_id[self.pair_s[self.fR_p]]
+        # Flow_R in == Flow_R out
+        n, rows, cols, coef = self.flowRows(self.fR_p, (self.pair_s, self.pair_d), fR_u, fR_v, self.f_R)
+        self.addRows('Flow_R_in_out', n, 0, 0, [rows], [cols], [coef])
+        # Flow_R Capacity, row (s, edge)
+        self.addRows('Flow_R_Cap', S * M, -INF, 0, [np.arange(S * M), fR_si * M + self.fR_e],
+                     [self.R_s_edge.ravel(), self.f_R], [-1, 1])
+        # Limit_R of Flow
+        out = fR_u == self.pair_s[self.fR_p]
+        self.addRows('LM_Flow_R', S, -INF, 0, [np.arange(S), fR_si[out]],
+                     [self.R_node[self.src], self.f_R[out]], [-1, 1])
+        # Limit of R from Source i, row (destination, s)
+        D = len(self.dest)
+        dest_id = np.full(self.nodes, -1, dtype=np.int64)
+        dest_id[self.dest] = np.arange(D)
+        into = dest_id[fR_v] >= 0
+        self.addRows('LM_R_bits', D * S, -INF, 0,
+                     [np.arange(D * S), dest_id[fR_v[into]] * S + fR_si[into]],
+                     [self.R_s[:, self.nonsrc_id[self.dest]].T.ravel(), self.f_R[into]], [1, -1])
+
+    def createConstraints(self):
+        self.nrows = 0
+        self.row_start = dict()
+        self.row_count = dict()
+        self.row_lb = []
+        self.row_ub = []
+        self.coo_rows = []
+        self.coo_cols = []
+        self.coo_vals = []
+        self.createSecurityConstraint()
+        self.createFlowConstraint()
+
+    def createObjective(self):
+        self.c = np.zeros(self.ncols)
+        self.c[self.R_node[self.objective_nodes]] = 1
+
+    def build(self):
+        self.createIndex()
+        self.createReachability()
+        self.createVariables()
+        self.createConstraints()
+        self.createObjective()
+        self.lb = np.concatenate(self.col_lb)
+        self.ub = np.concatenate(self.col_ub)
+        self.row_lo = np.concatenate(self.row_lb)
+        self.row_hi = np.concatenate(self.row_ub)
+        self.A = sparse.coo_matrix((np.concatenate(self.coo_vals),
+                                    (np.concatenate(self.coo_rows), np.concatenate(self.coo_cols))),
+                                   shape=(self.nrows, self.ncols)).tocsr()
+
+    def Solve(self, backend='glop'):
+        self.build()
+        solver = createSolver('Network', backend)
+        solver.loadModel(self.c, self.lb, self.ub, self.A, self.row_lo, self.row_hi)
+        status = solver.Solve()
+        if status != OPTIMAL:
+            raise RuntimeError('%s: status %d' % (backend, status))
+        self.stats = solver.stats
+        self.x = solver.solutionValues()
+        self.objective = self.c.dot(self.x)
+        return self.rates()
+
+    def rows(self, name):
+        return np.arange(self.row_start[name], self.row_start[name] + self.row_count[name])
+
+    def rates(self):
+        # Message flow entering d for each pair
+        into = self.v[self.fR_e] == self.pair_d[self.fR_p]
+        rate = np.bincount(self.fR_p[into], weights=self.x[self.f_R[into]], minlength=len(self.pair_s))
+        return rate[self.pair_of].tolist()
+
+    def edgesWeight(self):
+        count = np.bincount(self.pair_of, minlength=len(self.pair_s))
+        w = self.x[self.f_R] * count[self.fR_p]
+        return np.bincount(self.fR_e, weights=w, minlength=len(self.edges)).tolist()
+
+def layeredGraph(layers, width):
+    # width sources, `layers` layers fully connected to the next one,
+    # the last layer are the destinations
+    nodes = layers * width
+    edges = []
+    graph = dict()
+    reverse_graph = dict()
+    for l in range(layers - 1):
+        for a in range(width):
+            for b in range(width):
+                u, v = l * width + a, (l + 1) * width + b
+                i = len(edges)
+                edges.append((u, v, 0.1, 0.05))
+                graph.setdefault(u, []).append((v, 0.1, 0.05, i))
+                reverse_graph.setdefault(v, []).append((u, 0.1, 0.05, i))
+    source = list(range(width))
+    destination = list(range(nodes - width, nodes))
+    s_to_d = [(s, d) for s in source for d in destination]
+    return nodes, edges, source, destination, graph, reverse_graph, s_to_d, dict(), dict()
+
+def main():
+    from glob import glob
+    import io, contextlib
+    print('Objective SolverLP / SparseLP (GLOP) / SparseLP (HiGHS)')
+    for filename in sorted(glob('input/*.in')):
+        with contextlib.redirect_stdout(io.StringIO()):
+            with SolverLP.fromFile(filename) as solv:
+                solv.Solve()
+                ref = solv.solver.Objective().Value()
+        objs = []
+        for backend in ['glop', 'highs']:
+            lp = SparseLP.fromFile(filename)
+            lp.Solve(backend)
+            objs.append(lp.objective)
+        ok = all(abs(x - ref) <= 1e-9 * max(1, abs(ref)) for x in objs)
+        print('%-24s %.12f %.12f %.12f %s' % (filename, ref, objs[0], objs[1], 'ok' if ok else 'MISMATCH'))
+
+    print()
+    print('Build time (s)   nodes   SolverLP   SparseLP   speedup')
+    for layers in [5, 10, 20, 40, 80]:
+        inst = layeredGraph(layers, 4)
+        solv = SolverLP(*inst)
+        start = time()
+        solv.createVariables()
+        solv.createConstraints()
+        solv.createObjective()
+        t_dict = time() - start
+        solv.Clear()
+        lp = SparseLP(*inst)
+        start = time()
+        lp.build()
+        t_sparse = time() - start
+        print('                 %5d   %8.3f   %8.3f   %6.1fx' % (inst[0], t_dict, t_sparse, t_dict / t_sparse))
+
+if __name__ == '__main__':
+    main()
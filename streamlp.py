@@ -0,0 +1,602 @@
+from __future__ import print_function
+import argparse
+import io, contextlib
+import os
+import shutil
+import sys
+import zipfile
+from time import time
+import numpy as np
+from scipy import sparse
+from sparselp import SparseLP, layeredGraph
+from project import SolverLP
+from backend import createSolver, HighsBackend, OPTIMAL
+from benchmark import peakRss
+from loader import mapArrays, loadTopology
+
+INF = np.inf
+
+# SparseLP's model built in chunks whose size the memory budget sets, for
+# topologies whose full index arrays, V x V reachability or S x W x M key
+# flow mask would not fit:
+#   reachability  one block of targets at a time, (V, targets) bool
+#   columns       a family is its first column, k_s[s, e] is k_s + s*M + e
+#   rows          every chunk goes to a sink as CSR and is dropped, f_k and
+#                 its rows are made per block of (source, d) commodities
+# Only the f_R index arrays that rates() and edgesWeight() read stay, and
+# which sources reach the tail of every edge (M x S). Sinks:
+#   SolverSink    straight into a backend with NumVar / Constraint
+#   ArraySink     compact CSR blocks for loadModel() (HiGHS)
+#   FileSink      an uncompressed .npz, streamed to disk; solveFile()
+#                 replays it chunk by chunk from a memory map
+# ENTRY_BYTES is a coarse bound on what one coefficient costs while its
+# chunk is alive: COO, sort and CSR copies and the Python objects
+# SolverSink hands to the solver.
+ENTRY_BYTES = 256
+
+def spans(n, size):
+    for start in range(0, n, size):
+        yield start, min(n, start + size)
+
+class SolverSink:
+
+    def __init__(self, solver):
+        self.solver = solver
+
+    def columns(self, lb, ub):
+        inf = self.solver.infinity()
+        lb = np.where(np.isinf(lb), -inf, lb).tolist()
+        ub = np.where(np.isinf(ub), inf, ub).tolist()
+        for a, b in zip(lb, ub):
+            self.solver.NumVar(a, b, '')
+
+    def rows(self, lo, hi, indptr, cols, vals):
+        inf = self.solver.infinity()
+        lo = np.where(np.isinf(lo), -inf, lo).tolist()
+        hi = np.where(np.isinf(hi), inf, hi).tolist()
+        # Variables are looked up once per chunk, not kept
+        used, pos = np.unique(cols, return_inverse=True)
+        x = [self.solver.variable(j) for j in used.tolist()]
+        indptr, pos, vals = indptr.tolist(), pos.tolist(), vals.tolist()
+        for i in range(len(lo)):
+            ct = self.solver.Constraint(lo[i], hi[i])
+            for j in range(indptr[i], indptr[i+1]):
+                ct.SetCoefficient(x[pos[j]], vals[j])
+
+    def objective(self, cols, vals):
+        objective = self.solver.Objective()
+        for j, c in zip(cols.tolist(), vals.tolist()):
+            objective.SetCoefficient(self.solver.variable(j), c)
+        objective.SetMaximization()
+
+    def index(self, arrays):
+        pass
+
+    def finish(self):
+        pass
+
+class ArraySink:
+
+    def __init__(self):
+        self.parts = dict((name, []) for name in ['col_lb', 'col_ub', 'row_lo', 'row_hi', 'A'])
+        self.ncols = 0
+
+    def columns(self, lb, ub):
+        self.parts['col_lb'].append(np.array(lb, dtype=np.float64))
+        self.parts['col_ub'].append(np.array(ub, dtype=np.float64))
+        self.ncols += len(lb)
+
+    def rows(self, lo, hi, indptr, cols, vals):
+        self.parts['row_lo'].append(np.array(lo, dtype=np.float64))
+        self.parts['row_hi'].append(np.array(hi, dtype=np.float64))
+        # Columns made after this chunk are added to the width in finish()
+        self.parts['A'].append(sparse.csr_matrix((vals, cols, indptr), shape=(len(lo), self.ncols)))
+
+    def objective(self, cols, vals):
+        self.c_cols = cols
+        self.c_vals = vals
+
+    def index(self, arrays):
+        pass
+
+    def finish(self):
+        blocks = [sparse.csr_matrix((A.data, A.indices, A.indptr), shape=(A.shape[0], self.ncols))
+                  for A in self.parts.pop('A')]
+        self.A = sparse.vstack(blocks, format='csr') if blocks else sparse.csr_matrix((0, self.ncols))
+        for name in list(self.parts):
+            setattr(self, name, np.concatenate(self.parts.pop(name) or [np.zeros(0)]))
+        self.c = np.zeros(self.ncols)
+        self.c[self.c_cols] = self.c_vals
+
+class FileSink:
+
+    # Raw part files, joined into the .npz by finish()
+    parts = [('col_lb', np.float64), ('col_ub', np.float64), ('row_lo', np.float64), ('row_hi', np.float64),
+             ('indptr', np.int64), ('indices', np.int64), ('data', np.float64)]
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.files = dict((name, open('%s.%s.part' % (filename, name), 'wb+')) for name, dtype in self.parts)
+        self.extra = dict()
+        self.nnz = 0
+        np.zeros(1, dtype=np.int64).tofile(self.files['indptr'])
+
+    def write(self, name, x):
+        np.ascontiguousarray(x, dtype=dict(self.parts)[name]).tofile(self.files[name])
+
+    def columns(self, lb, ub):
+        self.write('col_lb', lb)
+        self.write('col_ub', ub)
+
+    def rows(self, lo, hi, indptr, cols, vals):
+        self.write('row_lo', lo)
+        self.write('row_hi', hi)
+        self.write('indptr', self.nnz + indptr[1:])
+        self.write('indices', cols)
+        self.write('data', vals)
+        self.nnz += int(indptr[-1])
+
+    def objective(self, cols, vals):
+        self.c_cols = np.asarray(cols, dtype=np.int64)
+        self.c_vals = np.asarray(vals, dtype=np.float64)
+
+    def index(self, arrays):
+        # Extraction arrays of the builder, stored with the model
+        self.extra = arrays
+
+    def finish(self):
+        # Members are copied from the part files, never read whole
+        with zipfile.ZipFile(self.filename, 'w', zipfile.ZIP_STORED, allowZip64=True) as z:
+            for name, dtype in self.parts:
+                f = self.files[name]
+                f.flush()
+                size = f.seek(0, 2)
+                f.seek(0)
+                header = np.lib.format.header_data_from_array_1_0(np.zeros(0, dtype=dtype))
+                header['shape'] = (size // np.dtype(dtype).itemsize,)
+                with z.open(name + '.npy', 'w', force_zip64=True) as out:
+                    np.lib.format.write_array_header_2_0(out, header)
+                    shutil.copyfileobj(f, out, 1 << 22)
+                f.close()
+                os.remove(f.name)
+            for name, x in [('c_cols', self.c_cols), ('c_vals', self.c_vals)] + sorted(self.extra.items()):
+                with z.open(name + '.npy', 'w', force_zip64=True) as out:
+                    np.lib.format.write_array(out, x)
+
+def replay(arrays, sink, chunk):
+    # A saved model into a sink, `chunk` coefficients at a time
+    for a, b in spans(len(arrays['col_lb']), chunk):
+        sink.columns(np.asarray(arrays['col_lb'][a:b]), np.asarray(arrays['col_ub'][a:b]))
+    indptr = arrays['indptr']
+    nrows = len(indptr) - 1
+    a = 0
+    while a < nrows:
+        # As many rows as fit in the chunk, at least one
+        b = max(a + 1, int(np.searchsorted(indptr, indptr[a] + chunk, side='right')) - 1)
+        b = min(b, nrows)
+        p = np.asarray(indptr[a:b+1])
+        sink.rows(np.asarray(arrays['row_lo'][a:b]), np.asarray(arrays['row_hi'][a:b]), p - p[0],
+                  np.asarray(arrays['indices'][p[0]:p[-1]]), np.asarray(arrays['data'][p[0]:p[-1]]))
+        a = b
+    sink.objective(np.asarray(arrays['c_cols']), np.asarray(arrays['c_vals']))
+    sink.finish()
+
+def solveFile(filename, backend='glop', budget=256 << 20, solve=True):
+    # A FileSink model in a new solver, solved unless solve=False. OR-tools
+    # gets it chunk by chunk, HiGHS (linprog) needs the whole matrix anyway
+    arrays = mapArrays(filename)
+    solver = createSolver('Network', backend)
+    if backend in HighsBackend.methods:
+        c = np.zeros(len(arrays['col_lb']))
+        c[arrays['c_cols']] = arrays['c_vals']
+        A = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                              shape=(len(arrays['row_lo']), len(c)))
+        solver.loadModel(c, arrays['col_lb'], arrays['col_ub'], A, arrays['row_lo'], arrays['row_hi'])
+    else:
+        replay(arrays, SolverSink(solver), max(1, budget // ENTRY_BYTES))
+    if solve:
+        solver.Solve()
+    return solver
+
+class StreamLP(SparseLP):
+
+    def __init__(self, nodes, edges, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R, prune=True,
+                 budget=256 << 20):
+        SparseLP.__init__(self, nodes, edges, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R, prune)
+        # Bytes the builder may hold at once, the sink's own copy aside
+        self.budget = budget
+
+    def createOrder(self):
+        # Edges grouped by tail and by head, and a topological order (None
+        # if there is a cycle)
+        V = self.nodes
+        fwd = np.argsort(self.u, kind='stable')
+        rev = np.argsort(self.v, kind='stable')
+        self.children = (np.concatenate([[0], np.cumsum(np.bincount(self.u, minlength=V))]).tolist(), self.v[fwd])
+        self.parents = (np.concatenate([[0], np.cumsum(np.bincount(self.v, minlength=V))]).tolist(), self.u[rev])
+        ptr, nbr = self.children
+        nbr = nbr.tolist()
+        indeg = np.bincount(self.v, minlength=V).tolist()
+        order = [n for n in range(V) if indeg[n] == 0]
+        for n in order:
+            for b in nbr[ptr[n]:ptr[n+1]]:
+                indeg[b] -= 1
+                if indeg[b] == 0:
+                    order.append(b)
+        self.order = order if len(order) == V else None
+
+    def reach(self, nodes, forward):
+        # (V, len(nodes)) bool: column j marks the nodes reachable from
+        # nodes[j] (forward) or the nodes that reach nodes[j]
+        V = self.nodes
+        nodes = np.asarray(nodes, dtype=np.int64)
+        if not self.prune:
+            return np.ones((V, len(nodes)), dtype=bool)
+        R = np.zeros((V, len(nodes)), dtype=bool)
+        R[nodes, np.arange(len(nodes))] = True
+        ptr, nbr = self.parents if forward else self.children
+        if self.order is not None:
+            for n in self.order if forward else reversed(self.order):
+                if ptr[n+1] > ptr[n]:
+                    R[n] |= R[nbr[ptr[n]:ptr[n+1]]].any(axis=0)
+            return R
+        # Not a DAG, iterate to a fixed point instead
+        heads = np.repeat(np.arange(V), np.diff(ptr))
+        adj = sparse.csr_matrix((np.ones(len(nbr)), (heads, nbr)), shape=(V, V))
+        while True:
+            nxt = R | (adj.dot(R.astype(np.float64)) > 0)
+            if (nxt == R).all():
+                return R
+            R = nxt
+
+    def targets(self):
+        # Reachability targets per block: (V, n) bool and (n, M) masks
+        return max(1, self.budget // (2 * (self.nodes + len(self.edges))))
+
+    def columns(self, name, count, lb=0.0, ub=INF):
+        start = self.ncols
+        self.col_start.setdefault(name, start)
+        lb = np.broadcast_to(np.asarray(lb, dtype=np.float64), (count,))
+        ub = np.broadcast_to(np.asarray(ub, dtype=np.float64), (count,))
+        for a, b in spans(count, self.chunk):
+            self.sink.columns(lb[a:b], ub[a:b])
+        self.ncols += count
+        return start
+
+    def rows(self, name, count, lb, ub, rows, cols, vals):
+        # rows are local to this chunk, as in SparseLP.addRows()
+        if not count:
+            return
+        cols = [np.asarray(x, dtype=np.int64) for x in cols]
+        vals = np.concatenate([np.broadcast_to(np.asarray(x, dtype=np.float64), c.shape) for x, c in zip(vals, cols)])
+        rows = np.concatenate([np.asarray(x, dtype=np.int64) for x in rows])
+        cols = np.concatenate(cols)
+        order = np.argsort(rows, kind='stable')
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=count))])
+        self.chunk_peak = max(self.chunk_peak, 2 * (rows.nbytes + cols.nbytes + vals.nbytes) + order.nbytes)
+        self.sink.rows(np.broadcast_to(np.asarray(lb, dtype=np.float64), (count,)),
+                       np.broadcast_to(np.asarray(ub, dtype=np.float64), (count,)), indptr, cols[order], vals[order])
+        self.row_count[name] = self.row_count.get(name, 0) + count
+        self.nrows += count
+        self.nnz += len(cols)
+        self.chunks += 1
+
+    def createVariables(self):
+        V, M = self.nodes, len(self.edges)
+        S, W = len(self.src), len(self.nonsrc)
+        lim_R = np.full(V, np.nan)
+        lim_s = np.full(V, np.nan)
+        for i, x in self.lim_R.items():
+            lim_R[i] = x
+        for i, x in self.lim_s.items():
+            lim_s[i] = x
+        fixed = ~np.isnan(lim_R)
+        self.R_node = self.columns('R_node', V, np.where(fixed, lim_R, 0), np.where(fixed, lim_R, INF))
+        fixed = ~np.isnan(lim_s)
+        self.E_node = self.columns('E_node', V, np.where(fixed, lim_s, 0), np.where(fixed, lim_s, INF))
+        self.k = self.columns('k', M)
+        self.e = self.columns('e', M)
+        self.R_edge = self.columns('R_edge', M)
+        # [source, edge] and [source, non-source node] families, row-major
+        self.e_s = self.columns('e_s', S * M)
+        self.k_s = self.columns('k_s', S * M)
+        self.E_s = self.columns('E_s', S * W)
+        self.R_s = self.columns('R_s', S * W)
+        self.R_s_edge = self.columns('R_s_edge', S * M)
+
+    def createSecurityConstraint(self):
+        M, S, W = len(self.edges), len(self.src), len(self.nonsrc)
+        d, r = self.d, self.r
+        step = max(1, self.chunk // 3)
+        # Constraint 1 Random bits for generate Key
+        for a, b in spans(M, step):
+            m, e = np.arange(b - a), np.arange(a, b)
+            self.rows('Key', b - a, 0, INF, [m, m, m], [self.k + e, self.e + e, self.R_edge + e],
+                      [1-d[e]*r[e], (1-d[e])*r[e], -(1-r[e])])
+        # Constraint 2 Capacity
+        for a, b in spans(M, step):
+            m, e = np.arange(b - a), np.arange(a, b)
+            self.rows('Cap', b - a, -INF, 1-d[e], [m, m, m], [self.R_edge + e, self.k + e, self.e + e], [1, 1/r[e], 1])
+        # Constraint 3 u has random bits for sending
+        for a, b in spans(M, step):
+            m, e = np.arange(b - a), np.arange(a, b)
+            self.rows('LM', b - a, -INF, 0, [m, m, m], [self.k + e, self.E_node + self.u[e], self.e + e],
+                      [1-d[e]*r[e], -(1-d[e])*r[e], (1-d[e])*r[e]])
+        # Constraints 4, 5 and the R_e sum: x_e = Sum x_e from Si
+        step = max(1, self.chunk // (S + 1))
+        for name, total, part in [('Sum_e_e', self.e, self.e_s), ('Sum_k_e', self.k, self.k_s),
+                                  ('Sum_R_e', self.R_edge, self.R_s_edge)]:
+            for a, b in spans(M, step):
+                m = np.arange(b - a)
+                s = np.repeat(np.arange(S), b - a)
+                self.rows(name, b - a, 0, 0, [m, np.tile(m, S)], [total + a + m, part + s * M + a + np.tile(m, S)],
+                          [1, -1])
+        # Constraint 6 and the R_u sum: x_u = Sum x_u from Si
+        for name, total, part in [('Sum_E_u', self.E_node, self.E_s), ('Sum_R_u', self.R_node, self.R_s)]:
+            for a, b in spans(W, step):
+                w = np.arange(b - a)
+                s = np.repeat(np.arange(S), b - a)
+                self.rows(name, b - a, 0, 0, [w, np.tile(w, S)], [total + self.nonsrc[a:b], part + s * W + a + np.tile(w, S)],
+                          [1, -1])
+
+    def createMessageFlow(self):
+        # f_R by blocks of pairs. Its index arrays are kept for rates() and
+        # edgesWeight(), so its rows are cut from them
+        M, S, W = len(self.edges), len(self.src), len(self.nonsrc)
+        P = len(self.pair_s)
+        ps, pe = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        for a, b in spans(P, self.targets()):
+            to = self.reach(self.pair_d[a:b], False)[self.v].T
+            p, e = np.nonzero(self.from_u[:, self.src_id[self.pair_s[a:b]]].T & to)
+            ps.append(p + a)
+            pe.append(e)
+        self.fR_p = np.concatenate(ps)
+        self.fR_e = np.concatenate(pe)
+        n = len(self.fR_e)
+        self.f_R = self.columns('f_R', n) + np.arange(n)
+        fR_u, fR_v = self.u[self.fR_e], self.v[self.fR_e]
+        fR_si = self.src_id[self.pair_s[self.fR_p]]
+        # Flow_R in == Flow_R out, whole pairs per chunk (fR_p is sorted)
+        step = max(1, self.chunk // 2)
+        a = 0
+        while a < n:
+            b = int(np.searchsorted(self.fR_p, self.fR_p[min(a + step, n) - 1], side='right'))
+            k, rows, cols, coef = self.flowRows(self.fR_p[a:b], (self.pair_s, self.pair_d), fR_u[a:b], fR_v[a:b],
+                                                self.f_R[a:b])
+            self.rows('Flow_R_in_out', k, 0, 0, [rows], [cols], [coef])
+            a = b
+        # Flow_R Capacity, row (s, edge)
+        key = fR_si * M + self.fR_e
+        order = np.argsort(key, kind='stable')
+        bounds = np.searchsorted(key[order], np.arange(0, S * M + step, step))
+        for i, (a, b) in enumerate(spans(S * M, step)):
+            sel = order[bounds[i]:bounds[i+1]]
+            self.rows('Flow_R_Cap', b - a, -INF, 0, [np.arange(b - a), key[sel] - a],
+                      [self.R_s_edge + np.arange(a, b), self.f_R[sel]], [-1, 1])
+        del key, order
+        # Limit_R of Flow
+        out = fR_u == self.pair_s[self.fR_p]
+        self.rows('LM_Flow_R', S, -INF, 0, [np.arange(S), fR_si[out]], [self.R_node + self.src, self.f_R[out]], [-1, 1])
+        # Limit of R from Source i, row (destination, s)
+        D = len(self.dest)
+        dest_id = np.full(self.nodes, -1, dtype=np.int64)
+        dest_id[self.dest] = np.arange(D)
+        into = dest_id[fR_v] >= 0
+        R_s = self.R_s + np.arange(S)[None, :] * W + self.nonsrc_id[self.dest][:, None]
+        self.rows('LM_R_bits', D * S, -INF, 0, [np.arange(D * S), dest_id[fR_v[into]] * S + fR_si[into]],
+                  [R_s.ravel(), self.f_R[into]], [1, -1])
+
+    def createKeyFlow(self):
+        # f_k and its rows by blocks of (source, d) commodities, every row
+        # of a commodity is made with it and nothing of it is kept
+        M, W = len(self.edges), len(self.nonsrc)
+        per = max(1, self.chunk // (7 * max(M, 1)))
+        for a, b in spans(W, self.targets()):
+            to = self.reach(self.nonsrc[a:b], False)[self.v].T
+            for si, s in enumerate(self.src.tolist()):
+                for x, y in spans(b - a, per):
+                    c, e = np.nonzero(to[x:y] & self.from_u[:, si])
+                    self.keyRows(si, s, a + x, y - x, c, e)
+
+    def keyRows(self, si, s, first, count, c, e):
+        # Commodities (s, nonsrc[first + c]) with their f_k on edges e
+        M, W = len(self.edges), len(self.nonsrc)
+        n = len(e)
+        f_k = self.columns('f_k', n) + np.arange(n)
+        u, v = self.u[e], self.v[e]
+        # Flow in == Flow out
+        ends = (np.full(count, s), self.nonsrc[first:first + count])
+        k, rows, cols, coef = self.flowRows(c, ends, u, v, f_k)
+        self.rows('Flow_in_out', k, 0, 0, [rows], [cols], [coef])
+        # Flow Capacity
+        m = np.arange(n)
+        self.rows('FlowCap', n, -INF, 0, [m, m, m], [f_k, self.k_s + si * M + e, self.e_s + si * M + e],
+                  [1, -1/self.r[e], -1])
+        # Limit of Flow
+        out = u == s
+        self.rows('LM_Flow', count, -INF, 0, [np.arange(count), c[out]], [np.full(count, self.E_node + s), f_k[out]],
+                  [-1, 1])
+        # Limit of E from Source i
+        into = v == ends[1][c]
+        self.rows('LM_bits', count, -INF, 0, [np.arange(count), c[into]],
+                  [self.E_s + si * W + first + np.arange(count), f_k[into]], [1, -1])
+
+    def createObjective(self):
+        cols = np.unique(self.R_node + self.objective_nodes)
+        self.sink.objective(cols, np.ones(len(cols)))
+
+    def build(self, sink):
+        start = time()
+        self.sink = sink
+        # Coefficients per chunk
+        self.chunk = max(1, self.budget // ENTRY_BYTES)
+        self.ncols = self.nrows = self.nnz = self.chunks = self.chunk_peak = 0
+        self.col_start = dict()
+        self.row_count = dict()
+        self.createIndex()
+        self.createOrder()
+        # from_u[e, s]: the tail of e is reachable from source s
+        self.from_u = self.reach(self.src, True)[self.u]
+        self.createVariables()
+        self.createSecurityConstraint()
+        self.createMessageFlow()
+        self.createKeyFlow()
+        self.createObjective()
+        sink.index({'fR_p': self.fR_p, 'fR_e': self.fR_e, 'f_R': self.f_R})
+        sink.finish()
+        self.sink = None
+        self.build_time = time() - start
+
+    def Solve(self, backend='glop'):
+        solver = createSolver('Network', backend)
+        if backend in HighsBackend.methods:
+            sink = ArraySink()
+            self.build(sink)
+            solver.loadModel(sink.c, sink.col_lb, sink.col_ub, sink.A, sink.row_lo, sink.row_hi)
+            del sink
+        else:
+            self.build(SolverSink(solver))
+        return self.solved(solver)
+
+    def save(self, filename):
+        self.build(FileSink(filename))
+
+    def load(self, filename, backend='glop'):
+        # Solves a model save() wrote for this topology
+        self.createIndex()
+        arrays = mapArrays(filename)
+        self.fR_p, self.fR_e, self.f_R = arrays['fR_p'], arrays['fR_e'], arrays['f_R']
+        return self.solved(solveFile(filename, backend, self.budget, solve=False))
+
+    def solved(self, solver):
+        start = time()
+        status = solver.Solve()
+        self.solve_time = time() - start
+        if status != OPTIMAL:
+            raise RuntimeError('status %d' % status)
+        self.stats = solver.stats
+        self.x = solver.solutionValues()
+        self.objective = solver.Objective().Value()
+        return self.rates()
+
+    def report(self):
+        return {'columns': self.ncols, 'rows': self.nrows, 'nonzeros': self.nnz, 'chunks': self.chunks,
+                'chunk_mb': self.chunk_peak / 1e6, 'budget_mb': self.budget / 1e6, 'build_time': self.build_time}
+
+def check(filenames, budget=16 << 10, tol=1e-9):
+    # Objective of SolverLP against StreamLP through every sink, with a
+    # budget small enough to cut every family into several chunks
+    bad = 0
+    print('%-24s %16s %16s %16s %16s %7s' % ('file', 'SolverLP', 'glop', 'highs', 'file', 'chunks'))
+    for filename in filenames:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with SolverLP.fromFile(filename, debug=False) as solv:
+                solv.Solve()
+                ref = solv.solver.Objective().Value()
+                weight = np.array(solv.edgesWeight())
+        objs = []
+        ok = True
+        for backend in ['glop', 'highs', 'file']:
+            lp = StreamLP.fromFile(filename, budget=budget)
+            if backend == 'file':
+                lp.save(filename + '.stream.npz')
+                lp = StreamLP.fromFile(filename, budget=budget)
+                lp.load(filename + '.stream.npz')
+                os.remove(filename + '.stream.npz')
+            else:
+                lp.Solve(backend)
+                chunks = lp.chunks
+            objs.append(lp.objective)
+            ok &= abs(lp.objective - ref) <= tol * max(1, abs(ref))
+            # Edge weights may differ between optimal solutions, not their sum
+            ok &= abs(sum(lp.edgesWeight()) - weight.sum()) <= 1e-6 * max(1, weight.sum()) or backend != 'glop'
+        bad += not ok
+        print('%-24s %16.12f %16.12f %16.12f %16.12f %7d %s' % (filename, ref, objs[0], objs[1], objs[2], chunks,
+                                                               'ok' if ok else 'MISMATCH'))
+    return bad
+
+def measure(task):
+    # Runs in a fresh process so that the peak RSS belongs to this build.
+    # Without solve, the build ends with the model in the backend
+    model, inst, budget, backend, output, solve = task
+    rss = peakRss()
+    start = time()
+    if model == 'sparse':
+        lp = SparseLP(*inst)
+        lp.build()
+        solver = createSolver('Network', backend)
+        solver.loadModel(lp.c, lp.lb, lp.ub, lp.A, lp.row_lo, lp.row_hi)
+        ret = {'build_time': time() - start, 'columns': len(lp.lb), 'rows': lp.A.shape[0], 'nonzeros': lp.A.nnz}
+    else:
+        lp = StreamLP(*inst, budget=budget)
+        solver = createSolver('Network', backend)
+        if output:
+            lp.save(output)
+            solver = solveFile(output, backend, budget, solve=False)
+        elif backend in HighsBackend.methods:
+            sink = ArraySink()
+            lp.build(sink)
+            solver.loadModel(sink.c, sink.col_lb, sink.col_ub, sink.A, sink.row_lo, sink.row_hi)
+            del sink
+        else:
+            lp.build(SolverSink(solver))
+        ret = lp.report()
+        ret['build_time'] = time() - start
+    ret.update({'model': model, 'build_rss_mb': peakRss() - rss, 'objective': np.nan, 'solve_time': np.nan})
+    if solve:
+        start = time()
+        solver.Solve()
+        ret.update({'objective': solver.Objective().Value(), 'solve_time': time() - start})
+    ret['peak_rss_mb'] = peakRss()
+    return ret
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the LP in chunks under a memory budget.')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('check', help='compare the objective with SolverLP through every sink')
+    p.add_argument('inputs', nargs='*', help='.in or .npz topology files (default input/*.in)')
+    p = sub.add_parser('build', help='build and solve one topology, report time and peak memory')
+    p.add_argument('input', nargs='?', help='.in or .npz topology file')
+    p.add_argument('-L', '--layered', type=int, nargs=2, metavar=('LAYERS', 'WIDTH'),
+                   help='sparselp.layeredGraph instead of a file')
+    p.add_argument('-B', '--budget', type=float, default=256, help='builder memory budget in MB')
+    p.add_argument('-o', '--output', help='stream the model to this .npz and solve it from there')
+    p.add_argument('-b', '--backend', default='glop')
+    p.add_argument('-s', '--solve', action='store_true', help='solve after building')
+    p.add_argument('--compare', action='store_true', help='also build with SparseLP, in its own process')
+    args = parser.parse_args()
+    if args.command == 'check':
+        from glob import glob
+        if check(args.inputs or sorted(glob('input/*.in'))):
+            raise SystemExit(1)
+    elif args.command == 'build':
+        if args.layered:
+            inst = layeredGraph(*args.layered)
+        elif args.input:
+            inst = loadTopology(args.input).args()
+        else:
+            parser.error('give a topology file or --layered')
+        from multiprocessing import get_context
+        ctx = get_context('fork' if sys.platform != 'win32' else 'spawn')
+        print('%d nodes, %d edges, %d pairs, budget %g MB' % (inst[0], len(inst[1]), len(set(inst[6])), args.budget))
+        sys.stdout.flush()
+        print('%-7s %10s %10s %11s %7s %9s %9s %9s %9s %9s %16s' % (
+            'model', 'columns', 'rows', 'nonzeros', 'chunks', 'chunk MB', 'build (s)', 'build MB', 'solve (s)',
+            'peak MB', 'objective'))
+        for model in (['sparse'] if args.compare else []) + ['stream']:
+            pool = ctx.Pool(1, maxtasksperchild=1)
+            try:
+                r = pool.apply(measure, ((model, inst, int(args.budget * 1e6), args.backend, args.output, args.solve),))
+            finally:
+                pool.close()
+                pool.join()
+            print('%-7s %10d %10d %11d %7s %9s %9.3f %9.1f %9.3f %9.1f %16.12f' % (
+                model, r['columns'], r['rows'], r['nonzeros'], r.get('chunks', '-'),
+                '%.1f' % r['chunk_mb'] if 'chunk_mb' in r else '-', r['build_time'], r['build_rss_mb'],
+                r['solve_time'], r['peak_rss_mb'], r['objective']))
+            sys.stdout.flush()
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+from __future__ import print_function
+import io, contextlib
+import os
+import sys
+from glob import glob
+import pytest
+
+# The modules live in the repository root, next to input/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+INPUTS = sorted(glob(os.path.join(ROOT, 'input', '*.in')))
+
+def topologyArgs(nodes, edges, source, destination, s_to_d, lim_s=None, lim_R=None):
+    # SolverLP arguments of a topology given as an edge list, built fresh
+    # on every call
+    graph, reverse_graph = dict(), dict()
+    for i, (u, v, d, r) in enumerate(edges):
+        graph.setdefault(u, []).append((v, d, r, i))
+        reverse_graph.setdefault(v, []).append((u, d, r, i))
+    return (nodes, list(edges), list(source), list(destination), graph, reverse_graph, list(s_to_d),
+            dict(lim_s or dict()), dict(lim_R or dict()))
+
+def solveArgs(args, **kwargs):
+    # (status, objective, variables) of a SolverLP without its prints
+    from project import SolverLP
+    with contextlib.redirect_stdout(io.StringIO()):
+        with SolverLP(*args, debug=False, **kwargs) as solv:
+            solv.build()
+            status = solv.solver.Solve()
+            return status, solv.solver.Objective().Value(), solv.solver.NumVariables()
+
+@pytest.fixture(params=INPUTS, ids=[os.path.basename(x) for x in INPUTS])
+def inputFile(request):
+    return request.param
@@ -0,0 +1,52 @@
+from __future__ import print_function
+import io, contextlib
+import os
+import sys
+import numpy as np
+import pytest
+from conftest import ROOT, topologyArgs
+from backend import OPTIMAL
+from project import SolverLP
+import sensitivity
+
+BUTTERFLY = os.path.join(ROOT, 'input', 'Butterfly.in')
+
+def test_highs_mps_export(inputFile):
+    from ortools.linear_solver.python import model_builder
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv = SolverLP.fromFile(inputFile, backend='highs', debug=False)
+        solv.build()
+        solv.solver.Solve()
+    model = model_builder.Model()
+    model.import_from_mps_string(solv.modelText('mps'))
+    assert (model.num_variables, model.num_constraints) == (solv.solver.NumVariables(), solv.solver.NumConstraints())
+    glop = model_builder.Solver('glop')
+    glop.solve(model)
+    assert abs(glop.objective_value - solv.solver.Objective().Value()) <= 1e-9
+
+def test_sensitivity_rejects_backends_without_basis(monkeypatch):
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv = SolverLP.fromFile(BUTTERFLY, backend='highs', debug=False)
+        solv.build()
+        solv.solver.Solve()
+    with pytest.raises(ValueError):
+        sensitivity.Sensitivity(solv)
+    monkeypatch.setattr(sys, 'argv', ['sensitivity.py', '-b', 'highs', BUTTERFLY])
+    with pytest.raises(SystemExit) as exit:
+        with contextlib.redirect_stderr(io.StringIO()):
+            sensitivity.main()
+    assert exit.value.code == 2
+
+@pytest.mark.parametrize('backend', ['glop', 'clp', 'highs'])
+def test_objective_stat_without_solution(backend):
+    # Fixing R_node of 2 at 0.5 makes the solved model infeasible, as
+    # nothing reaches 2: the stat follows the last solve, not the last optimum
+    args = topologyArgs(3, [(0, 1, 0.1, 0.5)], [0], [1, 2], [(0, 1), (0, 2)])
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv = SolverLP(*args, backend=backend, debug=False)
+        solv.build()
+        assert solv.solver.Solve() == OPTIMAL
+        assert solv.solver.stats['objective'] == pytest.approx(solv.solver.Objective().Value())
+        solv.updateLimits(lim_R={2: 0.5})
+        assert solv.solver.Solve() != OPTIMAL
+    assert np.isnan(solv.solver.stats['objective'])
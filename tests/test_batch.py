@@ -0,0 +1,28 @@
+from __future__ import print_function
+import os
+import pytest
+from conftest import ROOT
+from backend import OPTIMAL
+from batch import FIELDS, solveInstance
+
+BUTTERFLY = os.path.join(ROOT, 'input', 'Butterfly.in')
+
+@pytest.fixture
+def infeasible(tmp_path):
+    # R_node of 2 is fixed at 0.5, but nothing reaches 2
+    path = str(tmp_path / 'infeasible.in')
+    with open(path, 'w') as f:
+        f.write('3\n1\n0 1 0.1 0.5\n1\n0\n2\n1\n2\n2\n0 1\n0 2\n0\n1\n2 0.5\n')
+    return path
+
+@pytest.mark.parametrize('cache', [False, True])
+def test_rows_have_every_field(tmp_path, infeasible, cache):
+    cache = str(tmp_path / 'cache.sqlite') if cache else None
+    row = solveInstance((BUTTERFLY, 'glop', cache))
+    assert sorted(row) == sorted(FIELDS)
+    assert row['status'] == OPTIMAL and row['error'] is None and row['cached'] is False
+    assert abs(row['objective'] - 0.358289572393) < 1e-9 and row['build_time'] > 0 and row['solve_time'] > 0
+    row = solveInstance((infeasible, 'glop', cache))
+    assert sorted(row) == sorted(FIELDS)
+    assert row['status'] != OPTIMAL and row['error'] == 'status %d' % row['status']
+    assert row['objective'] is None and row['rates'] is None and row['edges_weight'] is None
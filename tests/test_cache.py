@@ -0,0 +1,30 @@
+from __future__ import print_function
+import os
+from conftest import ROOT, topologyArgs
+from backend import OPTIMAL
+from cache import ResultCache
+from loader import loadTopology
+
+BUTTERFLY = os.path.join(ROOT, 'input', 'Butterfly.in')
+
+def test_hit_in_another_edge_order(tmp_path):
+    with ResultCache(str(tmp_path / 'cache.sqlite')) as cache:
+        first = cache.solveFile(BUTTERFLY)
+        assert first['status'] == OPTIMAL and not first['cached'] and first['build_time'] > 0
+        nodes, edges, source, destination, graph, reverse_graph, s_to_d, lim_s, lim_R = loadTopology(BUTTERFLY).args()
+        back = topologyArgs(nodes, edges[::-1], source, destination, s_to_d[::-1], lim_s, lim_R)
+        again = cache.solve(back)
+        assert again['cached'] and again['status'] == OPTIMAL and again['build_time'] == 0.0
+        assert again['objective'] == first['objective']
+        assert again['edges_weight'] == first['edges_weight'][::-1]
+        assert again['rates'] == first['rates'][::-1]
+
+def test_infeasible_is_not_stored(tmp_path):
+    # R_node of 2 is fixed at 0.5, but nothing reaches 2
+    args = topologyArgs(3, [(0, 1, 0.1, 0.5)], [0], [1, 2], [(0, 1), (0, 2)], lim_R={2: 0.5})
+    with ResultCache(str(tmp_path / 'cache.sqlite')) as cache:
+        for k in range(2):
+            ret = cache.solve(args)
+            assert ret['status'] != OPTIMAL and not ret['cached']
+            assert ret['objective'] is None and ret['rates'] is None
+        assert cache.stats()['entries'] == 0 and cache.hits == 0
@@ -0,0 +1,32 @@
+from __future__ import print_function
+import io, contextlib
+import os
+import pytest
+from conftest import ROOT
+from compact import CompactLP, SCRIPTS, scriptObjective
+from project import SolverLP
+
+WEIGHTS = [(1, 1), (1, 0), (0, 1), (2, 1), (1, 3), (0.25, 4)]
+
+@pytest.mark.parametrize('weights', WEIGHTS, ids=[str(w) for w in WEIGHTS])
+@pytest.mark.parametrize('filename', sorted(SCRIPTS))
+def test_script_weights(filename, weights):
+    # The scripts weigh R1 and R2 by the pairs in SCRIPTS, so an order
+    # mixup between them and s_to_d only shows with unequal weights
+    module, fn, pairs = SCRIPTS[filename]
+    with contextlib.redirect_stdout(io.StringIO()):
+        with SolverLP.fromFile(os.path.join(ROOT, filename), debug=False) as solv:
+            solv.build()
+            solv.setObjective(pairs=dict(zip(pairs, weights)))
+            solv.solver.Solve()
+            ref = solv.solver.Objective().Value()
+    assert scriptObjective(filename, *weights) == pytest.approx(ref, rel=1e-9, abs=1e-12)
+
+def test_matches_solverlp(inputFile):
+    with contextlib.redirect_stdout(io.StringIO()):
+        with SolverLP.fromFile(inputFile, debug=False) as solv:
+            solv.Solve()
+            ref = solv.solver.Objective().Value()
+    lp = CompactLP.fromFile(inputFile)
+    lp.Solve()
+    assert lp.objective == pytest.approx(ref, rel=1e-9, abs=1e-12)
@@ -0,0 +1,86 @@
+from __future__ import print_function
+import io, contextlib
+import os
+import shutil
+import numpy as np
+import pytest
+from conftest import ROOT
+from backend import OPTIMAL
+from project import SolverLP, compiledPath
+
+@pytest.fixture
+def builds(monkeypatch):
+    # Counts the models built from scratch instead of loaded
+    count = [0]
+    create = SolverLP.createVariables
+    def counted(self):
+        count[0] += 1
+        return create(self)
+    monkeypatch.setattr(SolverLP, 'createVariables', counted)
+    return count
+
+def solved(filename, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv = SolverLP.fromFile(filename, debug=False, **kwargs)
+        solv.build()
+        assert solv.solver.Solve() == OPTIMAL
+    return solv
+
+def result(solv):
+    return solv.solver.Objective().Value(), solv.rates(), solv.edgesWeight()
+
+def same(a, b):
+    for x, y in zip(a, b):
+        assert np.asarray(x) == pytest.approx(np.asarray(y), rel=1e-9, abs=1e-12)
+
+@pytest.mark.parametrize('backend', ['glop', 'highs'])
+def test_round_trip(inputFile, backend, tmp_path, builds):
+    filename = str(tmp_path / os.path.basename(inputFile))
+    shutil.copy(inputFile, filename)
+    with solved(filename, compiled=True, backend=backend) as first:
+        assert os.path.exists(compiledPath(filename))
+        ref = result(first)
+        size = (first.solver.NumVariables(), first.solver.NumConstraints())
+    # A fresh load gives the same model, solution and row keys
+    with solved(filename, compiled=True, backend=backend) as loaded:
+        assert builds[0] == 1
+        same(result(loaded), ref)
+        assert (loaded.solver.NumVariables(), loaded.solver.NumConstraints()) == size
+        with solved(inputFile, backend=backend) as plain:
+            assert (loaded.variableTable()[['family', 'index', 'column']] ==
+                    plain.variableTable()[['family', 'index', 'column']]).all()
+            assert (loaded.rowTable()[['family', 'key', 'row']] == plain.rowTable()[['family', 'key', 'row']]).all()
+            # and edits the loaded model like the built one
+            if len(plain.edges):
+                for solv in [loaded, plain]:
+                    solv.updateEdge(0, d=0.5)
+                    assert solv.solver.Solve() == OPTIMAL
+                same(result(loaded), result(plain))
+
+def test_changed_file_rebuilds(tmp_path, builds):
+    filename = str(tmp_path / 'Butterfly.in')
+    shutil.copy(os.path.join(ROOT, 'input', 'Butterfly.in'), filename)
+    with solved(filename, compiled=True) as solv:
+        base = result(solv)
+    # Edge 0 loses more, the saved model no longer holds
+    with open(filename) as f:
+        lines = f.read().split('\n')
+    u, v, d, r = lines[2].split()
+    lines[2] = ' '.join([u, v, '0.6', r])
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines))
+    with solved(filename, compiled=True) as solv:
+        assert builds[0] == 2
+        changed = result(solv)
+    with solved(filename) as plain:
+        same(changed, result(plain))
+    assert changed[0] < base[0]
+    # The changed file is what is saved now, the plain model was the
+    # third build. Other options do not match it
+    with solved(filename, compiled=True) as solv:
+        assert builds[0] == 3
+        same(result(solv), changed)
+    with solved(filename, compiled=True, keyflow='reduced') as solv:
+        assert builds[0] == 4
+        # Another optimum of the same value
+        assert solv.solver.Objective().Value() == pytest.approx(changed[0], rel=1e-9)
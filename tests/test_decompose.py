@@ -0,0 +1,13 @@
+from __future__ import print_function
+import pytest
+from decompose import Decomposition
+from sparselp import SparseLP
+
+def test_bounds_hold_the_optimum(inputFile):
+    # In-process, the subproblems of every source run in turn
+    dw = Decomposition.fromFile(inputFile, processes=0)
+    dw.Solve()
+    lp = SparseLP.fromFile(inputFile)
+    lp.Solve()
+    assert dw.lower - 1e-9 <= lp.objective <= dw.upper + 1e-9
+    assert dw.relativeGap() <= dw.gap
@@ -0,0 +1,70 @@
+from __future__ import print_function
+import io, contextlib
+import os
+import numpy as np
+import pytest
+from conftest import ROOT
+from loader import loadTopology
+from backend import OPTIMAL
+from project import SolverLP
+
+BUTTERFLY = os.path.join(ROOT, 'input', 'Butterfly.in')
+
+def solve(solv):
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv.build()
+        solv.solver.Solve()
+    return solv.solver.Objective().Value()
+
+def test_update_edge_leaves_siblings_alone():
+    args = loadTopology(BUTTERFLY).args()
+    first, second = SolverLP(*args, debug=False), SolverLP(*args, debug=False)
+    base = solve(second)
+    for point in first.sweep([{'d': 0.5, 'r': 0.9}]):
+        pass
+    first.updateLimits(lim_s={5: 0.0})
+    assert args[1][0] == (0, 4, 0.1, 0.05)
+    assert args[4][0][0] == (4, 0.1, 0.05, 0)
+    assert not args[7]
+    second.Clear()
+    assert abs(solve(second) - base) < 1e-12
+    third = SolverLP(*args, debug=False)
+    assert abs(solve(third) - base) < 1e-12
+
+def test_add_edge_leaves_siblings_alone():
+    args = loadTopology(BUTTERFLY).args()
+    first, second = SolverLP(*args, debug=False), SolverLP(*args, debug=False)
+    base = solve(second)
+    solve(first)
+    first.addEdge(0, 8, 0.0, 0.5)
+    assert solve(first) > base
+    assert len(args[1]) == 16 and 8 not in [v for v, d, r, i in args[4][0]]
+    second.Clear()
+    assert len(second.edges) == 16
+    assert abs(solve(second) - base) < 1e-12
+
+def test_failure_ranking_checks_the_status():
+    args = list(loadTopology(BUTTERFLY).args())
+    args[8] = {8: 0.2}
+    with pytest.raises(RuntimeError):
+        SolverLP(*args, debug=False).failureRanking()
+    # Line2 keeps R_2 = 0.01 only with both edges up
+    args = list(loadTopology(os.path.join(ROOT, 'input', 'Line2.in')).args())
+    args[8] = {2: 0.01}
+    solv = SolverLP(*args, debug=False)
+    ranking = solv.failureRanking()
+    assert sorted(i for i, obj, loss in ranking) == [0, 1]
+    assert all(np.isnan(obj) and np.isnan(loss) for i, obj, loss in ranking)
+    assert not solv.disabled
+    assert abs(solve(solv) - 0.01) < 1e-12
+
+def test_sweep_marks_points_without_optimum():
+    args = loadTopology(os.path.join(ROOT, 'input', 'Line2.in')).args()
+    solv = SolverLP(*args, debug=False)
+    base = solve(solv)
+    ret = []
+    for point, obj, rates in solv.sweep([{'lim_R': {2: 0.01}}, {'lim_R': {2: 5.0}}, {'lim_R': {2: None}}]):
+        ret.append((obj, rates, solv.solver.stats['status']))
+    assert abs(ret[0][0] - 0.01) < 1e-12 and ret[0][2] == OPTIMAL
+    assert np.isnan(ret[1][0]) and np.isnan(ret[1][1]).all() and ret[1][2] != OPTIMAL
+    assert abs(ret[2][0] - base) < 1e-12
@@ -0,0 +1,49 @@
+from __future__ import print_function
+import io, contextlib
+import os
+import numpy as np
+import pytest
+from conftest import ROOT
+from backend import OPTIMAL
+from project import SolverLP
+
+XNETWORK = os.path.join(ROOT, 'input', 'X-Network.in')
+
+def built():
+    solv = SolverLP.fromFile(XNETWORK, debug=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv.build()
+    return solv
+
+def weighted(solv, w):
+    # Optimum of the weighted rates of the two pairs
+    solv.setObjective(pairs=dict(zip(solv.s_to_d, w)))
+    assert solv.solver.Solve() == OPTIMAL
+    return solv.solver.Objective().Value()
+
+def test_max_min_fair():
+    with built() as solv:
+        rates = solv.maxMinFair()
+        # (2, 5) is held to 0.0396 whatever (0, 4) gets, which then fills up
+        assert solv.s_to_d == [(0, 4), (2, 5)]
+        assert rates == pytest.approx([0.061336646, 0.039619810], abs=1e-8)
+        # The lowest rate is the highest any weighting reaches for (2, 5)
+        assert rates[1] == pytest.approx(weighted(solv, (0, 1)), abs=1e-8)
+        # Unit weights by pair are the default, and a second run starts over
+        assert solv.maxMinFair({(0, 4): 1, (2, 5): 1}) == pytest.approx(rates, abs=1e-8)
+        solv.setObjective()
+        assert solv.solver.Solve() == OPTIMAL
+        assert sum(solv.rates()) == pytest.approx(0.100956456, abs=1e-8)
+
+def test_rate_region_is_exact():
+    with built() as solv:
+        front = solv.rateRegion()
+        assert np.array(front) == pytest.approx(np.array([(0.061336646, 0.039619810), (0.089189189, 0.011767267)]), abs=1e-8)
+        # Every weighting reaches exactly the best frontier point, brute force
+        for a in np.linspace(0, 1, 21):
+            w = (a, 1 - a)
+            best = max(w[0] * x + w[1] * y for x, y in front)
+            assert weighted(solv, w) == pytest.approx(best, abs=1e-9)
+        # The pairs in the other order give the same frontier mirrored
+        back = solv.rateRegion(pairs=[(2, 5), (0, 4)])
+        assert np.array(sorted((y, x) for x, y in back)) == pytest.approx(np.array(front), abs=1e-8)
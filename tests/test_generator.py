@@ -0,0 +1,32 @@
+from __future__ import print_function
+import io, contextlib
+import os
+import sys
+import numpy as np
+import pytest
+from generator import main, randomDag
+
+@pytest.mark.parametrize('n, p', [(100, 0.9), (60, 0.3), (2, 1.0)])
+def test_randomDag_density(n, p):
+    # Forward pairs are drawn without replacement, so the mean edge count
+    # is p n (n - 1) / 2 plus the few edges added for lonely nodes
+    total = n * (n - 1) // 2
+    counts = []
+    for seed in range(20):
+        topo, pos = randomDag(n, np.random.default_rng(seed), p=p)
+        pair = topo.u * n + topo.v
+        assert (topo.u < topo.v).all()
+        assert len(np.unique(pair)) == len(pair)
+        counts.append(topo.numEdges())
+    sd = np.sqrt(total * p * (1 - p) / len(counts))
+    assert abs(np.mean(counts) - p * total) <= 4 * sd + 0.05 * n
+
+@pytest.mark.parametrize('family, option', [('grid', '--sources'), ('line', '--destinations'), ('butterfly', '-p'),
+                                            ('grid', '--width'), ('random', '--cols')])
+def test_main_rejects_other_families_options(monkeypatch, tmp_path, family, option):
+    monkeypatch.setattr(sys, 'argv', ['generator.py', family, '3', option, '2', '-o', str(tmp_path)])
+    with pytest.raises(SystemExit) as exit:
+        with contextlib.redirect_stderr(io.StringIO()):
+            main()
+    assert exit.value.code == 2
+    assert not os.listdir(str(tmp_path))
@@ -0,0 +1,63 @@
+from __future__ import print_function
+import io, contextlib
+import os
+import random
+import pytest
+from conftest import ROOT, topologyArgs, solveArgs
+from project import SolverLP
+
+def close(a, b, tol=1e-9):
+    return abs(a - b) <= tol * max(1, abs(a))
+
+def test_reduced_matches_full(inputFile):
+    ret = []
+    for keyflow in ['full', 'reduced']:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with SolverLP.fromFile(inputFile, keyflow=keyflow, debug=False) as solv:
+                solv.build()
+                solv.solver.Solve()
+                ret.append((solv.solver.Objective().Value(), solv.solver.NumVariables()))
+    assert close(ret[0][0], ret[1][0])
+    assert ret[1][1] < ret[0][1]
+
+@pytest.mark.parametrize('source, s_to_d', [([0], [(0, 4)]), ([0, 1], [(0, 4), (1, 4)])])
+def test_cycle_without_destination(source, s_to_d):
+    # Walking back from 3 through single in-edges circles 1 -> 2 -> 1
+    edges = [(0, 4, 0.1, 0.5), (1, 2, 0.1, 0.5), (2, 1, 0.1, 0.5), (1, 3, 0.1, 0.5), (3, 4, 0.1, 0.5)]
+    full = solveArgs(topologyArgs(5, edges, source, [4], s_to_d))
+    reduced = solveArgs(topologyArgs(5, edges, source, [4], s_to_d), keyflow='reduced')
+    assert reduced[0] == full[0] == 0
+    assert close(full[1], reduced[1])
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('prune', [True, False])
+def test_reduced_matches_full_random(seed, prune):
+    # Small random graphs, every third one with cycles, some with lim_s
+    rng = random.Random(seed)
+    for t in range(25):
+        n = rng.randint(4, 10)
+        cyclic = t % 3 == 0
+        pairs = set()
+        for k in range(rng.randint(n, 3 * n)):
+            u, v = rng.sample(range(n), 2)
+            pairs.add((u, v) if cyclic or u < v else (v, u))
+        edges = [(u, v, round(rng.uniform(0, 0.5), 3), round(rng.uniform(0.05, 1), 3)) for u, v in sorted(pairs)]
+        source = rng.sample(range(n if cyclic else n // 2), rng.randint(1, 2))
+        others = [x for x in range(n) if x not in source]
+        destination = rng.sample(others, min(len(others), rng.randint(1, 3)))
+        s_to_d = [(s, d) for s in source for d in destination]
+        lim_s = dict([(rng.choice(others), round(rng.uniform(0, 0.2), 3))]) if t % 4 == 1 else dict()
+        args = topologyArgs(n, edges, source, destination, s_to_d, lim_s)
+        full = solveArgs(args, prune=prune)
+        reduced = solveArgs(topologyArgs(n, edges, source, destination, s_to_d, lim_s), prune=prune, keyflow='reduced')
+        assert full[0] == reduced[0]
+        assert close(full[1], reduced[1], 1e-7), (seed, t)
+
+def test_reduced_sweep_matches_full():
+    points = [{'r': 0.05 * k, 'd': {0: 0.2, 3: 0.01 * k}} for k in range(1, 6)]
+    ret = []
+    for keyflow in ['full', 'reduced']:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with SolverLP.fromFile(os.path.join(ROOT, 'input', 'Partition.in'), keyflow=keyflow, debug=False) as solv:
+                ret.append([obj for point, obj, rates in solv.sweep(points)])
+    assert all(close(a, b) for a, b in zip(*ret))
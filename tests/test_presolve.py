@@ -0,0 +1,51 @@
+from __future__ import print_function
+import io, contextlib
+import os
+import pytest
+from conftest import ROOT
+from project import SolverLP
+
+def solved(filename, presolve):
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv = SolverLP.fromFile(filename, presolve=presolve, debug=False)
+        solv.build()
+        solv.solver.Solve()
+    return solv
+
+def test_presolve_matches_full(inputFile):
+    full, reduced = solved(inputFile, False), solved(inputFile, True)
+    assert abs(full.solver.Objective().Value() - reduced.solver.Objective().Value()) <= 1e-9
+    assert len(reduced.edgesWeight()) == len(full.edges)
+
+def test_failure_ranking_on_original_edges(inputFile):
+    full, reduced = solved(inputFile, False), solved(inputFile, True)
+    a, b = sorted(full.failureRanking()), sorted(reduced.failureRanking())
+    assert [x[0] for x in a] == [x[0] for x in b] == list(range(len(full.edges)))
+    assert max(abs(x[1] - y[1]) for x, y in zip(a, b)) <= 1e-9
+
+def test_edge_loads_on_original_edges(inputFile):
+    full, reduced = solved(inputFile, False), solved(inputFile, True)
+    a, b = full.edgeLoads(), reduced.edgeLoads()
+    assert len(a) == len(b)
+    assert (a['u'] == b['u']).all() and (a['v'] == b['v']).all()
+    assert abs(a['capacity'] - b['capacity']).max() <= 1e-12
+    assert abs(a['message'] - b['message']).max() <= 1e-9
+
+def test_sweep_on_original_edges():
+    line4 = os.path.join(ROOT, 'input', 'Line4.in')
+    points = [{'r': 0.1}, {'d': 0.2}, {'r': [0.3] * 4}, {'d': {0: 0.25, 1: 0.25, 2: 0.25, 3: 0.25}}]
+    full, reduced = solved(line4, False), solved(line4, True)
+    a = [obj for point, obj, rates in full.sweep(points)]
+    b = [obj for point, obj, rates in reduced.sweep(points)]
+    assert max(abs(x - y) for x, y in zip(a, b)) <= 1e-9
+
+def test_edits_that_break_the_presolve_raise():
+    reduced = solved(os.path.join(ROOT, 'input', 'Line4.in'), True)
+    assert reduced.presolved.runs == [[0, 1, 2, 3]]
+    with pytest.raises(ValueError):
+        reduced.updateEdge(3, r=0.5)
+    with pytest.raises(ValueError):
+        reduced.addEdge(0, 3, 0.1, 0.1)
+    with pytest.raises(ValueError):
+        reduced.updateLimits(lim_s={2: 0.1})
+    assert [r for u, v, d, r in reduced.inputEdges()] == [0.05] * 4
@@ -0,0 +1,47 @@
+from __future__ import print_function
+import io, contextlib
+import numpy as np
+from generator import generate
+from registry import Registry, SparseTable
+from project import SolverLP
+
+def built(kind, size, **kwargs):
+    topo, pos = generate(kind, size, 0, **kwargs)
+    solv = SolverLP(*topo.args(), debug=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv.build()
+    return solv
+
+def test_sparse_table():
+    t = SparseTable((2, 3, 70))
+    for index, col in [((1, 2, 65), 7), ((1, 2, 3), 5), ((0, 0, 9), 1), ((1, 2, 40), 6)]:
+        t.set(index, col)
+    assert [t.get(x) for x in [(1, 2, 3), (1, 2, 40), (1, 2, 65), (0, 0, 9)]] == [5, 6, 7, 1]
+    assert t.get((1, 2, 4)) == -1 and t.get((0, 1, 9)) == -1
+    index, cols = t.entries()
+    assert index.tolist() == [[0, 0, 9], [1, 2, 3], [1, 2, 40], [1, 2, 65]]
+    assert cols.tolist() == [1, 5, 6, 7] and t.count() == 4
+
+def test_flow_index_smaller_than_dense():
+    # f_k and f_R only hold the edges pruning keeps
+    solv = built('random', 120, p=0.05, sources=4, destinations=4)
+    S, V, M, P = len(solv.src_id), solv.nodes, len(solv.edges), len(solv.pair_id)
+    sparse = solv.vars.tables['f_k'].nbytes() + solv.vars.tables['f_R'].nbytes()
+    assert sparse * 3 < 4 * (S * V * M + P * M)
+    # Every variable is found under its index and nothing else is
+    for name in ['f_k', 'f_R']:
+        index, cols = solv.vars.entries(name)
+        assert [solv.vars.col(name, tuple(i)) for i in index.tolist()] == cols.tolist()
+        assert len(set(cols.tolist())) == len(cols)
+    solv.Clear()
+
+def test_arrays_restore():
+    solv = built('grid', 4)
+    saved = solv.vars.arrays()
+    other = Registry(solv.solver)
+    other.restore(saved)
+    for name in solv.vars.tables:
+        a, b = solv.vars.entries(name), other.entries(name)
+        assert (a[0] == b[0]).all() and (a[1] == b[1]).all()
+    assert other.count() == solv.vars.count() == solv.solver.NumVariables()
+    solv.Clear()
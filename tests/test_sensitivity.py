@@ -0,0 +1,39 @@
+from __future__ import print_function
+import io, contextlib
+import numpy as np
+import pytest
+from conftest import topologyArgs
+from project import SolverLP
+from sensitivity import Sensitivity, check
+
+@pytest.mark.parametrize('upgrade', [None, 0.01])
+def test_upgrades_gain_their_prediction(inputFile, upgrade):
+    # check() re-solves every top edge with its capacity raised
+    with contextlib.redirect_stdout(io.StringIO()):
+        with SolverLP.fromFile(inputFile, debug=False) as solv:
+            solv.build()
+            solv.solver.Solve()
+            sens = Sensitivity(solv)
+            assert check(solv, sens, 10, upgrade) == 0
+
+def test_presolved_edges_by_input_edge():
+    # A run 0 -> 1 -> 2 -> 3 -> 4 the presolve collapses, a direct 0 -> 4
+    # it keeps and 4 -> 5 it removes
+    edges = [(0, 1, 0.1, 0.05), (1, 2, 0.1, 0.05), (2, 3, 0.1, 0.05), (3, 4, 0.1, 0.05), (0, 4, 0.3, 0.1),
+             (4, 5, 0.2, 0.1)]
+    sens = []
+    for presolve in [False, True]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            solv = SolverLP(*topologyArgs(6, edges, [0], [4], [(0, 4)]), debug=False, presolve=presolve)
+            solv.build()
+            solv.solver.Solve()
+            sens.append(Sensitivity(solv).edges())
+            assert check(solv, Sensitivity(solv)) == 0
+    full, reduced = sens
+    assert len(reduced) == len(edges)
+    assert [(u, v) for u, v in zip(reduced['u'], reduced['v'])] == [(u, v) for u, v, d, r in edges]
+    for name in full.dtype.names:
+        assert reduced[name][4] == pytest.approx(full[name][4], abs=1e-9)
+        if name not in ['u', 'v', 'capacity']:
+            assert np.isnan(reduced[name][:4]).all()
+    assert reduced['cap_value'][5] == 0 and np.isnan(reduced['cap_lo'][5])
@@ -0,0 +1,140 @@
+from __future__ import print_function
+import json
+import os
+import queue
+import threading
+import pytest
+from conftest import ROOT
+from service import Service, makeServer, worker
+
+BUTTERFLY = os.path.join(ROOT, 'input', 'Butterfly.in')
+
+@pytest.fixture
+def server():
+    service = Service(1, timeout=60)
+    httpd = makeServer(service, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield service, httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+
+def request(port, method, path, body=None):
+    from http.client import HTTPConnection
+    conn = HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.request(method, path, body, {'Content-Type': 'application/json'})
+    res = conn.getresponse()
+    ret = res.status, json.loads(res.read())
+    conn.close()
+    return ret
+
+def post(port, body):
+    return request(port, 'POST', '/', body)
+
+def call(port, **req):
+    return post(port, json.dumps(req))
+
+def test_solve_edit_and_cache(server):
+    service, port = server
+    code, first = call(port, op='solve', file=BUTTERFLY)
+    assert code == 200 and not first['cached'] and first['status'] == 0
+    assert abs(first['objective'] - 0.358289572393) < 1e-9
+    code, again = call(port, op='solve', file=BUTTERFLY)
+    assert again['cached'] and again['objective'] == first['objective']
+    code, cut = call(port, op='edit', file=BUTTERFLY, disable=[0, 1, 2, 3])
+    assert code == 200 and not cut['cached'] and cut['objective'] < first['objective']
+    code, back = call(port, op='edit', file=BUTTERFLY, enable=[0, 1, 2, 3])
+    assert abs(back['objective'] - first['objective']) < 1e-9
+
+def test_failed_edit_clears_the_cache(server):
+    service, port = server
+    code, first = call(port, op='solve', file=BUTTERFLY)
+    code, ret = call(port, op='edit', file=BUTTERFLY, disable=[0, 1, 2, 3], update={'2': 'bad'})
+    assert code == 400 and 'error' in ret
+    # The edges were disabled before the update failed
+    code, ret = call(port, op='solve', file=BUTTERFLY)
+    assert not ret['cached'] and abs(ret['objective'] - first['objective'] / 2) < 1e-9
+
+def test_sweep_restores_the_model(server):
+    service, port = server
+    code, first = call(port, op='solve', file=BUTTERFLY)
+    points = [{'d': 0.2}, {'r': 0.5, 'd': {'0': 0.9}}, {'lim_R': {'8': 5.0}}]
+    code, ret = call(port, op='sweep', file=BUTTERFLY, points=points)
+    assert code == 200 and len(ret['points']) == 3
+    assert ret['points'][0]['objective'] < first['objective']
+    assert ret['points'][2]['objective'] is None and ret['points'][2]['status'] != 0
+    code, ret = call(port, op='edit', file=BUTTERFLY)
+    assert not ret['cached'] and abs(ret['objective'] - first['objective']) < 1e-9
+
+def test_worker_keeps_the_order_of_a_batch():
+    # Everything queued is one batch, answered in order
+    requests, results = queue.Queue(), queue.Queue()
+    batch = [{'op': 'solve', 'file': BUTTERFLY}, {'op': 'edit', 'file': BUTTERFLY, 'disable': [0, 1, 2, 3]},
+             {'op': 'solve', 'file': BUTTERFLY}, {'op': 'edit', 'file': BUTTERFLY, 'enable': [0, 1, 2, 3]},
+             {'op': 'solve', 'file': BUTTERFLY}, {'op': 'models'}]
+    for rid, req in enumerate(batch):
+        requests.put((rid, req))
+    requests.put(None)
+    worker(requests, results, 'glop')
+    ret = [results.get_nowait() for req in batch]
+    assert [x[0] for x in ret] == list(range(len(batch)))
+    assert all(x[3] == len(batch) + 1 for x in ret)
+    obj = [x[1].get('objective') for x in ret]
+    assert obj[2] == obj[1] and obj[2] < obj[0]
+    # Edits solve, so the solves after them answer from that
+    assert ret[2][1]['cached'] and ret[4][1]['cached'] and abs(obj[4] - obj[0]) < 1e-9
+    assert ret[5][1] == {'models': [BUTTERFLY]}
+
+def test_metrics(server):
+    service, port = server
+    for op in ['load', 'solve', 'solve']:
+        call(port, op=op, file=BUTTERFLY)
+    call(port, op='nothing')
+    code, ret = request(port, 'GET', '/metrics')
+    assert code == 200
+    assert ret['served'] == 4 and ret['errors'] == 1 and ret['restarts'] == 0
+    assert ret['queue_depth'] == [0] and ret['models'] == [1]
+    assert ret['latency']['solve']['count'] == 2 and ret['latency']['load']['count'] == 1
+    assert ret['service']['count'] == 4
+    code, ret = request(port, 'GET', '/models')
+    assert code == 200 and ret == {'models': [BUTTERFLY]}
+
+@pytest.mark.parametrize('body', ['[1]', '"solve"', '3', 'null', '{'])
+def test_body_not_an_object(server, body):
+    service, port = server
+    code, ret = post(port, body)
+    assert code == 400 and 'error' in ret
+    # The service still answers
+    code, ret = call(port, op='solve', file=BUTTERFLY)
+    assert code == 200 and ret['objective'] > 0
+
+def test_call_times_out(server):
+    service, port = server
+    with pytest.raises(TimeoutError):
+        service.call({'op': 'load', 'file': BUTTERFLY}, timeout=1e-3)
+    # The late answer is dropped and the worker keeps serving
+    assert service.call({'op': 'solve', 'file': BUTTERFLY})['objective'] > 0
+    assert service.models() == {'models': [BUTTERFLY]}
+    assert service.metrics()['queue_depth'] == [0]
+
+def test_dead_worker_is_restarted(server):
+    service, port = server
+    call(port, op='load', file=BUTTERFLY)
+    service.procs[0].terminate()
+    service.procs[0].join()
+    # The new worker loads the model again
+    code, ret = call(port, op='solve', file=BUTTERFLY)
+    assert code == 200 and not ret['cached']
+    assert service.metrics()['restarts'] == 1
+
+def test_requests_on_a_dead_worker_fail(server):
+    service, port = server
+    proc = service.procs[0]
+    # The worker dies while this request waits on it
+    threading.Timer(0.05, proc.terminate).start()
+    with pytest.raises(RuntimeError):
+        service.call({'op': 'sweep', 'file': BUTTERFLY, 'points': [{'d': 0.01 * k} for k in range(1, 2000)]})
+    assert service.procs[0] is not proc
+    assert service.call({'op': 'solve', 'file': BUTTERFLY})['objective'] > 0
+    assert service.metrics()['queue_depth'] == [0]
@@ -0,0 +1,21 @@
+from __future__ import print_function
+import io, contextlib
+import os
+import pytest
+from conftest import ROOT
+from project import SolverLP
+from simulate import Simulator
+
+@pytest.mark.parametrize('name', ['Butterfly', 'X-Network', 'Partition'])
+def test_intervals_cover_the_lp(name):
+    # A correct LP has to pass: its rate and a leak of 0 inside the
+    # intervals of every pair
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv = SolverLP.fromFile(os.path.join(ROOT, 'input', name + '.in'), debug=False)
+        solv.Solve()
+    sim = Simulator(solv)
+    sim.run(2e6, 16, 1, 0)
+    for rate, got, lost in sim.pairStats():
+        assert got[1] - 1e-12 <= rate <= got[2] + 1e-12
+        assert lost[1] <= 0 <= lost[2]
+        assert abs(got[0] - rate) <= 0.02 * max(rate, 1e-3)
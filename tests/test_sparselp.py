@@ -0,0 +1,25 @@
+from __future__ import print_function
+import io, contextlib
+import pytest
+from conftest import topologyArgs
+from project import SolverLP
+from sparselp import SparseLP
+
+@pytest.mark.parametrize('backend', ['glop', 'highs'])
+def test_infeasible_raises(backend):
+    # R_node of 2 is fixed at 0.5, but nothing reaches 2
+    args = topologyArgs(3, [(0, 1, 0.1, 0.5)], [0], [1, 2], [(0, 1), (0, 2)], lim_R={2: 0.5})
+    with pytest.raises(RuntimeError):
+        SparseLP(*args).Solve(backend)
+
+def objective(filename):
+    with contextlib.redirect_stdout(io.StringIO()):
+        with SolverLP.fromFile(filename, debug=False) as solv:
+            solv.Solve()
+            return solv.solver.Objective().Value()
+
+@pytest.mark.parametrize('backend', ['glop', 'highs'])
+def test_matches_solverlp(inputFile, backend):
+    lp = SparseLP.fromFile(inputFile)
+    lp.Solve(backend)
+    assert lp.objective == pytest.approx(objective(inputFile), rel=1e-9, abs=1e-12)
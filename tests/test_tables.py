@@ -0,0 +1,52 @@
+from __future__ import print_function
+import io, contextlib
+import pytest
+from backend import OPTIMAL
+from project import SolverLP
+
+# The bulk tables read one copy of the solution; every entry must be what
+# the solver reports for that variable or row on its own
+
+@pytest.fixture(params=['glop', 'highs'])
+def solved(request, inputFile):
+    with contextlib.redirect_stdout(io.StringIO()):
+        solv = SolverLP.fromFile(inputFile, backend=request.param, debug=False)
+        solv.build()
+        assert solv.solver.Solve() == OPTIMAL
+    yield solv
+    solv.Clear()
+
+def test_variable_table(solved):
+    solv = solved
+    table = solv.variableTable()
+    assert len(table) == solv.solver.NumVariables()
+    for family, index, col, value, reduced in table.tolist():
+        x = solv.var(family, *[i for i in index if i >= 0])
+        assert x.index() == col
+        assert value == pytest.approx(x.solution_value(), abs=1e-12)
+        assert reduced == pytest.approx(x.reduced_cost(), abs=1e-12)
+
+def test_row_table(solved):
+    solv = solved
+    table = solv.rowTable()
+    assert len(table) == solv.solver.NumConstraints()
+    dual = dict((row, d) for family, key, row, d in table.tolist())
+    for mp, ct in solv.constraints.items():
+        assert dual[ct.index()] == pytest.approx(ct.dual_value(), abs=1e-12)
+
+def test_pair_rates(solved):
+    solv = solved
+    for s, d, rate in solv.pairRates().tolist():
+        p = solv.pair_id[(s, d)]
+        into = [i for i, (u, v, de, re) in enumerate(solv.edges) if v == d and solv.vars.has('f_R', (p, i))]
+        assert rate == pytest.approx(sum(solv.var('f_R', p, i).solution_value() for i in into), abs=1e-12)
+
+def test_edge_loads(solved):
+    solv = solved
+    loads = solv.edgeLoads()
+    for i, (u, v, d, r) in enumerate(solv.edges):
+        for field, name in [('message', 'R_edge'), ('key', 'k'), ('random', 'e')]:
+            x = solv.var(name, i).solution_value() if solv.vars.has(name, (i,)) else 0.0
+            assert loads[field][i] == pytest.approx(x, abs=1e-12)
+        ct = solv.constraints.get(('Cap', (u, v)))
+        assert loads['dual'][i] == pytest.approx(ct.dual_value() if ct is not None else 0.0, abs=1e-12)